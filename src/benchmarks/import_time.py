@@ -0,0 +1,117 @@
+"""
+Import-time benchmark guarding the cold start of the collection-only path.
+
+Imports the modules needed to collect detector data from a simulation in a fresh
+interpreter and checks that no heavy optional dependency (torch, matplotlib, ...)
+is loaded and that importing does not create any files.
+
+Run from the src directory:
+    python -m benchmarks.import_time --budget-ms 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# modules imported by a pure data collection job
+COLLECTION_MODULES = [
+    "simulation.sim_core",
+    "simulation.modules.progress_module",
+    "simulation.modules.simulationFlowControlModule",
+    "generator.detector_node_connector",
+]
+
+# dependencies that must only be loaded by the features needing them
+FORBIDDEN = ["torch", "torch_geometric", "matplotlib", "tensorboard", "networkx", "scipy"]
+
+# dependencies loaded on the collection path that are reported but not forbidden,
+# traci imports sumolib itself
+REPORTED = ["traci", "sumolib", "numpy"]
+
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed_ms": elapsed * 1000, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _parse_importtime(stderr: str) -> dict[str, int]:
+    """ Parse the cumulative import times printed by -X importtime
+    :param stderr: stderr of the interpreter
+    :return: dictionary of top-level package to cumulative import time in microseconds
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if cumulative.strip().isdigit() and "." not in name:
+            times[name] = max(times.get(name, 0), int(cumulative))
+    return times
+
+
+def measure(modules: list[str] = None) -> dict:
+    """
+    Import modules in a fresh interpreter, started in an empty temporary working directory
+    :param modules: modules to import, the collection path by default
+    :return: dictionary containing the import time, loaded modules, slowest packages and created files
+    """
+    modules = modules or COLLECTION_MODULES
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src_dir, os.environ.get("PYTHONPATH")])),
+               PYTHONDONTWRITEBYTECODE="1")
+
+    with tempfile.TemporaryDirectory() as cwd:
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", _SCRIPT.format(modules=modules)],
+                                 cwd=cwd, env=env, capture_output=True, text=True)
+        created = sorted(os.listdir(cwd))
+
+    if process.returncode != 0:
+        raise RuntimeError("Importing the collection path failed:\n" + process.stderr[-2000:])
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    loaded = set(result["modules"])
+    packages = _parse_importtime(process.stderr)
+    return {
+        "elapsed_ms": result["elapsed_ms"],
+        "forbidden": [name for name in FORBIDDEN if name in loaded],
+        "reported": {name: packages.get(name, 0) / 1000 for name in REPORTED if name in loaded},
+        "slowest": sorted(((name, us / 1000) for name, us in packages.items()), key=lambda p: -p[1])[:10],
+        "created_files": created,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time benchmark of the collection-only path")
+    parser.add_argument("--budget-ms", type=float, default=1000,
+                        help="maximum time importing the collection path may take")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    result = measure()
+    failures = []
+    if result["forbidden"]:
+        failures.append("heavy dependencies loaded: " + ", ".join(result["forbidden"]))
+    if result["created_files"]:
+        failures.append("files created at import time: " + ", ".join(result["created_files"]))
+    if result["elapsed_ms"] > args.budget_ms:
+        failures.append(f"import took {result['elapsed_ms']:.0f} ms, budget is {args.budget_ms:.0f} ms")
+
+    if args.json:
+        print(json.dumps(dict(result, failures=failures)))
+    else:
+        print(f"collection path imported in {result['elapsed_ms']:.1f} ms")
+        for name, ms in result["slowest"]:
+            print(f"{name:>30} {ms:>9.1f} ms")
+        for failure in failures:
+            print("[Import Time] - FAILED:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Scaling benchmark of the DeepSUMO pipeline on synthetic grid networks.
+
+Measures wall time and peak memory of graph construction, data collection
+(process_next_interval), apply_moving_average, dataset creation and a training
+step for growing detector counts. SUMO is replaced by benchmarks.sumo_stub, so the
+benchmark runs without a SUMO installation. Every size runs in a fresh process and
+every stage prints one JSON line, so results of different versions can be compared.
+
+Run from the src directory:
+    python -m benchmarks.pipeline_scaling --nodes 250 1000 4000 --intervals 288 --output scaling.jsonl
+
+Memory is reported as the tracemalloc peak of the allocations made during the stage
+(Python and NumPy allocations, not torch tensors) and the peak resident set size of
+the process after the stage. tracemalloc slows
+down Python heavy stages, use --no-tracemalloc for precise wall times.
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks import sumo_stub
+from store.compact_net_store import compact_net_store, _hash_file
+
+
+def grid_network(num_edges: int, spacing: float = 200.0, speed: float = 13.89) -> compact_net_store:
+    """
+    Create a square grid network with at least num_edges single lane edges.
+    Neighboring junctions are connected by one edge in each direction, every edge leads to all
+    edges leaving its end junction except the one turning back.
+    :param num_edges: minimum number of edges
+    :param spacing: distance between neighboring junctions
+    :param speed: speed limit of all edges
+    :return: compact net store of the grid
+    """
+    # a grid of size x size junctions has 4 * size * (size - 1) edges
+    size = max(2, math.ceil((1 + math.sqrt(1 + num_edges)) / 2))
+    junction = np.arange(size * size).reshape(size, size)
+    horizontal = np.stack([junction[:, :-1].ravel(), junction[:, 1:].ravel()], axis=1)
+    vertical = np.stack([junction[:-1, :].ravel(), junction[1:, :].ravel()], axis=1)
+    pairs = np.concatenate([horizontal, vertical])
+    edges = np.concatenate([pairs, pairs[:, ::-1]])
+    num = len(edges)
+
+    position = np.stack([junction.ravel() % size, junction.ravel() // size], axis=1) * spacing
+    start, end = position[edges[:, 0]], position[edges[:, 1]]
+    # shift lanes to the right side of the road, so opposing lanes do not overlap
+    direction = (end - start) / spacing
+    offset = np.stack([direction[:, 1], -direction[:, 0]], axis=1) * 1.6
+    shape_coords = np.stack([start + offset, end + offset], axis=1).reshape(-1, 2)
+
+    # successors are all edges leaving the end junction, except the reverse edge
+    order = np.argsort(edges[:, 0], kind="stable")
+    out_ptr = np.searchsorted(edges[order, 0], np.arange(size * size + 1))
+    counts = out_ptr[edges[:, 1] + 1] - out_ptr[edges[:, 1]]
+    candidates = order[np.concatenate([np.arange(out_ptr[j], out_ptr[j + 1]) for j in edges[:, 1]])]
+    owner = np.repeat(np.arange(num), counts)
+    keep = edges[candidates, 1] != edges[owner, 0]
+    successors = candidates[keep]
+    successor_ptr = np.zeros(num + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner[keep], minlength=num), out=successor_ptr[1:])
+
+    edge_ids = np.array([f"e{i}" for i in range(num)], dtype=str)
+    return compact_net_store({
+        "lane_ids": np.array([f"e{i}_0" for i in range(num)], dtype=str),
+        "lane_edge": np.arange(num, dtype=np.int32),
+        "lane_speed": np.full(num, speed),
+        "lane_length": np.full(num, spacing),
+        "shape_coords": shape_coords,
+        "shape_offsets": np.arange(0, 2 * num + 1, 2, dtype=np.int64),
+        "edge_ids": edge_ids,
+        "edge_names": edge_ids,
+        "edge_types": np.full(num, "highway.primary"),
+        "edge_speed": np.full(num, speed),
+        "edge_length": np.full(num, spacing),
+        "edge_lane_ptr": np.arange(num + 1, dtype=np.int64),
+        "successor_ptr": successor_ptr,
+        "successors": successors.astype(np.int32),
+    })
+
+
+class _stage:
+    """
+    Context manager measuring wall time and peak memory of a stage and printing it as JSON line
+    """
+
+    def __init__(self, name: str, info: dict, stream, output: str, use_tracemalloc: bool,
+                 calls: int = None) -> None:
+        self.name = name
+        self.info = info
+        self.stream = stream
+        self.output = output
+        self.use_tracemalloc = use_tracemalloc
+        self.calls = calls
+        self.extra = {}
+
+    def __enter__(self):
+        if self.use_tracemalloc:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall = time.perf_counter() - self.start
+        result = dict(self.info, stage=self.name, wall_s=wall)
+        if self.calls:
+            result["per_call_ms"] = 1000 * wall / self.calls
+        if self.use_tracemalloc:
+            result["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        # ru_maxrss is reported in kilobytes on Linux
+        result["maxrss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        if exc is not None:
+            result["error"] = f"{type(exc).__name__}: {exc}"
+        result.update(self.extra)
+        line = json.dumps(result)
+        print(line, file=self.stream, flush=True)
+        if self.output is not None:
+            with open(self.output, "a") as file:
+                file.write(line + "\n")
+        # continue with the remaining sizes if a stage runs out of memory
+        return isinstance(exc, MemoryError)
+
+
+def _version() -> dict:
+    """ Get the versions the benchmark ran with"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__}
+
+
+def run_size(args, num_nodes: int, stream):
+    """
+    Run all stages for one detector count in the current process
+    :param args: parsed command line arguments
+    :param num_nodes: number of detectors
+    :param stream: stream the JSON lines are printed to
+    """
+    net = grid_network(num_nodes, spacing=args.spacing)
+    detector_ids = [f"det_{i}" for i in range(num_nodes)]
+    lane_ids = [str(lane_id) for lane_id in net.lane_ids[:num_nodes]]
+    sumo_stub.configure(detector_ids, lane_ids, np.asarray(net.lane_length[:num_nodes]) / 2,
+                        np.asarray(net.lane_speed[:num_nodes]), [str(e) for e in net.edge_ids],
+                        net.get_travel_times(), seed=args.seed)
+    sumo_stub.install()
+
+    # DeepSUMO modules have to be imported after the stub is installed
+    from manager.data_manager import data_manager
+    from generator.detector_node_connector import distance_connector_strategy, dijkstra_connector_strategy, \
+        knn_distance_connector_strategy, knn_dijkstra_connector_strategy
+
+    info = dict(_version(), nodes=num_nodes, intervals=args.intervals, strategy=args.strategy,
+                edge_weights=args.edge_weights, sumo_edges=len(net.edge_ids))
+    stage = lambda name, calls=None: _stage(name, info, stream, args.output, not args.no_tracemalloc, calls)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # the net file only identifies the cached store, load_net memory-maps the store from the cache
+        net_path = os.path.join(directory, "grid.net.txt")
+        with open(net_path, "w") as file:
+            file.write(f"synthetic grid with {len(net.edge_ids)} edges and spacing {args.spacing}\n")
+        cache_dir = os.path.join(directory, "cache")
+        net.save(os.path.join(cache_dir, _hash_file(net_path)[:16]))
+
+        settings = {
+            "sumo_net_path": net_path,
+            "net_cache_dir": cache_dir,
+            "total_graphs": args.intervals,
+            "collect_edge_weights": args.edge_weights,
+            "N_HIST": 12,
+            "N_PRED": 9,
+        }
+        if args.strategy == "dijkstra":
+            strategy = dijkstra_connector_strategy(args.threshold / 13.89)
+        elif args.strategy == "knn_distance":
+            strategy = knn_distance_connector_strategy(args.k, args.threshold)
+        elif args.strategy == "knn_dijkstra":
+            strategy = knn_dijkstra_connector_strategy(args.k, args.threshold / 13.89)
+        else:
+            strategy = distance_connector_strategy(args.threshold)
+
+        manager = None
+        with stage("graph_build"):
+            manager = data_manager(settings, strategy)
+            info["edges"] = int(manager.numpy.get_edge_index().shape[1])
+        if manager is None:
+            return
+
+        with stage("process_next_interval", calls=args.intervals):
+            for _ in range(args.intervals):
+                sumo_stub.simulationStep()
+                manager.numpy.process_next_interval()
+                manager.add_processing_step()
+
+        with stage("apply_moving_average"):
+            manager.numpy.apply_moving_average()
+
+        if args.skip_training:
+            return
+
+        import torch
+        from torch_geometric.loader import DataLoader
+        from torch_geo.dataset.adaptive_speed2vec_dataset import adaptive_speed2vec_dataset
+        from torch_geo.model.trainer import build_model
+
+        dataset = None
+        with stage("dataset_build"):
+            dataset = adaptive_speed2vec_dataset(manager, args.intervals, root=os.path.join(directory, "dataset"))
+        if dataset is None:
+            return
+
+        config = dict(settings, N_NODE=num_nodes, MODEL=args.model)
+        torch.manual_seed(args.seed)
+        model = build_model(config)
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+        loss_fn = torch.nn.MSELoss()
+        loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True)
+        batches = [batch for _, batch in zip(range(args.train_steps + 1), loader)]
+        # the first batch only warms up, without a second batch there is nothing to measure
+        if len(batches) < 2:
+            print("[Pipeline Scaling] - Skipping train_step, the dataset of", len(dataset), "windows yields",
+                  len(batches), "batches of size", args.batch_size)
+            return
+
+        def train_step(batch):
+            optimizer.zero_grad()
+            loss = loss_fn(torch.squeeze(model(batch, 'cpu')).float(), torch.squeeze(batch.y).float())
+            loss.backward()
+            optimizer.step()
+
+        model.train()
+        train_step(batches[0])
+        with stage("train_step", calls=len(batches) - 1) as measured:
+            for batch in batches[1:]:
+                train_step(batch)
+            measured.extra = {"batch_size": args.batch_size, "model": args.model, "threads": torch.get_num_threads()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the DeepSUMO pipeline")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[250, 1000, 4000], help="detector counts")
+    parser.add_argument("--intervals", type=int, default=288, help="number of collected intervals")
+    parser.add_argument("--strategy", choices=["distance", "dijkstra", "knn_distance", "knn_dijkstra"],
+                        default="distance")
+    parser.add_argument("--k", type=int, default=8, help="number of neighbors of the knn strategies")
+    parser.add_argument("--threshold", type=float, default=450,
+                        help="connection threshold in meters, converted to seconds for dijkstra")
+    parser.add_argument("--spacing", type=float, default=200, help="distance between grid junctions")
+    parser.add_argument("--edge-weights", action="store_true", help="collect travel time edge weights")
+    parser.add_argument("--model", default="ST_GAT", help="ST_GAT or ST_GAT_SHARED")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--train-steps", type=int, default=5)
+    parser.add_argument("--skip-training", action="store_true", help="only benchmark the collection stages")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="do not trace allocations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON lines file the results are appended to")
+    parser.add_argument("--in-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.in_process:
+        # DeepSUMO prints progress messages, only the JSON lines go to stdout
+        stream = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            run_size(args, args.nodes[0], stream)
+        return
+
+    # every size runs in a fresh process, so peak memory is not carried over between sizes,
+    # the last --nodes argument overrides the sizes passed to this process
+    for num_nodes in args.nodes:
+        process = subprocess.run([sys.executable, "-m", "benchmarks.pipeline_scaling"] + sys.argv[1:] +
+                                 ["--in-process", "--nodes", str(num_nodes)],
+                                 cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 stderr=subprocess.PIPE, text=True)
+        if process.returncode != 0:
+            print(process.stderr[-2000:], file=sys.stderr)
+            print(json.dumps({"nodes": num_nodes, "error": f"benchmark process exited with {process.returncode}"}))
+
+
+if __name__ == "__main__":
+    main()
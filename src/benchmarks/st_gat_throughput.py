@@ -0,0 +1,157 @@
+"""
+Training throughput benchmark of the ST-GAT models on synthetic graphs.
+
+Reports samples/sec and how the time of one training step is split between
+data loading, forward pass, backward pass and optimizer step.
+
+Run from the src directory:
+    python -m benchmarks.st_gat_throughput --nodes 1000 --threads 8 --bf16
+"""
+import argparse
+import json
+import time
+
+import torch
+from torch_geometric.data import Data
+
+from torch_geo.model.trainer import build_model
+from torch_geo.model.throughput import configure_threads, make_loader, autocast, compile_model
+
+
+def synthetic_dataset(n_nodes: int, degree: int, n_samples: int, n_hist: int, n_pred: int,
+                      seed: int = 0) -> list[Data]:
+    """
+    Create a synthetic dataset of random speed windows on a random graph
+    :param n_nodes: number of nodes of the graph
+    :param degree: number of outgoing edges of each node
+    :param n_samples: number of windows
+    :param n_hist: number of preceding steps of each window
+    :param n_pred: number of prediction steps of each window
+    :param seed: random seed
+    :return: list of graphs
+    """
+    generator = torch.Generator().manual_seed(seed)
+    source = torch.arange(n_nodes).repeat_interleave(degree)
+    target = torch.randint(0, n_nodes, (n_nodes * degree,), generator=generator)
+    edge_index = torch.stack([source, target])
+
+    speeds = torch.randn(n_samples + n_hist + n_pred, n_nodes, generator=generator)
+    dataset = []
+    for i in range(n_samples):
+        window = speeds[i:i + n_hist + n_pred].T
+        dataset.append(Data(x=window[:, :n_hist].contiguous(), y=window[:, n_hist:].contiguous(),
+                            edge_index=edge_index))
+    return dataset
+
+
+def run_benchmark(config: dict, n_nodes: int, degree: int, steps: int, warmup: int) -> dict:
+    """
+    Benchmark training steps of the ST-GAT model
+    :param config: settings object containing the model and throughput settings
+    :param n_nodes: number of nodes of the synthetic graph
+    :param degree: number of outgoing edges of each node
+    :param steps: number of measured training steps
+    :param warmup: number of training steps before measuring
+    :return: dictionary containing the results
+    """
+    configure_threads(config)
+    device = 'cpu'
+    dataset = synthetic_dataset(n_nodes, degree, config['BATCH_SIZE'] * 4, config['N_HIST'], config['N_PRED'])
+    loader = make_loader(dataset, config, shuffle=True)
+
+    model = build_model(dict(config, N_NODE=n_nodes), dropout=config['DROPOUT'])
+    optimizer = torch.optim.Adam(model.parameters(), lr=config['INITIAL_LR'])
+    train_model = compile_model(model, config)
+    train_model.train()
+    loss_fn = torch.nn.MSELoss()
+
+    timings = {"data": 0.0, "forward": 0.0, "backward": 0.0, "optimizer": 0.0}
+    samples = 0
+    iterator = iter(loader)
+    for step in range(warmup + steps):
+        t0 = time.perf_counter()
+        try:
+            batch = next(iterator)
+        except StopIteration:
+            iterator = iter(loader)
+            batch = next(iterator)
+        batch = batch.to(device)
+        t1 = time.perf_counter()
+
+        optimizer.zero_grad()
+        with autocast(device, config):
+            y_pred = torch.squeeze(train_model(batch, device))
+        loss = loss_fn(y_pred.float(), torch.squeeze(batch.y).float())
+        t2 = time.perf_counter()
+
+        loss.backward()
+        t3 = time.perf_counter()
+
+        optimizer.step()
+        t4 = time.perf_counter()
+
+        if step >= warmup:
+            timings["data"] += t1 - t0
+            timings["forward"] += t2 - t1
+            timings["backward"] += t3 - t2
+            timings["optimizer"] += t4 - t3
+            samples += batch.num_graphs
+
+    total = sum(timings.values())
+    return {
+        "model": config.get('MODEL', 'ST_GAT'),
+        "nodes": n_nodes,
+        "edges": n_nodes * degree,
+        "batch_size": config['BATCH_SIZE'],
+        "threads": torch.get_num_threads(),
+        "bf16": bool(config.get('BF16', False)),
+        "compile": bool(config.get('COMPILE', False)),
+        "samples_per_sec": samples / total,
+        "step_ms": {name: 1000 * value / steps for name, value in timings.items()},
+        "step_share": {name: value / total for name, value in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ST-GAT training throughput benchmark")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[274], help="graph sizes to benchmark")
+    parser.add_argument("--model", default="ST_GAT", help="ST_GAT or ST_GAT_SHARED")
+    parser.add_argument("--degree", type=int, default=8, help="outgoing edges per node")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--n-hist", type=int, default=12)
+    parser.add_argument("--n-pred", type=int, default=9)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--pin-memory", action="store_true")
+    parser.add_argument("--bf16", action="store_true")
+    parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    config = {
+        'MODEL': args.model,
+        'N_HIST': args.n_hist,
+        'N_PRED': args.n_pred,
+        'BATCH_SIZE': args.batch_size,
+        'DROPOUT': 0.0,
+        'INITIAL_LR': 3e-4,
+        'NUM_THREADS': args.threads,
+        'NUM_WORKERS': args.workers,
+        'PIN_MEMORY': args.pin_memory,
+        'BF16': args.bf16,
+        'COMPILE': args.compile,
+    }
+
+    for n_nodes in args.nodes:
+        result = run_benchmark(config, n_nodes, args.degree, args.steps, args.warmup)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            split = ", ".join(f"{name}: {ms:.1f} ms" for name, ms in result["step_ms"].items())
+            print(f"nodes: {n_nodes}, samples/sec: {result['samples_per_sec']:.1f} ({split})")
+
+
+if __name__ == "__main__":
+    main()
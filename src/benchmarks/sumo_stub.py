@@ -0,0 +1,121 @@
+"""
+Local stand-in for the parts of the TraCI API used by DeepSUMO, used by the benchmarks.
+
+The stub serves a fixed set of induction loops and edges and generates random but
+reproducible measurements for every simulation step, so the data collection code can
+be benchmarked without a SUMO installation. install() has to be called before any
+DeepSUMO module importing traci is imported.
+"""
+import sys
+import types
+
+import numpy as np
+
+constants = types.ModuleType("traci.constants")
+constants.VAR_CURRENT_TRAVELTIME = 0x5a
+
+inductionloop = types.SimpleNamespace()
+trafficlight = types.SimpleNamespace()
+edge = types.SimpleNamespace()
+
+_state = {
+    "detectors": [],
+    "detector_lookup": {},
+    "lanes": [],
+    "positions": None,
+    "ref_speeds": None,
+    "edges": [],
+    "edge_lookup": {},
+    "free_flow": None,
+    "subscriptions": [],
+    "step": 0,
+    "rng": np.random.default_rng(0),
+    "speed": None,
+    "occupancy": None,
+    "vehicles": None,
+    "travel_times": None,
+}
+
+
+def configure(detector_ids: list[str], lane_ids: list[str], positions: np.array, ref_speeds: np.array,
+              edge_ids: list[str] = None, free_flow: np.array = None, seed: int = 0):
+    """
+    Set up the induction loops and edges served by the stub
+    :param detector_ids: ids of the induction loops
+    :param lane_ids: lane id of each induction loop
+    :param positions: position of each induction loop on its lane
+    :param ref_speeds: speed limit of the lane of each induction loop, used to generate speeds
+    :param edge_ids: ids of the edges
+    :param free_flow: free flow travel time of each edge
+    :param seed: random seed of the generated measurements
+    """
+    _state["detectors"] = list(detector_ids)
+    _state["detector_lookup"] = {detector_id: i for i, detector_id in enumerate(detector_ids)}
+    _state["lanes"] = list(lane_ids)
+    _state["positions"] = np.asarray(positions, dtype=np.float64)
+    _state["ref_speeds"] = np.asarray(ref_speeds, dtype=np.float64)
+    _state["edges"] = list(edge_ids or [])
+    _state["edge_lookup"] = {edge_id: i for i, edge_id in enumerate(_state["edges"])}
+    _state["free_flow"] = np.asarray(free_flow if free_flow is not None else [], dtype=np.float64)
+    _state["subscriptions"] = []
+    _state["step"] = 0
+    _state["rng"] = np.random.default_rng(seed)
+    simulationStep()
+
+
+def install():
+    """ Register the stub as traci module, so "import traci" returns it"""
+    module = sys.modules[__name__]
+    sys.modules["traci"] = module
+    sys.modules["traci.constants"] = constants
+
+
+def start(cmd):
+    pass
+
+
+def close():
+    pass
+
+
+def simulationStep():
+    """ Advance the stub by one step and generate new measurements"""
+    rng = _state["rng"]
+    num_detectors = len(_state["detectors"])
+    vehicles = rng.poisson(3.0, num_detectors).astype(np.float64)
+    speed = _state["ref_speeds"] * rng.uniform(0.3, 1.0, num_detectors)
+    # SUMO reports -1 if no vehicle passed the detector
+    speed[vehicles == 0] = -1.0
+    _state["vehicles"] = vehicles
+    _state["speed"] = speed
+    _state["occupancy"] = np.minimum(vehicles * rng.uniform(2.0, 8.0, num_detectors), 100.0)
+    _state["travel_times"] = _state["free_flow"] * rng.uniform(1.0, 2.0, len(_state["free_flow"]))
+    _state["step"] += 1
+
+
+inductionloop.getIDList = lambda: list(_state["detectors"])
+inductionloop.getLaneID = lambda detector_id: _state["lanes"][_state["detector_lookup"][detector_id]]
+inductionloop.getPosition = lambda detector_id: float(_state["positions"][_state["detector_lookup"][detector_id]])
+inductionloop.getLastIntervalMeanSpeed = \
+    lambda detector_id: float(_state["speed"][_state["detector_lookup"][detector_id]])
+inductionloop.getLastIntervalOccupancy = \
+    lambda detector_id: float(_state["occupancy"][_state["detector_lookup"][detector_id]])
+inductionloop.getLastIntervalVehicleNumber = \
+    lambda detector_id: int(_state["vehicles"][_state["detector_lookup"][detector_id]])
+
+trafficlight.getIDList = lambda: []
+
+
+def _subscribe_edge(edge_id: str, variables: list[int]):
+    _state["subscriptions"].append(edge_id)
+
+
+def _edge_subscription_results() -> dict:
+    lookup = _state["edge_lookup"]
+    travel_times = _state["travel_times"]
+    return {edge_id: {constants.VAR_CURRENT_TRAVELTIME: float(travel_times[lookup[edge_id]])}
+            for edge_id in _state["subscriptions"]}
+
+
+edge.subscribe = _subscribe_edge
+edge.getAllSubscriptionResults = _edge_subscription_results
@@ -1,9 +1,14 @@
-from generator.detector_node_connector import detector_connector_strategy, node_connector
-import networkx as nx
-import sumolib
+from __future__ import annotations
+
+from generator.detector_node_connector import detector_connector_strategy, node_connector, get_detector_positions
 import numpy as np
 from controllers.translation_controller import translation_controller
 import traci
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import networkx as nx
+    import sumolib
 
 
 class detector_graph_controller:
@@ -26,6 +31,8 @@ class detector_graph_controller:
         :param settings: DeepSUMO's settings object
         :param translation: Translation controller for translation services
         """
+        import networkx as nx
+
         print("[Detector Graph Controller] - Generating graph, "
               "this can take a while...")
         self._graph_nodes = translation.get_order()
@@ -54,6 +61,12 @@ class detector_graph_controller:
 
         return ref_speeds
 
+    def get_detector_positions(self) -> np.array:
+        """ Get the coordinates of all detectors in the order of the translation (torch IDs)
+        :return: positions of shape (num_detectors, 2)
+        """
+        return get_detector_positions(self._graph_nodes, self._net)
+
     def get_detector_graph(self) -> nx.DiGraph:
         """ Get the detector graph as a NetworkX DiGraph.
 
@@ -68,7 +81,7 @@ class detector_graph_controller:
         :return: the adjacency matrix of size (num_detectors, num_detectors)
         containing the cost values
         """
-        return self._connector._adj_matrix_cost
+        return self._connector.get_cost_adj_matrix()
 
     def get_binary_adj_matrix(self):
         """ Get the binary adjacency matrix of the graph
@@ -76,7 +89,14 @@ class detector_graph_controller:
         :return: the binary adjacency matrix
         of size (num_detectors, num_detectors)
         """
-        return self._connector._adj_matrix_binary
+        return self._connector.get_binary_adj_matrix()
+
+    def get_edge_costs(self):
+        """ Get the cost of every edge of the graph, aligned with the edge-lists
+        and the edge index of the store
+        :return: array of size (num_edges)
+        """
+        return self._connector.get_edge_costs()
 
     def get_edge_list_by_index(self):
         """ Get edge-list of graph containing indices
@@ -94,8 +114,7 @@ class detector_graph_controller:
         """ Sets up the nodes of the nx.DiGraph
         :param settings: settings object of DeepSUMO
         """
-        for detector_id in self._graph_nodes:
-            self._detector_graph.add_node(detector_id)
+        self._detector_graph.add_nodes_from(self._graph_nodes)
 
     def set_strat(self, strat: detector_connector_strategy):
         """ Set strategy of graph. This will not trigger a recalculation of
@@ -123,5 +142,4 @@ class detector_graph_controller:
         self._detector_graph.clear_edges()
         tmp_edges: np.array = self._connector._edge_list_sumo_ids
 
-        for edge in tmp_edges:
-            self._detector_graph.add_edge(edge[0], edge[1])
+        self._detector_graph.add_edges_from(tmp_edges.tolist())
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import numpy as np
+import traci
+import traci.constants as tc
+from controllers.translation_controller import translation_controller
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import sumolib
+
+
+class edge_weight_controller:
+    """
+    Class that collects the current travel times of the SUMO edges and maps them onto the edges of the detector graph.
+
+    The weight of a detector graph edge is the travel time along the fastest path between both detectors, adjusted
+    to the detector positions like in eq. 3: every SUMO edge of the path contributes a fraction of its travel time,
+    the first edge from the source detector to its end, the last edge from its start to the target detector.
+    The paths and fractions are computed once and stored as CSR arrays, each interval only the detector graph edges
+    whose SUMO edges changed their travel time are recomputed.
+    """
+    _sumo_edge_ids: list[str] = []
+    _travel_times: np.array = None
+    _weights: np.array = None
+
+    # CSR arrays of the paths, entries path_ptr[i]:path_ptr[i + 1] belong to detector graph edge i
+    _path_ptr: np.array = None
+    _path_edges: np.array = None
+    _path_fractions: np.array = None
+
+    # CSR arrays of the entries each SUMO edge occurs in
+    _entry_ptr: np.array = None
+    _entries: np.array = None
+
+    def __init__(self, net: sumolib.net.Net, edge_index: np.array, translation: translation_controller) -> None:
+        """
+        Initialize controller, compute the paths of all detector graph edges and subscribe to the travel times
+        :param net: sumolib net object
+        :param edge_index: edge index of the detector graph, the weights are aligned with it
+        :param translation: translation controller
+        """
+        print("[Edge Weight Controller] - Computing paths of detector graph edges...")
+        edge_index = np.asarray(edge_index)
+        source_ids = translation.get_detector_ids(edge_index[0]).tolist()
+        target_ids = translation.get_detector_ids(edge_index[1]).tolist()
+        detectors = {detector_id: (net.getLane(traci.inductionloop.getLaneID(detector_id)).getEdge(),
+                                   traci.inductionloop.getPosition(detector_id))
+                     for detector_id in set(source_ids) | set(target_ids)}
+
+        self._build_paths(net, source_ids, target_ids, detectors)
+        print("[Edge Weight Controller] - Paths use", len(self._sumo_edge_ids), "SUMO edges,",
+              int(np.count_nonzero(np.diff(self._path_ptr) == 0)), "detector graph edges have no path")
+
+        for edge_id in self._sumo_edge_ids:
+            traci.edge.subscribe(edge_id, [tc.VAR_CURRENT_TRAVELTIME])
+        self._weights = self._compute_weights(np.arange(len(source_ids)))
+        print("[Edge Weight Controller] - Initialized!")
+
+    def _build_paths(self, net: sumolib.net.Net, source_ids: list[str], target_ids: list[str], detectors: dict):
+        """
+        Compute the fastest path of each detector graph edge using free flow travel times
+        and store the SUMO edges and fractions as CSR arrays
+        :param net: sumolib net object
+        :param source_ids: SUMO-ID of the source detector of each edge
+        :param target_ids: SUMO-ID of the target detector of each edge
+        :param detectors: dictionary of detector to <SUMO edge, position>
+        """
+        edge_lookup: dict[str, int] = {}
+        free_flow: list[float] = []
+        path_cache: dict[tuple[str, str], list] = {}
+        path_ptr, path_edges, path_fractions = [0], [], []
+
+        for source_id, target_id in zip(source_ids, target_ids):
+            edge_a, pos_a = detectors[source_id]
+            edge_b, pos_b = detectors[target_id]
+            key = (edge_a.getID(), edge_b.getID())
+            if key not in path_cache:
+                path_cache[key], _ = net.getFastestPath(edge_a, edge_b)
+            path = path_cache[key]
+
+            if path is not None:
+                fractions = [1.0] * len(path)
+                # adjust fractions of first and last edge according to eq. 3
+                fractions[0] -= pos_a / edge_a.getLength() if edge_a.getLength() > 0 else 1.0
+                fractions[-1] -= (edge_b.getLength() - pos_b) / edge_b.getLength() if edge_b.getLength() > 0 else 1.0
+                for edge, fraction in zip(path, fractions):
+                    if edge.getID() not in edge_lookup:
+                        edge_lookup[edge.getID()] = len(edge_lookup)
+                        free_flow.append(edge.getLength() / edge.getSpeed())
+                    path_edges.append(edge_lookup[edge.getID()])
+                    path_fractions.append(fraction)
+            path_ptr.append(len(path_edges))
+
+        self._sumo_edge_ids = list(edge_lookup)
+        self._travel_times = np.array(free_flow, dtype=np.float64)
+        self._path_ptr = np.array(path_ptr, dtype=np.int64)
+        self._path_edges = np.array(path_edges, dtype=np.int64)
+        self._path_fractions = np.array(path_fractions, dtype=np.float64)
+
+        # invert the paths, so the entries of a changed SUMO edge can be found directly
+        self._entries = np.argsort(self._path_edges, kind="stable")
+        self._entry_ptr = np.searchsorted(self._path_edges[self._entries], np.arange(len(self._sumo_edge_ids) + 1))
+
+    def _compute_weights(self, rows: np.array) -> np.array:
+        """
+        Compute the weights of some detector graph edges from the current travel times
+        :param rows: indices of the detector graph edges
+        :return: weights of the edges, edges without a path have the weight NaN
+        """
+        starts = self._path_ptr[rows]
+        lengths = self._path_ptr[rows + 1] - starts
+        # gather all path entries of the rows
+        local_row = np.repeat(np.arange(len(rows)), lengths)
+        entries = np.arange(len(local_row)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + starts[local_row]
+
+        contributions = self._path_fractions[entries] * self._travel_times[self._path_edges[entries]]
+        weights = np.bincount(local_row, weights=contributions, minlength=len(rows))
+        weights[lengths == 0] = np.nan
+        return weights
+
+    def collect(self) -> np.array:
+        """
+        Collect the current travel times of all subscribed SUMO edges and update the weights
+        of the detector graph edges whose paths contain a changed SUMO edge.
+        This is an internal method and should NOT be used by the user.
+        :return: weights of all detector graph edges, aligned with the edge index
+        """
+        results = traci.edge.getAllSubscriptionResults()
+        travel_times = np.fromiter((results[edge_id][tc.VAR_CURRENT_TRAVELTIME] for edge_id in self._sumo_edge_ids),
+                                   dtype=np.float64, count=len(self._sumo_edge_ids))
+
+        changed = np.flatnonzero(travel_times != self._travel_times)
+        self._travel_times = travel_times
+        if len(changed) > 0:
+            lengths = self._entry_ptr[changed + 1] - self._entry_ptr[changed]
+            positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) \
+                + np.repeat(self._entry_ptr[changed], lengths)
+            # detector graph edge of each changed entry
+            rows = np.unique(np.searchsorted(self._path_ptr, self._entries[positions], side="right") - 1)
+            self._weights[rows] = self._compute_weights(rows)
+        return self._weights
+
+    def get_weights(self) -> np.array:
+        """ Get the current weights of all detector graph edges"""
+        return self._weights
+
+    def get_sumo_edge_ids(self) -> list[str]:
+        """ Get the SUMO-IDs of all edges used by the paths of the detector graph"""
+        return self._sumo_edge_ids
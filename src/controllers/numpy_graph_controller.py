@@ -1,7 +1,15 @@
+from __future__ import annotations
+
+import numpy as np
 import traci
-import networkx as nx
 from controllers.translation_controller import translation_controller
+from controllers.edge_weight_controller import edge_weight_controller
+from generator.feature_pipeline import feature_pipeline
 from store.numpy_graph_store import numpy_graph_store
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 
 class numpy_graph_controller:
@@ -12,76 +20,120 @@ class numpy_graph_controller:
     _numpy_store = None
     _processing_order: list[str] = []
     _reference_speeds: dict[str, float]
+    _reference_speed_array: np.array = None
+    _pipeline: feature_pipeline = None
+    _edge_weights: edge_weight_controller = None
 
     def __init__(self, total_graphs: int, graph: nx.DiGraph,
-                 translation: translation_controller, ref_speeds) -> None:
+                 translation: translation_controller, ref_speeds, pipeline: feature_pipeline = None,
+                 aggregation_levels: list[int] = None, shared_memory_name: str = None,
+                 storage_dtypes: dict[str, str] = None) -> None:
         """
         Initialize controller and create numpy store object
+        :param pipeline: feature pipeline computing the node features, defaults to speed, occupancy and vehicles
+        :param aggregation_levels: numbers of intervals the store additionally aggregates into coarser resolutions
+        :param shared_memory_name: if set, the node features are shared with other processes under this name
+        :param storage_dtypes: storage dtype of some node features, e.g. {"speed": "float16", "vehicles": "uint8"}
         """
-        self._numpy_store = numpy_graph_store(total_graphs, graph, translation)
+        self._pipeline = pipeline if pipeline is not None else feature_pipeline()
+        self._numpy_store = numpy_graph_store(total_graphs, graph, translation, self._pipeline.get_aggregations(),
+                                              aggregation_levels, shared_memory_name, storage_dtypes)
         self._reference_speeds = ref_speeds
         self._processing_order = translation.get_order()
+        self._reference_speed_array = np.array([ref_speeds[detector_id] for detector_id in self._processing_order],
+                                               dtype=np.float64)
         print("[Numpy Graph Controller] - Initialized!")
 
+    def set_edge_weight_controller(self, edge_weights: edge_weight_controller):
+        """
+        Collect the edge weights of the detector graph each interval using the passed controller
+        :param edge_weights: edge weight controller
+        """
+        self._edge_weights = edge_weights
+        self._numpy_store.enable_edge_weights()
+
     def process_next_interval(self):
         """
         Collect data from SUMO using TraCi and add them to the store.
+        The raw measurements of all detectors are collected into arrays and the node features
+        are computed from them by the feature pipeline.
         This is an internal method and should NOT be used by the user.
         """
-        feature_list = []
-        cnt = 0
-        # iterate over all detectors
-        for detector_id in self._processing_order:
-            tmp = []
-            # collect speed from SUMO
-            speed = traci.inductionloop.getLastIntervalMeanSpeed(detector_id)
-            # if no speed was recorded (= no car passed the detector)
-            # use the speed limit
-            if speed == -1.0:
-                speed = self._reference_speeds[detector_id]
-                tmp.append(speed)
-            else:
-                vehicle_mean_speed = traci.inductionloop\
-                    .getLastIntervalMeanSpeed(detector_id)
-                ref_speed = self._reference_speeds[detector_id]
-                # adjust occupancy value according to eq. 4
-                vehicle_occupancy = traci.inductionloop\
-                    .getLastIntervalOccupancy(detector_id) / \
-                    traci.inductionloop.getLastIntervalVehicleNumber(detector_id)
-                if vehicle_occupancy >= 1.0:
-                    vehicle_occupancy = 1.0
-                # calculate final speed according to eq. 5
-                final_speed = vehicle_occupancy * vehicle_mean_speed + \
-                              (1.0 - vehicle_occupancy) * ref_speed
-
-                tmp.append(final_speed)
-
-            # collect and append other node features
-            tmp.append(traci.inductionloop.getLastIntervalOccupancy(detector_id))
-            tmp.append(traci.inductionloop.getLastIntervalVehicleNumber(detector_id))
-
-            feature_list.append(tmp)
-            cnt += 1
+        loops = traci.inductionloop
+        order = self._processing_order
+        num_nodes = len(order)
+        raw = {
+            "mean_speed": np.fromiter((loops.getLastIntervalMeanSpeed(d) for d in order),
+                                      dtype=np.float64, count=num_nodes),
+            "occupancy": np.fromiter((loops.getLastIntervalOccupancy(d) for d in order),
+                                     dtype=np.float64, count=num_nodes),
+            "vehicles": np.fromiter((loops.getLastIntervalVehicleNumber(d) for d in order),
+                                    dtype=np.float64, count=num_nodes),
+            "ref_speed": self._reference_speed_array,
+        }
 
         # add new features to the store
-        self._numpy_store.add_new_node_features(feature_list)
+        if self._edge_weights is not None:
+            self._numpy_store.add_new_edge_weights(self._edge_weights.collect())
+        self._numpy_store.add_new_node_features(self._pipeline.run(raw))
 
     def apply_moving_average(self):
         """ Apply moving average to currently stored data"""
         self._numpy_store.apply_moving_average()
 
+    def close_shared_memory(self):
+        """ Stop sharing the node features with other processes, the features stay available in this process"""
+        self._numpy_store.close_shared_memory()
+
     def get_edge_index(self):
         """ Get edge index"""
         return self._numpy_store.get_edge_index()
 
-    def get_speed_node_features(self):
-        """ Get speed node features up to the current timestep"""
-        return self._numpy_store.get_speed_features()
+    def get_edge_weights(self):
+        """ Get travel time edge weights of shape (num_timesteps, num_edges) aligned with the edge index
+        up to the current timestep, None if the "collect_edge_weights" setting is not enabled"""
+        return self._numpy_store.get_edge_weights()
+
+    def get_feature_names(self) -> list[str]:
+        """ Get names of all node features computed by the feature pipeline"""
+        return self._pipeline.get_feature_names()
+
+    def get_aggregation_levels(self) -> list[int]:
+        """ Get the aggregation levels set by the "aggregation_levels" setting"""
+        return self._numpy_store.get_aggregation_levels()
+
+    def get_storage_dtypes(self) -> dict[str, str]:
+        """ Get the storage dtype of every node feature, set by the "feature_dtypes" setting"""
+        return self._numpy_store.get_storage_dtypes()
+
+    def get_features(self, name: str, resolution: int = 1, raw: bool = False):
+        """ Get the node features with the passed name up to the current timestep, e.g. "flow"
+        for a flow_rate transform added to the feature pipeline. The features are returned in their storage dtype,
+        bfloat16 features are decoded to float32
+        :param resolution: number of intervals aggregated into one, 1 or one of the aggregation levels
+        :param raw: return bfloat16 features as stored (uint16), see torch_geo.dataset.speed_window_dataset"""
+        return self._numpy_store.get_features(name, resolution, raw)
+
+    def get_feature_statistics(self, name: str = "speed", per_node: bool = False):
+        """ Get mean and standard deviation of the node features up to the current timestep, maintained
+        while the intervals are collected
+        :param name: name of the feature
+        :param per_node: get the statistics of every node as arrays of size (num_nodes) instead of single values
+        :return: tuple of <mean, standard deviation>"""
+        statistics = self._numpy_store.get_statistics(name)
+        return statistics.get_mean(per_node), statistics.get_std(per_node)
+
+    def get_speed_node_features(self, resolution: int = 1):
+        """ Get speed node features up to the current timestep
+        :param resolution: number of intervals aggregated into one, 1 or one of the aggregation levels"""
+        return self._numpy_store.get_speed_features(resolution)
 
-    def get_occupancy_features(self):
-        """ Get occupancy node features up to the current timestep"""
-        return self._numpy_store.get_occupancy_features()
+    def get_occupancy_features(self, resolution: int = 1):
+        """ Get occupancy node features up to the current timestep
+        :param resolution: number of intervals aggregated into one, 1 or one of the aggregation levels"""
+        return self._numpy_store.get_occupancy_features(resolution)
 
-    def get_vehicle_number_features(self):
-        """ Get speed vehicle number features up to the current timestep"""
-        return self._numpy_store.get_vehicle_number_features()
+    def get_vehicle_number_features(self, resolution: int = 1):
+        """ Get speed vehicle number features up to the current timestep
+        :param resolution: number of intervals aggregated into one, 1 or one of the aggregation levels"""
+        return self._numpy_store.get_vehicle_number_features(resolution)
@@ -1,3 +1,4 @@
+import numpy as np
 import generator.translation_generator as tr_gen
 
 
@@ -8,20 +9,42 @@ class translation_controller:
     """
     _translation_gen: tr_gen.translation_generator = None
 
+    _detector_to_index: dict[str, int] = None
+    _index_to_detector: np.array = None
+
     def __init__(self) -> None:
         """
         Initialize translation controller and generate dictionaries
         """
         self._translation_gen = tr_gen.translation_generator()
+        self._detector_to_index = self._translation_gen.get_detector_to_index()
+        self._index_to_detector = self._translation_gen.get_index_to_detector()
         print("[Translation Controller] - Successfully initialized!")
 
     def get_detector_id(self, index: int) -> str:
         """Get SUMO-Id of detector at index"""
-        return self._translation_gen.get_index_to_detector()[index]
+        return str(self._index_to_detector[index])
 
     def get_index(self, detector_id: str) -> int:
         """Get index of SUMO detector"""
-        return self._translation_gen.get_detector_to_index()[detector_id]
+        return self._detector_to_index[detector_id]
+
+    def get_detector_ids(self, indices) -> np.array:
+        """
+        Get SUMO-Ids of multiple detectors
+        :param indices: array of detector indices
+        :return: array of SUMO-Ids
+        """
+        return self._index_to_detector[np.asarray(indices, dtype=np.int64)]
+
+    def get_indices(self, detector_ids) -> np.array:
+        """
+        Get indices of multiple SUMO detectors
+        :param detector_ids: iterable of SUMO-Ids
+        :return: array of indices
+        """
+        lookup = self._detector_to_index
+        return np.fromiter((lookup[detector_id] for detector_id in detector_ids), dtype=np.int64)
 
     def get_order(self) -> list[str]:
         """
@@ -1,8 +1,29 @@
+from __future__ import annotations
+
+import heapq
+import itertools
 import utils.mathstuff as ma
 import numpy as np
 import traci
-import sumolib
 import controllers.translation_controller as tr
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import sumolib
+
+
+def get_detector_positions(detector_ids: list[str], net: sumolib.net.Net) -> np.array:
+    """
+    Get the coordinates of all detectors using eq. 2
+    :param detector_ids: SUMO-IDs of all detectors
+    :param net: sumolib net object
+    :return: positions of shape (num_detectors, 2)
+    """
+    shapes = [net.getLane(traci.inductionloop.getLaneID(detector_id)).getShape()
+              for detector_id in detector_ids]
+    distances = [traci.inductionloop.getPosition(detector_id) for detector_id in detector_ids]
+    coords, offsets = ma.pack_shapes(shapes)
+    return ma.get_positions_from_shapes(coords, offsets, np.arange(len(detector_ids)), distances)
 
 
 class detector_connector_strategy:
@@ -32,6 +53,33 @@ class detector_connector_strategy:
         """
         return -1
 
+    def get_cost_matrix(self, detector_ids: list[str], net: sumolib.net.Net) -> np.array:
+        """
+        Get cost between all pairs of detectors. By default get_cost is called for every pair,
+        strategies can override this with a batch implementation.
+
+        :param detector_ids: SUMO-IDs of all detectors
+        :param net: sumolib net object
+        :return: cost matrix of shape (num_detectors, num_detectors), entry (a, b) is the cost from a to b
+        """
+        cost_matrix = np.zeros((len(detector_ids), len(detector_ids)))
+        for index_a, detector_a_id in enumerate(detector_ids):
+            for index_b, detector_b_id in enumerate(detector_ids):
+                cost_matrix[index_a, index_b] = self.get_cost(detector_a_id, detector_b_id, net)
+        return cost_matrix
+
+    def get_edges(self, detector_ids: list[str], net: sumolib.net.Net):
+        """
+        Get the edges of the detector graph directly. Strategies that only connect a bounded number of
+        detectors override this, so no cost matrix of all pairs has to be created. By default None is
+        returned and the edges are created from get_cost_matrix and the threshold.
+
+        :param detector_ids: SUMO-IDs of all detectors
+        :param net: sumolib net object
+        :return: None or tuple of <sources, targets, costs>, sources and targets are positions in detector_ids
+        """
+        return None
+
 
 class dijkstra_connector_strategy(detector_connector_strategy):
     """
@@ -91,21 +139,252 @@ class distance_connector_strategy(detector_connector_strategy):
         # return distance between both positions calculated using eq. 1
         return ma.get_distance_between(pos_a, pos_b)
 
+    def get_cost_matrix(self, detector_ids: list[str], net: sumolib.net.Net) -> np.array:
+        """
+        Get geographical distance between all pairs of detectors.
+        The position of each detector is calculated once and all distances in one pass.
+
+        :param detector_ids: SUMO-IDs of all detectors
+        :param net: sumolib net object
+        :return: cost matrix of shape (num_detectors, num_detectors)
+        """
+        # get individual positions of the detectors using eq. 2 and their distances using eq. 1
+        positions = get_detector_positions(detector_ids, net)
+        return ma.get_pairwise_distances(positions)
+
+
+def _get_detector_edges(detector_ids: list[str],
+                        net: sumolib.net.Net) -> tuple[list, list[float], dict[str, list[int]]]:
+    """
+    Get the SUMO edge and position of every detector
+
+    :param detector_ids: SUMO-IDs of all detectors
+    :param net: sumolib net object
+    :return: tuple of <edge of every detector, position of every detector on its lane,
+    positions in detector_ids of the detectors on every SUMO edge>
+    """
+    edges = [net.getLane(traci.inductionloop.getLaneID(detector_id)).getEdge() for detector_id in detector_ids]
+    distances = [traci.inductionloop.getPosition(detector_id) for detector_id in detector_ids]
+    detectors_on_edge: dict[str, list[int]] = {}
+    for index, edge in enumerate(edges):
+        detectors_on_edge.setdefault(edge.getID(), []).append(index)
+    return edges, distances, detectors_on_edge
+
+
+def _get_successors(edge, successors: dict[str, list]) -> list:
+    """ Get the outgoing edges of a SUMO edge using the cache"""
+    edge_id = edge.getID()
+    if edge_id not in successors:
+        successors[edge_id] = list(edge.getOutgoing())
+    return successors[edge_id]
+
+
+def _search_downstream(source: int, edges: list, distances: list[float], detectors_on_edge: dict[str, list[int]],
+                       successors: dict[str, list], max_cost: float, max_found: int,
+                       travel_time: bool = True) -> dict[int, float]:
+    """
+    Bounded Dijkstra search over the SUMO edges from one detector in driving direction.
+    Edges are entered with the cost to their start, detectors on an edge are added to the queue
+    with the additional cost to their position, so they are reached in order of their cost.
+    The search stops once max_found detectors are reached or the cost exceeds max_cost.
+
+    :param source: position of the detector in the detector list
+    :param edges: SUMO edge of every detector
+    :param distances: position of every detector on its lane
+    :param detectors_on_edge: detectors of every SUMO edge
+    :param successors: cache of the outgoing edges of every SUMO edge, filled while searching
+    :param max_cost: maximum cost of a reached detector
+    :param max_found: maximum number of reached detectors
+    :param travel_time: use the travel time (eq. 3) as cost instead of the driving distance
+    :return: dictionary of reached detector to its cost, in the order they were reached
+    """
+    counter = itertools.count()
+    # queue entries: <cost, counter, detector or None, edge or None>
+    queue = []
+    edge = edges[source]
+    scale = 1 / edge.getSpeed() if travel_time else 1.0
+    # detectors further downstream on the edge of the source
+    for target in detectors_on_edge[edge.getID()]:
+        if target != source and distances[target] >= distances[source]:
+            heapq.heappush(queue, ((distances[target] - distances[source]) * scale, next(counter), target, None))
+    # the edge of the source is not settled, so detectors behind the source can be reached by a loop
+    leave_cost = (edge.getLength() - distances[source]) * scale
+    for successor in _get_successors(edge, successors):
+        heapq.heappush(queue, (leave_cost, next(counter), None, successor))
+
+    found = {}
+    settled = set()
+    while queue and len(found) < max_found:
+        cost, _, target, edge = heapq.heappop(queue)
+        if cost > max_cost:
+            break
+        if target is not None:
+            if target not in found:
+                found[target] = cost
+            continue
+        edge_id = edge.getID()
+        if edge_id in settled:
+            continue
+        settled.add(edge_id)
+        scale = 1 / edge.getSpeed() if travel_time else 1.0
+        for target in detectors_on_edge.get(edge_id, ()):
+            if target != source:
+                heapq.heappush(queue, (cost + distances[target] * scale, next(counter), target, None))
+        leave_cost = cost + edge.getLength() * scale
+        for successor in _get_successors(edge, successors):
+            if successor.getID() not in settled:
+                heapq.heappush(queue, (leave_cost, next(counter), None, successor))
+    return found
+
+
+class knn_distance_connector_strategy(distance_connector_strategy):
+    """
+    Class that implements the connection strategy of connecting each detector to its k
+    geographically nearest downstream detectors.
+    Candidates are found using a KD-tree. A candidate is downstream if it can be reached from the detector
+    by driving over the SUMO edges with a driving distance of at most max_detour times their geographical
+    distance, so upstream detectors and detectors on the opposite carriageway are not connected.
+    In contrast to the threshold based strategies the degree of every node is bounded by k,
+    so the graph has at most num_detectors * k edges independent of the density of the detectors.
+    The costs are the geographical distances (eq. 1), as calculated by distance_connector_strategy.
+    """
+    # number of KD-tree candidates checked per neighbor
+    CANDIDATES_PER_NEIGHBOR = 4
+
+    k = 0
+    max_detour = 2.0
+
+    def __init__(self, k: int, threshold: float = float("inf"), max_detour: float = 2.0) -> None:
+        """
+        Initialize connector
+
+        :param k: number of neighbors of each detector
+        :param threshold: maximum distance of a neighbor, detectors with fewer downstream neighbors
+        within the threshold get fewer edges
+        :param max_detour: maximum ratio of driving distance to geographical distance of a neighbor
+        """
+        if k < 1:
+            raise ValueError("The number of neighbors has to be at least 1, got " + str(k))
+        super().__init__(threshold)
+        self.k = k
+        self.max_detour = max_detour
+
+    def get_edges(self, detector_ids: list[str], net: sumolib.net.Net):
+        """
+        Get the edges from every detector to its k nearest downstream detectors.
+        Detectors with fewer downstream detectors among their k * CANDIDATES_PER_NEIGHBOR nearest
+        detectors get fewer edges.
+
+        :param detector_ids: SUMO-IDs of all detectors
+        :param net: sumolib net object
+        :return: tuple of <sources, targets, costs>, sources and targets are positions in detector_ids
+        """
+        from scipy.spatial import cKDTree
+
+        num_detectors = len(detector_ids)
+        if num_detectors < 2:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        # get individual positions of the detectors using eq. 2, the tree uses their distances (eq. 1)
+        positions = get_detector_positions(detector_ids, net)
+        # the detector itself is part of the result, the upper bound of the tree is exclusive
+        candidate_distances, candidates = cKDTree(positions).query(
+            positions, k=min(self.k * self.CANDIDATES_PER_NEIGHBOR + 1, num_detectors),
+            distance_upper_bound=np.nextafter(self.threshold, np.inf))
+        candidate_distances = candidate_distances.reshape(num_detectors, -1)
+        candidates = candidates.reshape(num_detectors, -1)
+
+        edges, distances, detectors_on_edge = _get_detector_edges(detector_ids, net)
+        sources, targets, costs = [], [], []
+        successors = {}
+        for source in range(num_detectors):
+            # missing candidates have an infinite distance
+            valid = (candidates[source] != source) & np.isfinite(candidate_distances[source])
+            source_candidates = candidates[source][valid]
+            source_distances = candidate_distances[source][valid]
+            if len(source_candidates) == 0:
+                continue
+            # search until the driving distance exceeds the detour limit of the farthest candidate
+            reached = _search_downstream(source, edges, distances, detectors_on_edge, successors,
+                                         self.max_detour * source_distances.max(), num_detectors - 1,
+                                         travel_time=False)
+            num_neighbors = 0
+            for target, distance in zip(source_candidates.tolist(), source_distances.tolist()):
+                if target in reached and reached[target] <= self.max_detour * distance:
+                    sources.append(source)
+                    targets.append(target)
+                    costs.append(distance)
+                    num_neighbors += 1
+                    if num_neighbors == self.k:
+                        break
+        return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64), np.array(costs)
+
+
+class knn_dijkstra_connector_strategy(dijkstra_connector_strategy):
+    """
+    Class that implements the connection strategy of connecting each detector to the k
+    detectors with the lowest travel time downstream of it.
+    A Dijkstra search over the SUMO edges is started at every detector and stopped once k detectors
+    are reached, so only the surrounding part of the network is explored.
+    The costs are the travel times of eq. 3, as calculated by dijkstra_connector_strategy.
+    """
+    k = 0
+
+    def __init__(self, k: int, threshold: float = float("inf")) -> None:
+        """
+        Initialize connector
+
+        :param k: number of neighbors of each detector
+        :param threshold: maximum travel time to a neighbor, the search of a detector stops
+        at the threshold even if fewer than k detectors are reached
+        """
+        if k < 1:
+            raise ValueError("The number of neighbors has to be at least 1, got " + str(k))
+        super().__init__(threshold)
+        self.k = k
+
+    def get_edges(self, detector_ids: list[str], net: sumolib.net.Net):
+        """
+        Get the edges from every detector to the k detectors reached first downstream
+
+        :param detector_ids: SUMO-IDs of all detectors
+        :param net: sumolib net object
+        :return: tuple of <sources, targets, costs>, sources and targets are positions in detector_ids
+        """
+        edges, distances, detectors_on_edge = _get_detector_edges(detector_ids, net)
+        sources, targets, costs = [], [], []
+        successors = {}
+        for source in range(len(detector_ids)):
+            reached = _search_downstream(source, edges, distances, detectors_on_edge, successors,
+                                         self.threshold, self.k)
+            for target, cost in reached.items():
+                sources.append(source)
+                targets.append(target)
+                costs.append(cost)
+        return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64), np.array(costs)
+
 
 class node_connector:
     """
     Class that implements the connection of all nodes into a graph.
 
     It also stores all created graph data in various data structures.
+    Strategies returning their edges directly (e.g. knn_distance_connector_strategy) do not need the
+    adjacency matrices, they are only created when they are requested.
     """
     _strat: detector_connector_strategy = None
     self_loops: bool = False
 
     _num_edges = 0
 
+    _num_nodes = 0
     _adj_matrix_cost = None
     _adj_matrix_binary = None
 
+    # edges in row-major order of the adjacency matrix, using torch IDs
+    _edge_sources: np.array = None
+    _edge_targets: np.array = None
+    _edge_costs: np.array = None
+
     _edge_list_sumo_ids = None
     _edge_list_index_ids = None
 
@@ -151,36 +430,40 @@ class node_connector:
         """
 
         # create/reset variables
-        self._adj_matrix_cost = np.zeros((len(translation.get_order()),
-                                          len(translation.get_order())))
-        self._adj_matrix_binary = np.zeros((len(translation.get_order()),
-                                            len(translation.get_order())))
-
-        index_a = 0
-        for curr_detector_a in translation.get_order():
-            index_b = 0
-            for curr_detector_b in translation.get_order():
-                # get cost between both detectors
-                cost = self._strat.get_cost(curr_detector_a, curr_detector_b, net)
-                # add cost to cost adjacency matrix
-                self._adj_matrix_cost[
-                    translation.get_index(curr_detector_a),
-                    translation.get_index(curr_detector_b)] = cost
-                # if cost ist bigger than the threshold add it to the binary adjacency matrix
-                if cost <= self._strat.threshold:
-                    self._adj_matrix_binary[
-                        translation.get_index(curr_detector_a),
-                        translation.get_index(curr_detector_b)] = 1
-                    self._num_edges += 1
-                    # remove one if self loops is not enabled
-                    if not self.self_loops and curr_detector_a == curr_detector_b:
-                        self._adj_matrix_binary[
-                            translation.get_index(curr_detector_a),
-                            translation.get_index(curr_detector_b)] = 0
-                        self._num_edges -= 1
-
-                index_b += 1
-            index_a += 1
+        order = translation.get_order()
+        indices = translation.get_indices(order)
+        self._num_nodes = len(order)
+        self._adj_matrix_cost = None
+        self._adj_matrix_binary = None
+
+        edges = self._strat.get_edges(order, net)
+        if edges is not None:
+            # sparse strategies: translate the positions into torch IDs and sort the edges row-major
+            sources, targets, costs = edges
+            sources, targets = indices[sources], indices[targets]
+            keep = np.ones(len(sources), dtype=bool) if self.self_loops else sources != targets
+            edge_order = np.lexsort((targets[keep], sources[keep]))
+            self._edge_sources = sources[keep][edge_order]
+            self._edge_targets = targets[keep][edge_order]
+            self._edge_costs = np.asarray(costs, dtype=np.float64)[keep][edge_order]
+            self._num_edges = len(self._edge_sources)
+            return
+
+        self._adj_matrix_cost = np.zeros((len(order), len(order)))
+
+        # get cost between all detectors and add it to cost adjacency matrix
+        self._adj_matrix_cost[np.ix_(indices, indices)] = self._strat.get_cost_matrix(order, net)
+
+        # if cost is smaller than the threshold add it to the binary adjacency matrix
+        self._adj_matrix_binary = (self._adj_matrix_cost <= self._strat.threshold).astype(np.float64)
+        # remove self loops if they are not enabled
+        if not self.self_loops:
+            np.fill_diagonal(self._adj_matrix_binary, 0)
+
+        # all present edges in row-major order
+        self._edge_sources, self._edge_targets = np.nonzero(self._adj_matrix_binary)
+        self._edge_costs = self._adj_matrix_cost[self._edge_sources, self._edge_targets]
+        self._num_edges = len(self._edge_sources)
 
     def _construct_edge_list(self, translation: tr.translation_controller):
         """
@@ -188,17 +471,41 @@ class node_connector:
 
         :param translation: translation controller
         """
-        self._edge_list_sumo_ids = np.zeros(shape=(self._num_edges, 2), dtype=object)
-        self._edge_list_index_ids = np.zeros(shape=(self._num_edges, 2), dtype=np.float32)
+        a, b = self._edge_sources, self._edge_targets
+        self._edge_list_sumo_ids = np.empty(shape=(self._num_edges, 2), dtype=object)
+        self._edge_list_sumo_ids[:, 0] = translation.get_detector_ids(a).tolist()
+        self._edge_list_sumo_ids[:, 1] = translation.get_detector_ids(b).tolist()
+
+        self._edge_list_index_ids = np.stack([a, b], axis=1).astype(np.float32)
+
+    def get_cost_adj_matrix(self) -> np.array:
+        """
+        Get the cost adjacency matrix. For sparse strategies it is created on the first call,
+        pairs of detectors without an edge get an infinite cost.
 
-        cnt = 0
-        for a in range(len(self._adj_matrix_binary)):
-            for b in range(len(self._adj_matrix_binary)):
-                # add all present edges to the edge lists
-                if self._adj_matrix_binary[a, b] != 0:
-                    self._edge_list_sumo_ids[cnt][0] = translation.get_detector_id(a)
-                    self._edge_list_sumo_ids[cnt][1] = translation.get_detector_id(b)
+        :return: cost adjacency matrix of size (num_detectors, num_detectors)
+        """
+        if self._adj_matrix_cost is None:
+            self._adj_matrix_cost = np.full((self._num_nodes, self._num_nodes), np.inf)
+            np.fill_diagonal(self._adj_matrix_cost, 0)
+            self._adj_matrix_cost[self._edge_sources, self._edge_targets] = self._edge_costs
+        return self._adj_matrix_cost
+
+    def get_binary_adj_matrix(self) -> np.array:
+        """
+        Get the binary adjacency matrix. For sparse strategies it is created on the first call.
+
+        :return: binary adjacency matrix of size (num_detectors, num_detectors)
+        """
+        if self._adj_matrix_binary is None:
+            self._adj_matrix_binary = np.zeros((self._num_nodes, self._num_nodes))
+            self._adj_matrix_binary[self._edge_sources, self._edge_targets] = 1
+        return self._adj_matrix_binary
+
+    def get_edge_costs(self) -> np.array:
+        """
+        Get the cost of every edge, aligned with the edge lists
 
-                    self._edge_list_index_ids[cnt][0] = a
-                    self._edge_list_index_ids[cnt][1] = b
-                    cnt += 1
+        :return: array of size (num_edges)
+        """
+        return self._edge_costs
@@ -1,6 +1,12 @@
-import sumolib
-import parser.detector as detect1
-from utils.mathstuff import get_length_from_shape
+from __future__ import annotations
+
+from xml.sax.saxutils import escape
+import numpy as np
+from utils.mathstuff import pack_shapes, get_positions_from_shapes
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import sumolib
 
 
 class inductive_loop_base:
@@ -101,80 +107,205 @@ class e1_inductive_loop(inductive_loop_base):
 
 class detector_xml_generator:
     """
-    
+    Class that generates an additional file containing e1 detectors placed along all lanes
+    of roads with a valid road type.
+
+    Detectors are placed every "spacing" meters starting at the beginning of each lane and one
+    additional detector is placed at the end of each lane. All positions are computed with array
+    operations and the XML is streamed to disk, so even very large networks are generated quickly.
+
+    Optionally the detectors are thinned out afterwards to shrink the detector graph,
+    see _thin for more information.
     """
-    net: sumolib.net.Net
     edges: list[sumolib.net.edge.Edge]
-    detectList: list[detect1.inductive_loop_base] = []
-    curr_id = 0
+    spacing: float = 50
+    frequency: int = 300
+    output_file: str = "detectors.xml"
+
+    min_spacing: float = None
+    max_per_edge: int = None
+    min_lane_length: float = 0
 
     valid_road_types = ["highway.motorway", "highway.trunk",
                         "highway.primary", "highway.secondary", "highway.tertiary",
                         "highway.residential", "highway.motorway_link", "highway.primary_link",
                         "highway.secondary_link", "highway.tertiary_link", "highway.living_street"]
 
-    def __init__(self, net: sumolib.net.Net) -> None:
+    # number of detectors written to the file at once
+    _chunk_size = 65536
+
+    def __init__(self, net: sumolib.net.Net, spacing: float = 50, frequency: int = 300,
+                 road_types: list[str] = None, output_file: str = "detectors.xml",
+                 min_spacing: float = None, max_per_edge: int = None, min_lane_length: float = 0) -> None:
+        """
+        Initialize generator
+        :param net: sumolib net object
+        :param spacing: distance between two detectors on the same lane in meters
+        :param frequency: aggregation frequency of the detectors in seconds
+        :param road_types: road types detectors are placed on, a road is valid if its type
+        contains one of these types, defaults to valid_road_types
+        :param output_file: file the detectors write their measurements to
+        :param min_spacing: minimum euclidean distance between two detectors in meters,
+        enables thinning if set
+        :param max_per_edge: maximum number of detectors kept per edge (all lanes combined)
+        :param min_lane_length: lanes shorter than this (in meters) get no detectors
+        """
         self.edges = net.getEdges()
+        self.spacing = spacing
+        self.frequency = frequency
+        self.output_file = output_file
+        self.min_spacing = min_spacing
+        self.max_per_edge = max_per_edge
+        self.min_lane_length = min_lane_length
+        if road_types is not None:
+            self.valid_road_types = list(road_types)
+
+    def _collect_lanes(self) -> tuple[list[str], np.array, np.array, list[list[tuple]]]:
+        """ Collect all lanes of edges with a valid road type
+        :return: tuple of <lane ids, lane lengths, edge index of each lane, lane shapes>
+        """
+        # the same road types appear on many edges, so each type is only checked once
+        type_is_valid: dict[str, bool] = {}
+        lane_ids: list[str] = []
+        lane_lengths: list[float] = []
+        lane_edges: list[int] = []
+        lane_shapes: list[list[tuple]] = []
+        for edge_index, edge in enumerate(self.edges):
+            edge_type = edge.getType()
+            if edge_type not in type_is_valid:
+                type_is_valid[edge_type] = any(t in edge_type for t in self.valid_road_types)
+            if type_is_valid[edge_type]:
+                for lane in edge.getLanes():
+                    if lane.getLength() < self.min_lane_length:
+                        continue
+                    lane_ids.append(lane.getID())
+                    lane_lengths.append(lane.getLength())
+                    lane_edges.append(edge_index)
+                    lane_shapes.append(lane.getShape())
+
+        return lane_ids, np.array(lane_lengths, dtype=np.float64), np.array(lane_edges, dtype=np.int64), lane_shapes
+
+    def generate_positions(self) -> tuple[list[str], np.array, np.array]:
+        """
+        Compute the positions of all detectors
+        :return: tuple of <lane ids, lane index of each detector, position of each detector on its lane>
+        """
+        lane_ids, lane_lengths, lane_edges, lane_shapes = self._collect_lanes()
+
+        # detectors at 0, spacing, 2 * spacing, ... and one at the end of the lane
+        # if the last regular detector is not already placed there
+        num_regular = np.floor(lane_lengths / self.spacing).astype(np.int64) + 1
+        has_end = lane_lengths - (num_regular - 1) * self.spacing > 1e-6
+        counts = num_regular + has_end
+
+        lane_index = np.repeat(np.arange(len(lane_ids)), counts)
+        first_detector = np.cumsum(counts) - counts
+        step = np.arange(len(lane_index)) - first_detector[lane_index]
+        positions = np.minimum(step * self.spacing, lane_lengths[lane_index])
+
+        if self.min_spacing is not None or self.max_per_edge is not None:
+            keep = self._thin(lane_index, positions, lane_edges, lane_shapes)
+            lane_index = lane_index[keep]
+            positions = positions[keep]
+
+        return lane_ids, lane_index, positions
+
+    def _thin(self, lane_index: np.array, positions: np.array, lane_edges: np.array,
+              lane_shapes: list[list[tuple]]) -> np.array:
+        """
+        Thin out detectors by enforcing a minimum euclidean distance between all detectors and
+        a maximum number of detectors per edge.
+
+        Detectors are accepted greedily in round-robin order over all edges: first the first detector
+        of every edge, then the second and so on. A detector is dropped if an already accepted detector
+        lies within min_spacing, this removes redundant detectors on parallel lanes, short lanes and at
+        junctions, while every edge keeps at least one detector if possible.
+        :param lane_index: lane index of each detector
+        :param positions: position of each detector on its lane
+        :param lane_edges: edge index of each lane
+        :param lane_shapes: shape of each lane
+        :return: sorted indices of the detectors to keep
+        """
+        detector_edges = lane_edges[lane_index]
+        num_detectors = len(positions)
+
+        # rank of each detector within its edge, detectors of one edge are stored consecutively
+        edge_start = np.flatnonzero(np.r_[True, detector_edges[1:] != detector_edges[:-1]])
+        group_size = np.diff(np.r_[edge_start, num_detectors])
+        rank = np.arange(num_detectors) - np.repeat(edge_start, group_size)
+        order = np.argsort(rank, kind="stable")
+
+        # neighbors of each detector within min_spacing as CSR arrays
+        if self.min_spacing is not None:
+            from scipy.spatial import cKDTree
+
+            # positions beyond the end of a shape are clamped, lane lengths can slightly differ from the
+            # length of the lane shapes
+            shape_coords, shape_offsets = pack_shapes(lane_shapes)
+            coordinates = get_positions_from_shapes(shape_coords, shape_offsets, lane_index, positions)
+            pairs = cKDTree(coordinates).query_pairs(self.min_spacing, output_type="ndarray")
+            pairs = np.concatenate([pairs, pairs[:, ::-1]])
+            pairs = pairs[np.argsort(pairs[:, 0], kind="stable")]
+            neighbor_ptr = np.searchsorted(pairs[:, 0], np.arange(num_detectors + 1))
+            neighbors = pairs[:, 1]
+        else:
+            neighbor_ptr = np.zeros(num_detectors + 1, dtype=np.int64)
+            neighbors = np.zeros(0, dtype=np.int64)
+
+        max_per_edge = self.max_per_edge if self.max_per_edge is not None else num_detectors
+        blocked = np.zeros(num_detectors, dtype=bool)
+        kept_per_edge = np.zeros(len(self.edges), dtype=np.int64)
+        keep = []
+        for detector in order.tolist():
+            edge = detector_edges[detector]
+            if blocked[detector] or kept_per_edge[edge] >= max_per_edge:
+                continue
+            keep.append(detector)
+            kept_per_edge[edge] += 1
+            blocked[neighbors[neighbor_ptr[detector]:neighbor_ptr[detector + 1]]] = True
+
+        keep = np.sort(np.array(keep, dtype=np.int64))
+        print("[Detector XML Generator] - Thinning kept", len(keep), "of", num_detectors,
+              "detectors, resulting N:", len(keep))
+        return keep
+
+    def generate_list(self) -> list[inductive_loop_base]:
+        """
+        Generate detector objects for all detector positions.
+        Prefer generate_xml for large networks, as it does not create an object per detector.
+        :return: list of detectors
+        """
+        lane_ids, lane_index, positions = self.generate_positions()
+        detectors: list[inductive_loop_base] = []
+        for detector_id, (lane, pos) in enumerate(zip(lane_index.tolist(), positions.tolist())):
+            detector = e1_inductive_loop()
+            detector.add_xml_attributes(id=detector_id, lane=lane_ids[lane], pos=pos, freq=self.frequency,
+                                        file=self.output_file, type="e1")
+            detectors.append(detector)
+        return detectors
+
+    def generate_xml(self, path: str) -> int:
+        """
+        Generate the additional file containing all detectors
+        :param path: path of the additional file
+        :return: number of generated detectors
+        """
+        lane_ids, lane_index, positions = self.generate_positions()
+        # positions are written with centimeter precision, rounding down keeps them on the lane
+        positions = np.floor(positions * 100) / 100
+        lane_ids = [escape(lane_id, {'"': "&quot;"}) for lane_id in lane_ids]
+        file_name = escape(self.output_file, {'"': "&quot;"})
+
+        with open(path, "w") as file:
+            file.write("<additional>\n")
+            for start in range(0, len(positions), self._chunk_size):
+                lanes = lane_index[start:start + self._chunk_size].tolist()
+                chunk_positions = positions[start:start + self._chunk_size].tolist()
+                file.write("".join(
+                    '\t<e1Detector id="%d" lane="%s" pos="%.2f" freq="%s" file="%s"/>\n' % (
+                        start + i, lane_ids[lane], pos, self.frequency, file_name)
+                    for i, (lane, pos) in enumerate(zip(lanes, chunk_positions))))
+            file.write("</additional>")
 
-    def generate_list(self) -> list[detect1.inductive_loop_base]:
-        for edge in self.edges:
-            if any(t in edge.getType() for t in self.valid_road_types):
-                lanes = edge.getLanes()
-                step_size: int = 50
-                for lane in lanes:
-                    lane_length = get_length_from_shape(lane.getShape())
-                    num_steps = int(lane_length) // step_size
-                    num_detectors = 0
-                    tmpList: list[detect1.inductive_loop_base] = []
-
-                    for curr_step in range(0, num_steps):
-                        curr_detector_pos: float = curr_step * step_size
-                        curr_detector = detect1.e1_inductive_loop()
-                        curr_detector.add_xml_attributes(id=self.curr_id,
-                                                         lane=lane.getID(),
-                                                         pos=curr_detector_pos,
-                                                         freq=300,
-                                                         file="detectors.xml",
-                                                         type="e1")
-                        tmpList.append(curr_detector)
-
-                    lengt = 0
-                    if lane.getLength() >= lane_length:
-                        lengt = lane_length
-                    else:
-                        lengt = lane.getLength()
-
-                    curr_detector = detect1.e1_inductive_loop()
-                    curr_detector.add_xml_attributes(id=self.curr_id,
-                                                     lane=lane.getID(),
-                                                     pos=lengt,
-                                                     freq=300,
-                                                     file="detectors.xml",
-                                                     type="e1")
-                    self.detectList.append(curr_detector)
-                    self.curr_id += 1
-                    curr_detector = detect1.e1_inductive_loop()
-                    curr_detector.add_xml_attributes(id=self.curr_id,
-                                                     lane=lane.getID(),
-                                                     pos=0,
-                                                     freq=300,
-                                                     file="detectors.xml",
-                                                     type="e1")
-                    self.detectList.append(curr_detector)
-                    self.curr_id += 1
-                print("edge:", edge.getID(), "lanes:", len(edge.getLanes()), "length:", edge.getLength(), "detectors:",
-                      num_detectors)
-
-        return self.detectList
-
-    def generate_xml(self, path: str):
-        self.generate_list()
-
-        file = open(path, "w")
-        file.write("<additional>\n")
-
-        for detector in self.detectList:
-            file.write("\t" + detector.to_xml() + "\n")
-
-        file.write("</additional>")
-        file.close()
+        print("[Detector XML Generator] - Generated", len(positions), "detectors on", len(lane_ids), "lanes")
+        return len(positions)
@@ -0,0 +1,198 @@
+import numpy as np
+
+# raw per-interval arrays passed to the transforms, each of size (num_nodes)
+RAW_KEYS = ["mean_speed", "occupancy", "vehicles", "ref_speed"]
+
+# methods to aggregate a feature over several intervals, see numpy_graph_store
+AGGREGATIONS = ["mean", "sum", "vehicle_weighted_mean"]
+
+
+class feature_transform:
+    """
+    Base class for all feature transforms. A transform computes one node feature for all detectors at once
+    from the raw arrays of an interval and the features computed by the transforms before it.
+
+    Custom transforms either inherit this class and implement compute, or pass a function:
+    feature_transform("occupancy_share", lambda raw, features: raw["occupancy"] / 100)
+
+    The aggregation defines how the feature is combined when the store aggregates several intervals
+    into a coarser resolution (see AGGREGATIONS).
+    """
+    name = ""
+    aggregation = "mean"
+
+    def __init__(self, name: str = None, function=None, aggregation: str = None) -> None:
+        """
+        Initialize transform
+        :param name: name of the resulting feature
+        :param function: optional function (raw, features) -> array implementing the transform
+        :param aggregation: optional aggregation of the feature over several intervals
+        """
+        if name is not None:
+            self.name = name
+        if aggregation is not None:
+            if aggregation not in AGGREGATIONS:
+                raise ValueError("Unknown aggregation " + aggregation)
+            self.aggregation = aggregation
+        self._function = function
+
+    def compute(self, raw: dict[str, np.array], features: dict[str, np.array]) -> np.array:
+        """
+        Compute the feature for all detectors
+        :param raw: raw arrays of the interval, see RAW_KEYS
+        :param features: features computed by the previous transforms of the pipeline
+        :return: array of size (num_nodes)
+        """
+        return self._function(raw, features)
+
+
+class raw_feature(feature_transform):
+    """
+    Transform passing a raw array through unchanged
+    """
+
+    def __init__(self, name: str, raw_key: str = None, aggregation: str = None) -> None:
+        """
+        Initialize transform
+        :param name: name of the resulting feature
+        :param raw_key: key of the raw array, defaults to the name
+        :param aggregation: optional aggregation of the feature over several intervals
+        """
+        super().__init__(name, aggregation=aggregation)
+        self._raw_key = raw_key or name
+
+    def compute(self, raw: dict[str, np.array], features: dict[str, np.array]) -> np.array:
+        return raw[self._raw_key]
+
+
+class occupancy_weighted_speed(feature_transform):
+    """
+    Speed of each detector weighted by its occupancy.
+    The occupancy is adjusted by the number of vehicles (eq. 4) and used to blend the measured mean speed
+    with the speed limit (eq. 5). Detectors without vehicles report the speed limit.
+    Over several intervals the speed is averaged weighted by the number of vehicles.
+    """
+    name = "speed"
+    aggregation = "vehicle_weighted_mean"
+
+    def compute(self, raw: dict[str, np.array], features: dict[str, np.array]) -> np.array:
+        mean_speed = raw["mean_speed"]
+        vehicles = raw["vehicles"]
+        ref_speed = raw["ref_speed"]
+        # SUMO reports a speed of -1 if no vehicle passed the detector
+        measured = (mean_speed != -1.0) & (vehicles > 0)
+
+        # adjust occupancy value according to eq. 4
+        occupancy = np.divide(raw["occupancy"], vehicles, out=np.zeros_like(mean_speed), where=measured)
+        occupancy = np.minimum(occupancy, 1.0)
+        # calculate final speed according to eq. 5
+        speed = occupancy * mean_speed + (1.0 - occupancy) * ref_speed
+        return np.where(measured, speed, ref_speed)
+
+
+class flow_rate(feature_transform):
+    """
+    Number of vehicles per hour passing each detector
+    """
+    name = "flow"
+
+    def __init__(self, interval_length: float) -> None:
+        """
+        Initialize transform
+        :param interval_length: length of one interval in seconds
+        """
+        super().__init__()
+        self._interval_length = interval_length
+
+    def compute(self, raw: dict[str, np.array], features: dict[str, np.array]) -> np.array:
+        return raw["vehicles"] * (3600.0 / self._interval_length)
+
+
+class density(feature_transform):
+    """
+    Number of vehicles per kilometer at each detector, calculated from flow and speed.
+    Detectors without a positive speed have a density of 0.
+    """
+    name = "density"
+
+    def __init__(self, interval_length: float, speed_feature: str = "speed") -> None:
+        """
+        Initialize transform
+        :param interval_length: length of one interval in seconds
+        :param speed_feature: feature containing the speed in m/s
+        """
+        super().__init__()
+        self._interval_length = interval_length
+        self._speed_feature = speed_feature
+
+    def compute(self, raw: dict[str, np.array], features: dict[str, np.array]) -> np.array:
+        flow = raw["vehicles"] * (3600.0 / self._interval_length)
+        # m/s -> km/h
+        speed = features[self._speed_feature] * 3.6
+        return np.divide(flow, speed, out=np.zeros_like(flow, dtype=np.float64), where=speed > 0)
+
+
+class speed_ratio(feature_transform):
+    """
+    Ratio of the speed of each detector to its speed limit
+    """
+    name = "speed_ratio"
+
+    def __init__(self, speed_feature: str = "speed") -> None:
+        """
+        Initialize transform
+        :param speed_feature: feature containing the speed
+        """
+        super().__init__()
+        self._speed_feature = speed_feature
+
+    def compute(self, raw: dict[str, np.array], features: dict[str, np.array]) -> np.array:
+        ref_speed = raw["ref_speed"]
+        return np.divide(features[self._speed_feature], ref_speed,
+                         out=np.zeros_like(ref_speed, dtype=np.float64), where=ref_speed > 0)
+
+
+class feature_pipeline:
+    """
+    Ordered list of feature transforms that are run once per interval over the raw arrays of all detectors.
+    The default pipeline creates the features speed, occupancy and vehicles stored by the numpy store.
+    """
+    _transforms: list[feature_transform] = None
+
+    def __init__(self, transforms: list[feature_transform] = None) -> None:
+        """
+        Initialize pipeline
+        :param transforms: additional transforms appended to the default transforms
+        """
+        self._transforms = [occupancy_weighted_speed(), raw_feature("occupancy"),
+                            raw_feature("vehicles", aggregation="sum")]
+        for transform in transforms or []:
+            self.add_transform(transform)
+
+    def add_transform(self, transform: feature_transform):
+        """
+        Append a transform to the pipeline
+        :param transform: transform, its name has to be unique
+        """
+        if transform.name in self.get_feature_names():
+            raise ValueError("Feature " + transform.name + " is already created by the pipeline")
+        self._transforms.append(transform)
+
+    def get_feature_names(self) -> list[str]:
+        """ Get names of all features in the order they are computed"""
+        return [transform.name for transform in self._transforms]
+
+    def get_aggregations(self) -> dict[str, str]:
+        """ Get the aggregation of each feature"""
+        return {transform.name: transform.aggregation for transform in self._transforms}
+
+    def run(self, raw: dict[str, np.array]) -> dict[str, np.array]:
+        """
+        Compute all features of an interval
+        :param raw: raw arrays of the interval, see RAW_KEYS
+        :return: dictionary of feature name to array of size (num_nodes)
+        """
+        features: dict[str, np.array] = {}
+        for transform in self._transforms:
+            features[transform.name] = transform.compute(raw, features)
+        return features
@@ -0,0 +1,170 @@
+import numpy as np
+
+
+class detector_cluster:
+    """
+    Subgraph of the detector graph used for cluster based mini-batch training.
+    The nodes of the cluster are its core nodes followed by its halo nodes, the neighbors of the core nodes
+    within a number of hops that are only included so the core nodes receive all their messages.
+    Loss and metrics are only computed on the core nodes.
+    """
+    nodes: np.array = None
+    num_core: int = 0
+    edge_index: np.array = None
+    edge_ids: np.array = None
+
+    def __init__(self, nodes: np.array, num_core: int, edge_index: np.array, edge_ids: np.array) -> None:
+        """
+        Initialize cluster
+        :param nodes: torch IDs of the nodes, core nodes first
+        :param num_core: number of core nodes
+        :param edge_index: edge index of the subgraph using local node indices (positions in nodes)
+        :param edge_ids: positions of the edges of the subgraph in the edge index of the detector graph
+        """
+        self.nodes = nodes
+        self.num_core = num_core
+        self.edge_index = edge_index
+        self.edge_ids = edge_ids
+
+    def get_core_mask(self) -> np.array:
+        """ Get a boolean mask of size (num_nodes) selecting the core nodes"""
+        mask = np.zeros(len(self.nodes), dtype=bool)
+        mask[:self.num_core] = True
+        return mask
+
+
+def partition_rcb(positions: np.array, num_clusters: int) -> np.array:
+    """
+    Split the detectors into balanced clusters by recursive coordinate bisection: the detectors are split
+    at the median of the coordinate with the larger extent until the number of clusters is reached.
+    :param positions: detector positions of shape (num_nodes, 2), e.g. detector_graph.get_detector_positions()
+    :param num_clusters: number of clusters
+    :return: cluster of each node of size (num_nodes)
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    assignment = np.zeros(len(positions), dtype=np.int64)
+    # stack of <node indices, first cluster, number of clusters>
+    stack = [(np.arange(len(positions)), 0, num_clusters)]
+    while stack:
+        nodes, first, count = stack.pop()
+        if count == 1 or len(nodes) <= 1:
+            assignment[nodes] = first
+            continue
+        left_count = count // 2
+        # split the nodes proportionally to the number of clusters on each side
+        cut = int(round(len(nodes) * left_count / count))
+        extent = np.ptp(positions[nodes], axis=0)
+        axis = int(np.argmax(extent))
+        order = np.argpartition(positions[nodes, axis], cut) if 0 < cut < len(nodes) else \
+            np.arange(len(nodes))
+        stack.append((nodes[order[:cut]], first, left_count))
+        stack.append((nodes[order[cut:]], first + left_count, count - left_count))
+    return assignment
+
+
+def _get_neighbors(edge_index: np.array, num_nodes: int) -> tuple[np.array, np.array]:
+    """
+    Get the undirected neighbors of all nodes in CSR format
+    :param edge_index: edge index of shape (2, num_edges)
+    :param num_nodes: number of nodes
+    :return: tuple of <pointer of size (num_nodes + 1), neighbors>
+    """
+    sources = np.concatenate([edge_index[0], edge_index[1]])
+    targets = np.concatenate([edge_index[1], edge_index[0]])
+    order = np.argsort(sources, kind="stable")
+    pointer = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=pointer[1:])
+    return pointer, targets[order]
+
+
+def partition_bfs(edge_index: np.array, num_nodes: int, num_clusters: int) -> np.array:
+    """
+    Split the detectors into balanced clusters by growing each cluster with a breadth-first search
+    over the detector graph (ignoring edge directions) until it reaches its size.
+    If the search runs out of nodes, e.g. in a disconnected part of the graph, it continues at the
+    next unassigned node.
+    :param edge_index: edge index of the detector graph of shape (2, num_edges)
+    :param num_nodes: number of nodes
+    :param num_clusters: number of clusters
+    :return: cluster of each node of size (num_nodes)
+    """
+    pointer, neighbors = _get_neighbors(np.asarray(edge_index, dtype=np.int64), num_nodes)
+    assignment = np.full(num_nodes, -1, dtype=np.int64)
+    # sizes differ by at most one node
+    sizes = np.full(num_clusters, num_nodes // num_clusters)
+    sizes[:num_nodes % num_clusters] += 1
+
+    next_seed = 0
+    for cluster, size in enumerate(sizes):
+        queue = []
+        head = 0
+        filled = 0
+        while filled < size:
+            if head == len(queue):
+                # start a new search at the next unassigned node
+                while assignment[next_seed] != -1:
+                    next_seed += 1
+                assignment[next_seed] = cluster
+                queue.append(next_seed)
+                filled += 1
+                continue
+            node = queue[head]
+            head += 1
+            for neighbor in neighbors[pointer[node]:pointer[node + 1]]:
+                if filled == size:
+                    break
+                if assignment[neighbor] == -1:
+                    assignment[neighbor] = cluster
+                    queue.append(neighbor)
+                    filled += 1
+    return assignment
+
+
+def build_clusters(edge_index: np.array, assignment: np.array, halo_hops: int = 1) -> list[detector_cluster]:
+    """
+    Create the subgraphs of all clusters. The halo of a cluster contains all nodes with a path of at most
+    halo_hops edges into the core nodes, so a model with halo_hops message passing layers computes the
+    same output for the core nodes as on the full graph.
+    :param edge_index: edge index of the detector graph of shape (2, num_edges), messages flow from row 0 to row 1
+    :param assignment: cluster of each node, e.g. created by partition_rcb or partition_bfs
+    :param halo_hops: number of hops of the halo
+    :return: list of clusters
+    """
+    edge_index = np.asarray(edge_index, dtype=np.int64)
+    assignment = np.asarray(assignment)
+    num_nodes = len(assignment)
+    # incoming edges of every node in CSR format
+    order = np.argsort(edge_index[1], kind="stable")
+    in_pointer = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_index[1], minlength=num_nodes), out=in_pointer[1:])
+    in_sources = edge_index[0, order]
+
+    clusters = []
+    local = np.full(num_nodes, -1, dtype=np.int64)
+    for cluster in range(int(assignment.max()) + 1 if num_nodes else 0):
+        core = np.flatnonzero(assignment == cluster)
+        if len(core) == 0:
+            continue
+        member = np.zeros(num_nodes, dtype=bool)
+        member[core] = True
+        halo = []
+        frontier = core
+        for _ in range(halo_hops):
+            starts = in_pointer[frontier]
+            counts = in_pointer[frontier + 1] - starts
+            if counts.sum() == 0:
+                break
+            # positions of all incoming edges of the frontier in the CSR arrays
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            sources = in_sources[positions]
+            frontier = np.unique(sources[~member[sources]])
+            member[frontier] = True
+            halo.append(frontier)
+        nodes = np.concatenate([core] + halo)
+
+        # edges between nodes of the cluster, translated into local indices
+        local[nodes] = np.arange(len(nodes))
+        edge_ids = np.flatnonzero(member[edge_index[0]] & member[edge_index[1]])
+        clusters.append(detector_cluster(nodes, len(core), local[edge_index[:, edge_ids]], edge_ids))
+        local[nodes] = -1
+    return clusters
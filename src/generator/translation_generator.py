@@ -1,3 +1,4 @@
+import numpy as np
 import traci
 
 
@@ -6,11 +7,14 @@ class translation_generator:
     Class responsible for the generation and processing of the necessary
     data structures for the translation layer of DeepSUMO
 
+    Detector ids are interned into an array, the position of an id in the array is its index.
+    A dictionary maps the ids back to their index.
+
     This is an internal class and should not be used. Please
     use the translation_controller instead.
     """
     _detector_to_index_buffer: dict[str, int] = None
-    _index_to_detector_buffer: dict[int, str] = None
+    _index_to_detector_buffer: np.array = None
 
     _order: list[str] = []
 
@@ -25,30 +29,46 @@ class translation_generator:
         Generate dictionaries and order used for translation
         """
         print("[Translation Generator] - Generating dictionaries...")
-        # create variables
-        self._order = []
-        self._detector_to_index_buffer = dict()
-        self._index_to_detector_buffer = dict()
-
-        traffic_light_ids = traci.trafficlight.getIDList()
+        traffic_light_ids = set(traci.trafficlight.getIDList())
+        max_tokens = max((t.count("_") + 1 for t in traffic_light_ids), default=0)
 
-        curr_index: int = 0
-        for detector_id in traci.inductionloop.getIDList():
-            # filter out detectors created by traffic light systems
-            # as they do not actively collect data
-            if not any(t in detector_id for t in traffic_light_ids):
-                self._detector_to_index_buffer[detector_id] = curr_index
-                self._index_to_detector_buffer[curr_index] = detector_id
+        # filter out detectors created by traffic light systems
+        # as they do not actively collect data
+        self._order = [detector_id for detector_id in traci.inductionloop.getIDList()
+                       if not self._is_traffic_light_detector(detector_id, traffic_light_ids, max_tokens)]
+        self._detector_to_index_buffer = {detector_id: i for i, detector_id in enumerate(self._order)}
+        self._index_to_detector_buffer = np.array(self._order, dtype=str)
 
-                self._order.append(detector_id)
-                curr_index += 1
+    @staticmethod
+    def _is_traffic_light_detector(detector_id: str, traffic_light_ids: set[str], max_tokens: int) -> bool:
+        """
+        Check if a detector was created by a traffic light system, i.e. its id contains the id of a traffic light.
+        Only whole '_'-separated parts of the id are compared, SUMO names these detectors
+        "TLS<traffic light id>_<program id>_<lane id>", so a leading "TLS" is stripped as well.
+        :param detector_id: SUMO-ID of the detector
+        :param traffic_light_ids: set of all traffic light ids
+        :param max_tokens: maximum number of '_'-separated parts of a traffic light id
+        :return: True if the detector belongs to a traffic light
+        """
+        if not traffic_light_ids:
+            return False
+        tokens = detector_id.split("_")
+        candidates = [tokens]
+        if tokens[0].startswith("TLS"):
+            candidates.append([tokens[0][3:]] + tokens[1:])
+        for parts in candidates:
+            for start in range(len(parts)):
+                for stop in range(start + 1, min(start + max_tokens, len(parts)) + 1):
+                    if "_".join(parts[start:stop]) in traffic_light_ids:
+                        return True
+        return False
 
     def get_detector_to_index(self) -> dict[str, int]:
         """Get detector to index dictionary"""
         return self._detector_to_index_buffer
 
-    def get_index_to_detector(self) -> dict[int, str]:
-        """Get index to detector dictionary"""
+    def get_index_to_detector(self) -> np.array:
+        """Get array of detector ids, the position of an id is its index"""
         return self._index_to_detector_buffer
 
     def get_order_of_detectors(self) -> list[str]:
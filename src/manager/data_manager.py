@@ -1,8 +1,16 @@
+from __future__ import annotations
+
 from controllers.numpy_graph_controller import numpy_graph_controller
 from controllers.translation_controller import translation_controller
 from controllers.detector_graph_controller import detector_graph_controller
+from controllers.edge_weight_controller import edge_weight_controller
 from generator.detector_node_connector import node_connector, detector_connector_strategy
-import sumolib
+from generator.feature_pipeline import feature_pipeline
+from store.compact_net_store import load_net
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import sumolib
 
 
 class data_manager:
@@ -14,6 +22,7 @@ class data_manager:
     detector_graph: detector_graph_controller = None
     translation: translation_controller = None
     numpy: numpy_graph_controller = None
+    edge_weights: edge_weight_controller = None
 
     def __init__(self, settings: dict, strat: detector_connector_strategy) -> None:
         """
@@ -23,17 +32,32 @@ class data_manager:
         :param strat: desired strategy for connecting the detectors
         """
         self._settings = settings
-        # create a net object from net.xml file
-        self.net = sumolib.net.readNet(settings["sumo_net_path"])
+        # create a net object from net.xml file, if "net_cache_dir" is set
+        # a compact, memory-mapped copy of the network is cached and used instead
+        self.net = load_net(settings["sumo_net_path"], settings.get("net_cache_dir"))
 
         # initialize other components
         self.translation = translation_controller()
         self.detector_graph = \
             detector_graph_controller(strat, self.net, settings, self.translation)
+        # derived node features (e.g. flow_rate, density) can be added by passing
+        # a list of feature transforms as "feature_transforms", coarser resolutions
+        # of the node features are kept for each of the "aggregation_levels" and the node features
+        # are shared with other processes (see shared_feature_reader) if "shared_memory_name" is set.
+        # "feature_dtypes" stores node features in smaller dtypes, e.g. {"speed": "float16", "vehicles": "uint8"}
         self.numpy = numpy_graph_controller(self._settings["total_graphs"],
                                             self.detector_graph.get_detector_graph(),
                                             self.translation,
-                                            self.detector_graph.gen_ref_speeds())
+                                            self.detector_graph.gen_ref_speeds(),
+                                            feature_pipeline(settings.get("feature_transforms")),
+                                            settings.get("aggregation_levels"),
+                                            settings.get("shared_memory_name"),
+                                            settings.get("feature_dtypes"))
+
+        # optionally collect travel time based edge weights each interval
+        if settings.get("collect_edge_weights", False):
+            self.edge_weights = edge_weight_controller(self.net, self.numpy.get_edge_index(), self.translation)
+            self.numpy.set_edge_weight_controller(self.edge_weights)
 
     def add_connector_start(self, strat: detector_connector_strategy):
         """
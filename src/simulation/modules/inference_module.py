@@ -0,0 +1,126 @@
+import time
+
+import numpy as np
+import torch
+from torch_geometric.data import Data, Batch
+
+from simulation.modules.sim_module import simulation_module
+from manager.data_manager import data_manager
+from torch_geo.model.trainer import build_model
+from torch_geo.dataset.speed_window_dataset import to_normalization_tensors
+from utils.math_utils import z_score, un_z_score
+
+
+class inference_module(simulation_module):
+    """
+    Module that predicts the speed of all detectors for the next N_PRED intervals
+    using a trained model while the simulation is running.
+
+    The predictions are kept in a buffer that can be read by other modules using get_predictions.
+    """
+    _model: torch.nn.Module = None
+    _batch: Batch = None
+
+    _n_hist: int = 0
+    _mean = None
+    _std_dev = None
+
+    _predictions: np.array = None
+    _prediction_step: int = -1
+    _latencies: list[float] = []
+    _verbose: bool = True
+
+    def __init__(self, checkpoint_path: str, settings: dict, trigger_step: int,
+                 mean: float = None, std_dev: float = None, verbose: bool = True) -> None:
+        """
+        Initialize module and load the model onto the CPU
+        :param checkpoint_path: path of a checkpoint created by model_train
+        :param settings: settings object of DeepSUMO containing the model settings
+        :param trigger_step: trigger step, this should be "interval_length"
+        :param mean: mean used for normalization, defaults to the value stored in the checkpoint,
+        float or per node array of size (num_nodes)
+        :param std_dev: standard deviation used for normalization, defaults to the value stored in the checkpoint,
+        float or per node array of size (num_nodes)
+        :param verbose: print latency of each prediction
+        """
+        super().__init__(trigger_step)
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+        self._model = build_model(settings)
+        self._model.load_state_dict(checkpoint['model_state_dict'])
+        self._model.eval()
+
+        self._n_hist = settings["N_HIST"]
+        self._mean = mean if mean is not None else checkpoint.get("mean")
+        self._std_dev = std_dev if std_dev is not None else checkpoint.get("std_dev")
+        if self._mean is None or self._std_dev is None:
+            raise ValueError("Normalization statistics are neither passed nor stored in the checkpoint")
+        # nodes without variance get a standard deviation of 1, as in the datasets
+        self._mean, self._std_dev = to_normalization_tensors(self._mean, self._std_dev)
+        if isinstance(self._mean, torch.Tensor):
+            # per node statistics, broadcast over the intervals of each node
+            self._mean = self._mean[:, None]
+            self._std_dev = self._std_dev[:, None]
+
+        self._predictions = None
+        self._prediction_step = -1
+        self._latencies = []
+        self._verbose = verbose
+        print("[Inference Module] - Loaded model from", checkpoint_path)
+
+    def process_sim_update(self, manager: data_manager):
+        """ Predict the next intervals of all detectors if a new interval was processed
+        :param manager: data manager of DeepSUMO
+        """
+        step = manager.get_current_processing_step()
+        if step < self._n_hist or step == self._prediction_step:
+            return
+
+        start = time.perf_counter()
+        if self._batch is None:
+            self._batch = self._create_batch(manager)
+
+        # last N_HIST intervals of all detectors, (N_HIST, num_nodes) -> (num_nodes, N_HIST)
+        window = torch.from_numpy(manager.numpy.get_speed_node_features()[step - self._n_hist:step])
+        self._batch.x = z_score(window.T.float(), self._mean, self._std_dev)
+
+        with torch.inference_mode():
+            pred = self._model(self._batch, 'cpu')
+        self._predictions = un_z_score(pred, self._mean, self._std_dev).numpy()
+        self._prediction_step = step
+
+        latency = time.perf_counter() - start
+        self._latencies.append(latency)
+        if self._verbose:
+            print("[Inference Module] - Predicted interval", step, "in", round(latency * 1000, 2), "ms")
+
+    def _create_batch(self, manager: data_manager) -> Batch:
+        """ Create the batch containing the detector graph once, only its features change between predictions
+        :param manager: data manager of DeepSUMO
+        :return: batch containing a single graph
+        """
+        edge_index = torch.from_numpy(manager.numpy.get_edge_index()).long()
+        num_nodes = manager.numpy.get_speed_node_features().shape[1]
+        graph = Data(x=torch.zeros((num_nodes, self._n_hist)), edge_index=edge_index)
+        return Batch.from_data_list([graph])
+
+    def get_predictions(self) -> tuple[np.array, int]:
+        """ Get the latest predictions
+        :return: tuple of <predictions of shape (num_nodes, N_PRED) in m/s, processing step
+        the predictions were made at>, the predictions are None if none were made yet
+        """
+        return self._predictions, self._prediction_step
+
+    def get_latency_stats(self) -> dict[str, float]:
+        """ Get statistics about the latency of the predictions
+        :return: dictionary containing count, mean, p50, p99 and max latency in milliseconds
+        """
+        if len(self._latencies) == 0:
+            return {"count": 0}
+        latencies = np.array(self._latencies) * 1000
+        return {
+            "count": len(latencies),
+            "mean": float(np.mean(latencies)),
+            "p50": float(np.percentile(latencies, 50)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(np.max(latencies)),
+        }
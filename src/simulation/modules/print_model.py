@@ -28,6 +28,4 @@ class print_model(simulation_module):
         """
         int_id = manager.translation.get_index(self.original_id)
         features = manager.numpy.get_speed_node_features()
-        sequence = []
-        for i in range(manager.get_current_processing_step()):
-            sequence.append(features[i][int_id] * 3.6)
\ No newline at end of file
+        sequence = features[:manager.get_current_processing_step(), int_id] * 3.6
\ No newline at end of file
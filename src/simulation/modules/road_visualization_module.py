@@ -1,6 +1,5 @@
 from simulation.modules.sim_module import simulation_module
 from manager.data_manager import data_manager
-from matplotlib import pyplot as plt
 import traci
 
 
@@ -30,6 +29,8 @@ class road_visualization_module(simulation_module):
         :param data_manager:
         :return:
         """
+        from matplotlib import pyplot as plt
+
         graphs = int(data_manager._settings["total_graphs"])
 
         translation_controller = data_manager.translation
@@ -38,23 +39,20 @@ class road_visualization_module(simulation_module):
 
         print("Plotting (probably only a section of)", edge.getName())
         print("net.xml ID:", self.original_id)
-        print("torch ID:", translation_controller.get_index(self.original_id))
+        index = translation_controller.get_index(self.original_id)
+        print("torch ID:", index)
 
         features_speed = data_manager.numpy.get_speed_node_features()
         features_vehicles = data_manager.numpy.get_vehicle_number_features()
         features_occupancy = data_manager.numpy.get_occupancy_features()
 
-        sequence_speed = []
-        sequence_vehicles = []
-        sequence_occupancy = []
-        for i in range(data_manager.get_current_processing_step()):
-            sequence_speed.append(features_speed[i][translation_controller.get_index(self.original_id)] * 3.6)
-            sequence_vehicles.append(features_vehicles[i][translation_controller.get_index(self.original_id)])
-            sequence_occupancy.append(features_occupancy[i][translation_controller.get_index(self.original_id)])
-        size, _ = features_speed.shape
+        step = data_manager.get_current_processing_step()
+        sequence_speed = features_speed[:step, index] * 3.6
+        sequence_vehicles = features_vehicles[:step, index]
+        sequence_occupancy = features_occupancy[:step, index]
 
         print("Plotting ")
-        x = range(0, size)
+        x = range(0, len(sequence_speed))
         plt.plot(x, sequence_speed)
         plt.xlabel("step")
         plt.ylabel("speed")
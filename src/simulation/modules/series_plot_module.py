@@ -0,0 +1,143 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import traci
+
+from simulation.modules.sim_module import simulation_module
+from manager.data_manager import data_manager
+from utils.mathstuff import get_lttb_indices
+
+
+class series_plot_module(simulation_module):
+    """
+    Module that plots the node features of some detectors into PNG files without blocking the simulation.
+
+    The series of all detectors are extracted with a single array slice and downsampled with LTTB
+    to at most "max_points" points. Rendering happens in a background thread using the matplotlib Figure API.
+    If the previous plot is still rendering when the module is triggered, the plot is skipped (dropped),
+    so plotting never stalls the simulation. Each detector is plotted into <output_dir>/<detector id>.png,
+    which is replaced atomically by every plot.
+    """
+    _detector_ids: list[str] = None
+    _indices: np.array = None
+    _titles: list[str] = None
+    _features: list[str] = None
+    _output_dir: str = ""
+    _max_points: int = 0
+    _resolution: int = 1
+
+    _executor: ThreadPoolExecutor = None
+    _pending: Future = None
+    _rendered: int = 0
+    _dropped: int = 0
+
+    def __init__(self, detector_ids: list[str], trigger_step: int, output_dir: str, max_points: int = 1000,
+                 features: list[str] = None, resolution: int = 1) -> None:
+        """ Initialize module.
+        :param detector_ids: IDs of the desired detectors (SUMO-ID)
+        :param trigger_step: trigger step
+        :param output_dir: directory the images are written to
+        :param max_points: maximum number of points plotted per series
+        :param features: node features plotted as subplots, defaults to speed
+        :param resolution: number of intervals aggregated into one, 1 or one of the "aggregation_levels"
+        """
+        super().__init__(trigger_step)
+        self._detector_ids = list(detector_ids)
+        self._features = list(features or ["speed"])
+        self._output_dir = output_dir
+        self._max_points = max_points
+        self._resolution = resolution
+        self._indices = None
+        self._titles = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="series_plot")
+        self._pending = None
+        self._rendered = 0
+        self._dropped = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def process_sim_update(self, manager: data_manager):
+        """ Process update of module.
+        :param manager: data manager of DeepSUMO
+        """
+        self.plot(manager)
+
+    def plot(self, manager: data_manager, block: bool = False) -> bool:
+        """ Extract the series of all detectors and render them in the background.
+        :param manager: data manager of DeepSUMO
+        :param block: wait for a running plot instead of dropping this one and wait until this plot is written,
+        e.g. for the final plot after the simulation
+        :return: True if the plot was started, False if it was dropped
+        """
+        if self._pending is not None and not self._pending.done():
+            if not block:
+                self._dropped += 1
+                return False
+            self._pending.result()
+        elif self._pending is not None and self._pending.exception() is not None:
+            print("[Series Plot Module] - Previous plot failed:", repr(self._pending.exception()))
+
+        if self._indices is None:
+            self._resolve_detectors(manager)
+
+        # copy the series, so the store can be written while rendering
+        series = {feature: np.array(manager.numpy.get_features(feature, self._resolution)[:, self._indices])
+                  for feature in self._features}
+        interval_hours = float(manager._settings.get("interval_length", 1)) * self._resolution / 3600
+
+        self._pending = self._executor.submit(self._render, series, interval_hours)
+        if block:
+            self._pending.result()
+        return True
+
+    def _resolve_detectors(self, manager: data_manager):
+        """ Look up the indices and plot titles of the detectors once.
+        TraCI is not thread safe, so this has to happen in the simulation thread.
+        :param manager: data manager of DeepSUMO
+        """
+        self._indices = manager.translation.get_indices(self._detector_ids)
+        self._titles = []
+        for detector_id in self._detector_ids:
+            edge = manager.net.getLane(traci.inductionloop.getLaneID(detector_id)).getEdge()
+            self._titles.append(str(edge.getName()) + " [" + detector_id + "]")
+
+    def _render(self, series: dict[str, np.array], interval_hours: float):
+        """ Downsample the series and write one image per detector. Runs in the background thread.
+        :param series: node features of shape (num_timesteps, num_detectors) by feature name
+        :param interval_hours: length of one timestep in hours
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        for column, detector_id in enumerate(self._detector_ids):
+            figure = Figure(figsize=(10, 2.5 * len(self._features)))
+            FigureCanvasAgg(figure)
+            axes = figure.subplots(len(self._features), 1, sharex=True, squeeze=False)[:, 0]
+            for ax, feature in zip(axes, self._features):
+                values = series[feature][:, column]
+                if feature == "speed":
+                    # m/s -> km/h
+                    values = values * 3.6
+                x = np.arange(len(values)) * interval_hours
+                keep = get_lttb_indices(x, values, self._max_points)
+                ax.plot(x[keep], values[keep], linewidth=0.8)
+                ax.set_ylabel(feature)
+            axes[0].set_title(self._titles[column])
+            axes[-1].set_xlabel("hours")
+            figure.tight_layout()
+
+            path = os.path.join(self._output_dir, detector_id + ".png")
+            tmp_path = path + ".tmp.png"
+            figure.savefig(tmp_path)
+            os.replace(tmp_path, path)
+        self._rendered += 1
+
+    def get_counts(self) -> tuple[int, int]:
+        """ Get the number of rendered and dropped plots"""
+        return self._rendered, self._dropped
+
+    def close(self):
+        """ Wait for the running plot and stop the background thread"""
+        if self._pending is not None:
+            self._pending.result()
+        self._executor.shutdown(wait=True)
@@ -1,7 +1,8 @@
 from simulation.modules.sim_module import simulation_module
 from manager.data_manager import data_manager
+import json
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 import traci
 
 
@@ -9,6 +10,10 @@ class simulationFlowControlModule(simulation_module):
     """
     Class representing a module that has the ability to adjust the simulations traffic density
     by modifying the "scale" value of the simulation according to preset rules.
+
+    The rules are compiled into a table with one slot per hour of the week when the module is created,
+    each update looks up the slot of the current simulation time directly. A new random scale is only drawn
+    when the slot changes.
     """
 
     _curr_week_day: int = 0  # Monday = 0, Tuesday = 1 [...] Sunday = 6
@@ -69,59 +74,109 @@ class simulationFlowControlModule(simulation_module):
     start_year = 2000
     start_minute = 0
 
-    def __init__(self, trigger: int) -> None:
-        """ Initialize the module.
+    HOURS_PER_WEEK = 7 * 24
+
+    def __init__(self, trigger: int, config_path: str = None, interpolate: bool = False, seed: int = None) -> None:
+        """ Initialize the module and compile the flow laws into a table with one slot per hour of the week.
         :param trigger: trigger step/frequency
+        :param config_path: optional JSON file containing the start date and the flow laws, see load_config
+        :param interpolate: interpolate the scale linearly between the values of consecutive slots
+        :param seed: optional seed of the random scale values
         """
         super().__init__(trigger)
+        self.flow_laws = dict(self.flow_laws)
+        if config_path is not None:
+            self.load_config(config_path)
         print(self._start.weekday())
 
+        self._interpolate = interpolate
+        self._random = random.Random(seed)
+        self._table = self.compile_flow_laws(self.flow_laws)
+        # offset of the simulation start from Monday 00:00 in seconds
+        self._start_offset = (self._start.weekday() * 24 + self._start.hour) * 3600 + \
+            self._start.minute * 60 + self._start.second
+
+        self._curr_slot: int = None
+        self._curr_value: float = None
+        self._next_value: float = None
+        self._curr_scale: float = None
+
+    def load_config(self, path: str):
+        """ Load start date and flow laws from a JSON file of the form
+        {"start": "2023-03-20T00:00", "flow_laws": [{"from": [0, 6], "to": [0, 9], "scale": [2.5, 3.0]}, ...]}
+        Both keys are optional, the laws replace the default laws and are matched in the given order.
+        :param path: path of the JSON file
+        """
+        with open(path) as file:
+            config = json.load(file)
+        if "start" in config:
+            self._start = datetime.fromisoformat(config["start"])
+        if "flow_laws" in config:
+            self.flow_laws = {(tuple(law["from"]), tuple(law["to"])): tuple(law["scale"])
+                              for law in config["flow_laws"]}
+
+    @classmethod
+    def compile_flow_laws(cls, flow_laws: dict) -> list[tuple[float, float]]:
+        """ Compile flow laws into a table with one entry per hour of the week (Monday 00:00 = slot 0).
+        Like the rules, both ends of an interval are inclusive, intervals may wrap around the end of the week
+        and the first matching law is used. Slots without a matching law are None.
+        :param flow_laws: flow laws of the form (from [week_day, hour], to [week_day, hour]) => [min flow, max flow]
+        :return: list of 168 <min flow, max flow> tuples or None
+        """
+        table: list[tuple[float, float]] = [None] * cls.HOURS_PER_WEEK
+        for ((start_day, start_hour), (end_day, end_hour)), flow in flow_laws.items():
+            start = start_day * 24 + start_hour
+            end = end_day * 24 + end_hour
+            if end < start:
+                end += cls.HOURS_PER_WEEK
+            for hour in range(start, end + 1):
+                slot = hour % cls.HOURS_PER_WEEK
+                if table[slot] is None:
+                    table[slot] = tuple(flow)
+        return table
+
+    def _sample(self, slot: int) -> float:
+        """ Draw a random scale value for a slot
+        :param slot: hour of the week
+        :return: scale value or None if no law matches the slot
+        """
+        flow = self._table[slot % self.HOURS_PER_WEEK]
+        if flow is None:
+            return None
+        return self._random.uniform(flow[0], flow[1])
+
     def process_sim_update(self, manager: data_manager):
         """ Process update of module by adjusting the scale of the simulation based on
         the "current" time and weekday
         :param manager: data manager of DeppSUMO
         """
-        sec = int(traci.simulation.getTime())
-        curr = self._start + timedelta(seconds=sec)
-
-        def in_between(interval: tuple[tuple[int, int], tuple[int, int]], curr: tuple[int, int]):
-            """ check if a tuple of <weekday, hour> is chronologically in between two other tuples
-            e.g. (1, 12) is in between (1, 10) and (3, 10) but not in between (0, 12) and (1, 10)
-            :param interval: tuple consisting of <start interval, stop interval>
-            :param curr: target interval
-            :return: true or false
-            """
-            total_hours_start = interval[0][0] * 24 + interval[0][1]
-            total_hours_end = interval[1][0] * 24 + interval[1][1]
-            total_hours_target = curr[0] * 24 + curr[1]
-
-            if total_hours_end < total_hours_start:
-                total_hours_end += 7 * 24
-                if total_hours_target < total_hours_start:
-                    total_hours_target += 7 * 24
-
-            if total_hours_start <= total_hours_target <= total_hours_end:
-                return True
+        seconds = self._start_offset + traci.simulation.getTime()
+        hour_of_week = int(seconds // 3600)
+        slot = hour_of_week % self.HOURS_PER_WEEK
+
+        # the scale is only sampled again if the slot changed
+        if slot != self._curr_slot:
+            if self._interpolate and self._curr_slot is not None and \
+                    slot == (self._curr_slot + 1) % self.HOURS_PER_WEEK:
+                self._curr_value = self._next_value
             else:
-                return False
-
-        target = (curr.weekday(), curr.hour)
-        # initialize variable to store flow interval with default value of 1.0
-        new_flow: tuple[float, float] = (1.0, 1.0)
-
-        # check all intervals and set scale value according to matching interval
-        for curr_interval in self.flow_laws.keys():
-            if in_between(curr_interval, target):
-                random_min, random_max = self.flow_laws[curr_interval]
-                new_flow = self.flow_laws[curr_interval]
-                new_scale = random.uniform(random_min, random_max)
-                traci.simulation.setScale(new_scale)
-                break
-
-        # print visualisation output
-        if curr.hour != self._curr_hour:
+                self._curr_value = self._sample(slot)
+            self._next_value = self._sample(slot + 1) if self._interpolate else None
+            self._curr_slot = slot
+
+            # print visualisation output
+            flow = self._table[slot] or (1.0, 1.0)
             print("-----DONG, DONG, DONG-----")
             print("Passed one hour!")
-            print("Day:", curr.weekday(), "Hour:", curr.hour)
-            print("Flow between", new_flow[0], "and", new_flow[1])
-            self._curr_hour = curr.hour
+            print("Day:", slot // 24, "Hour:", slot % 24)
+            print("Flow between", flow[0], "and", flow[1])
+
+        # slots without a matching law leave the scale unchanged
+        scale = self._curr_value
+        if scale is not None and self._next_value is not None:
+            t = seconds / 3600 - hour_of_week
+            scale = (1 - t) * scale + t * self._next_value
+
+        if scale is not None and scale != self._curr_scale:
+            traci.simulation.setScale(scale)
+            self._curr_scale = scale
@@ -1,6 +1,7 @@
 from manager.data_manager import data_manager
 from generator.detector_node_connector import detector_connector_strategy
 from simulation.modules.sim_module import simulation_module
+from simulation.sim_stats import sim_stats
 import traci
 
 
@@ -10,6 +11,14 @@ class simulation_core:
     During initialization the simulation is started using the parameters set up in the setting object.
     If more parameters are needed, they can be passed as an array using the "launch_arguments" parameter and are then
     added to the SUMO start command.
+
+    The duration of every phase of the simulation loop (SUMO step, data collection, each module) is recorded
+    in a sim_stats object. If "count_traci_calls" is set, all TraCI calls are counted as well.
+    The statistics are written every "stats_dump_interval" simulation steps to "stats_json_path"
+    and/or "stats_prometheus_path" if set.
+
+    If "shared_memory_name" is set, other local processes can read the node features while the simulation
+    is running using a shared_feature_reader, e.g. shared_feature_reader(settings["shared_memory_name"]).
     """
     _sumoCmd = ""
 
@@ -21,6 +30,9 @@ class simulation_core:
 
     _processing_observers = []
     _post_observers = []
+    _observer_names: dict[int, str] = None
+
+    _stats: sim_stats = None
 
     def __init__(self, settings: dict, strategy: detector_connector_strategy,
                  launch_arguments: list[str] = None) -> None:
@@ -34,27 +46,43 @@ class simulation_core:
             for arg in launch_arguments:
                 self._sumoCmd.append(arg)
 
+        self._processing_observers = []
+        self._post_observers = []
+        self._observer_names = {}
+        self._stats = sim_stats()
+        if self._settings.get("count_traci_calls", False):
+            self._stats.instrument_traci(traci)
+
         # start SUMO and initialize data manager
-        traci.start(self._sumoCmd)
-        self._data = data_manager(settings, strategy)
+        with self._stats.phase("setup"):
+            traci.start(self._sumoCmd)
+            self._data = data_manager(settings, strategy)
 
     def start_simulation(self):
         """ Start the main simulation loop of DeepSUMO """
         self._curr_sim_step = 0
 
+        dump_interval = int(self._settings.get("stats_dump_interval", 3600))
         while self._curr_sim_step < int(self._settings["sim_length"]):
             self._go_simulation_step()
+            if self._curr_sim_step % dump_interval == 0:
+                self.dump_stats()
 
         # apply moving average to denoise data
-        self._data.numpy.apply_moving_average()
+        with self._stats.phase("moving_average"):
+            self._data.numpy.apply_moving_average()
 
         # process all post observers
         for observer in self._post_observers:
-            observer.process_sim_update(self._data)
+            with self._stats.phase(self._observer_names[id(observer)]):
+                observer.process_sim_update(self._data)
+        self.dump_stats()
 
     def stop_simulation(self):
         """ Stop the simulation and close TraCi connection"""
         traci.close()
+        self._data.numpy.close_shared_memory()
+        self._stats.uninstrument_traci()
 
     def _go_simulation_step(self):
         """ Perform one simulation step including all aspects
@@ -62,12 +90,14 @@ class simulation_core:
         """
 
         # go SUMO simulation step
-        traci.simulationStep()
+        with self._stats.phase("simulation_step"):
+            traci.simulationStep()
 
         # check if data should be collected, and collect data if needed
         if (self._curr_sim_step % int(self._settings["interval_length"]) == 0 and
                 self._curr_sim_step != 0):
-            self._data.numpy.process_next_interval()
+            with self._stats.phase("process_next_interval"):
+                self._data.numpy.process_next_interval()
             self._curr_processing_step += 1
             self._data.add_processing_step()
 
@@ -75,17 +105,46 @@ class simulation_core:
         for observer in self._processing_observers:
             if (self._curr_sim_step != 0 and
                     self._curr_sim_step % observer.get_trigger_step() == 0):
-                observer.process_sim_update(self._data)
+                with self._stats.phase(self._observer_names[id(observer)]):
+                    observer.process_sim_update(self._data)
 
         self._curr_sim_step += 1
 
     def add_post_observer(self, observer: simulation_module):
         """Add a post observer to run directly after the simulation finishes"""
         self._post_observers.append(observer)
+        self._name_observer(observer, "post_observer")
 
     def add_continuous_observer(self, observer: simulation_module):
         """ Add a continuous observer to run at set intervals while the simulation is running."""
         self._processing_observers.append(observer)
+        self._name_observer(observer, "observer")
+
+    def _name_observer(self, observer: simulation_module, kind: str):
+        """ Assign the name of the phase timing an observer, e.g. "observer/progress_module".
+        Multiple observers of the same class are numbered.
+        :param observer: observer
+        :param kind: kind of the observer
+        """
+        name = kind + "/" + type(observer).__name__
+        taken = set(self._observer_names.values())
+        if name in taken:
+            suffix = 2
+            while f"{name}#{suffix}" in taken:
+                suffix += 1
+            name = f"{name}#{suffix}"
+        self._observer_names[id(observer)] = name
+
+    def get_stats(self) -> sim_stats:
+        """Get the timing statistics of the simulation loop"""
+        return self._stats
+
+    def dump_stats(self):
+        """Write the timing statistics to the files set by "stats_json_path" and "stats_prometheus_path" """
+        json_path = self._settings.get("stats_json_path")
+        prometheus_path = self._settings.get("stats_prometheus_path")
+        if json_path is not None or prometheus_path is not None:
+            self._stats.dump(json_path, prometheus_path)
 
     def add_connector_strat(self, strat: detector_connector_strategy):
         """Change the connector strategy"""
@@ -0,0 +1,228 @@
+import json
+import math
+import os
+import time
+
+
+class timing_counter:
+    """
+    Counter of the durations of one phase of the simulation loop.
+
+    Besides count and total the durations are sorted into a logarithmic histogram with 8 buckets per
+    power of two between 1 microsecond and about 38 hours, so p50/p99 can be estimated with a relative
+    error below 5% without storing every duration.
+    """
+    BUCKETS_PER_OCTAVE = 8
+    MIN_SECONDS = 1e-6
+    NUM_BUCKETS = 37 * 8
+
+    def __init__(self) -> None:
+        """
+        Initialize empty counter
+        """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._buckets = [0] * self.NUM_BUCKETS
+
+    def add(self, seconds: float):
+        """ Add one duration
+        :param seconds: duration in seconds
+        """
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if seconds <= self.MIN_SECONDS:
+            bucket = 0
+        else:
+            bucket = min(int(math.log2(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_OCTAVE) + 1,
+                         self.NUM_BUCKETS - 1)
+        self._buckets[bucket] += 1
+
+    def quantile(self, q: float) -> float:
+        """ Estimate a quantile of the durations
+        :param q: quantile between 0 and 1
+        :return: estimated duration in seconds, the geometric center of the bucket containing the quantile
+        """
+        if self.count == 0:
+            return 0.0
+        # nearest rank
+        rank = max(math.ceil(q * self.count) - 1, 0)
+        seen = 0
+        for bucket, bucket_count in enumerate(self._buckets):
+            seen += bucket_count
+            if seen > rank:
+                break
+        if bucket == 0:
+            return self.MIN_SECONDS
+        # bucket b covers [MIN * 2^((b - 1) / k), MIN * 2^(b / k))
+        center = self.MIN_SECONDS * 2 ** ((bucket - 0.5) / self.BUCKETS_PER_OCTAVE)
+        return min(center, self.max)
+
+    def summary(self) -> dict:
+        """ Get count, total, mean, p50, p99 and max of the durations in seconds"""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class _timed_phase:
+    """
+    Context manager adding the duration of its block to a timing counter
+    """
+
+    def __init__(self, counter: timing_counter) -> None:
+        self._counter = counter
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._counter.add(time.perf_counter() - self._start)
+        return False
+
+
+class sim_stats:
+    """
+    Class that collects timing counters of the phases of the simulation loop and the number of TraCI calls,
+    and writes them as JSON or Prometheus text file.
+    """
+    # TraCI domains whose calls are counted
+    TRACI_DOMAINS = ["simulation", "inductionloop", "edge", "lane", "vehicle", "trafficlight", "route", "person"]
+
+    def __init__(self) -> None:
+        """
+        Initialize empty statistics
+        """
+        self._phases: dict[str, timing_counter] = {}
+        self._traci_calls: dict[str, int] = {}
+        self._instrumented: list[tuple[object, str, object]] = []
+        self._start_time = time.time()
+
+    def phase(self, name: str) -> _timed_phase:
+        """ Get a context manager timing a block as part of a phase, e.g. "with stats.phase('simulation_step'):"
+        :param name: name of the phase
+        :return: context manager
+        """
+        counter = self._phases.get(name)
+        if counter is None:
+            counter = self._phases[name] = timing_counter()
+        return _timed_phase(counter)
+
+    def record(self, name: str, seconds: float):
+        """ Add a measured duration to a phase
+        :param name: name of the phase
+        :param seconds: duration in seconds
+        """
+        counter = self._phases.get(name)
+        if counter is None:
+            counter = self._phases[name] = timing_counter()
+        counter.add(seconds)
+
+    def get_phases(self) -> dict[str, timing_counter]:
+        """ Get the timing counters of all phases"""
+        return self._phases
+
+    def get_traci_calls(self) -> dict[str, int]:
+        """ Get the number of calls of each counted TraCI function"""
+        return self._traci_calls
+
+    def instrument_traci(self, traci_module):
+        """
+        Count the calls of all public functions of the TraCI domains and of traci.simulationStep
+        by replacing them with counting wrappers. Use uninstrument_traci to restore the original functions.
+        :param traci_module: the traci module
+        """
+        calls = self._traci_calls
+
+        def wrap(owner, attribute: str, name: str):
+            function = getattr(owner, attribute)
+            calls.setdefault(name, 0)
+
+            def counted(*args, **kwargs):
+                calls[name] += 1
+                return function(*args, **kwargs)
+
+            self._instrumented.append((owner, attribute, owner.__dict__.get(attribute)
+                                       if hasattr(owner, "__dict__") else None))
+            setattr(owner, attribute, counted)
+
+        wrap(traci_module, "simulationStep", "simulationStep")
+        for domain_name in self.TRACI_DOMAINS:
+            domain = getattr(traci_module, domain_name, None)
+            if domain is None:
+                continue
+            for attribute in dir(domain):
+                if attribute.startswith("_") or not callable(getattr(domain, attribute)):
+                    continue
+                wrap(domain, attribute, domain_name + "." + attribute)
+
+    def uninstrument_traci(self):
+        """ Restore all functions replaced by instrument_traci"""
+        for owner, attribute, original in reversed(self._instrumented):
+            if original is None:
+                # the function was defined by the class of the domain
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+        self._instrumented = []
+
+    def to_dict(self) -> dict:
+        """ Get all statistics as dictionary"""
+        return {
+            "uptime": time.time() - self._start_time,
+            "phases": {name: counter.summary() for name, counter in self._phases.items()},
+            "traci_calls": {name: count for name, count in self._traci_calls.items() if count > 0},
+        }
+
+    def to_prometheus(self) -> str:
+        """ Get all statistics in the Prometheus text format"""
+        lines = [
+            "# HELP deepsumo_phase_seconds Duration of the phases of the simulation loop",
+            "# TYPE deepsumo_phase_seconds summary",
+        ]
+        for name, counter in self._phases.items():
+            label = 'phase="' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+            lines.append(f'deepsumo_phase_seconds{{{label},quantile="0.5"}} {counter.quantile(0.5):.9g}')
+            lines.append(f'deepsumo_phase_seconds{{{label},quantile="0.99"}} {counter.quantile(0.99):.9g}')
+            lines.append(f"deepsumo_phase_seconds_sum{{{label}}} {counter.total:.9g}")
+            lines.append(f"deepsumo_phase_seconds_count{{{label}}} {counter.count}")
+        lines.append("# HELP deepsumo_traci_calls_total Number of calls of TraCI functions")
+        lines.append("# TYPE deepsumo_traci_calls_total counter")
+        for name, count in self._traci_calls.items():
+            if count > 0:
+                lines.append(f'deepsumo_traci_calls_total{{function="{name}"}} {count}')
+        lines.append("# HELP deepsumo_uptime_seconds Time since the statistics were created")
+        lines.append("# TYPE deepsumo_uptime_seconds gauge")
+        lines.append(f"deepsumo_uptime_seconds {time.time() - self._start_time:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, json_path: str = None, prometheus_path: str = None):
+        """
+        Write the statistics to files. Files are replaced atomically,
+        so a reader (e.g. a node exporter) never sees a partially written file.
+        :param json_path: path of the JSON file
+        :param prometheus_path: path of the Prometheus text file
+        """
+        if json_path is not None:
+            _write_atomic(json_path, json.dumps(self.to_dict(), indent=2))
+        if prometheus_path is not None:
+            _write_atomic(prometheus_path, self.to_prometheus())
+
+
+def _write_atomic(path: str, content: str):
+    """ Write a file by writing a temporary file and renaming it
+    :param path: path of the file
+    :param content: content of the file
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        file.write(content)
+    os.replace(tmp_path, path)
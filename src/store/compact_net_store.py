@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+class compact_lane:
+    """
+    Lightweight lane object of a compact_net_store, offering the parts of the sumolib lane interface used by DeepSUMO
+    """
+
+    def __init__(self, store, index: int) -> None:
+        """
+        Initialize lane
+        :param store: compact net store the lane belongs to
+        :param index: index of the lane in the store
+        """
+        self._store = store
+        self._index = index
+
+    def getID(self) -> str:
+        """ Get SUMO-ID of the lane"""
+        return str(self._store.lane_ids[self._index])
+
+    def getShape(self) -> np.array:
+        """ Get shape of the lane as array of coordinates of shape (num_points, 2)"""
+        return self._store.get_lane_shape(self._index)
+
+    def getSpeed(self) -> float:
+        """ Get speed limit of the lane"""
+        return float(self._store.lane_speed[self._index])
+
+    def getLength(self) -> float:
+        """ Get length of the lane"""
+        return float(self._store.lane_length[self._index])
+
+    def getEdge(self):
+        """ Get edge the lane belongs to"""
+        return compact_edge(self._store, int(self._store.lane_edge[self._index]))
+
+
+class compact_edge:
+    """
+    Lightweight edge object of a compact_net_store, offering the parts of the sumolib edge interface used by DeepSUMO
+    """
+
+    def __init__(self, store, index: int) -> None:
+        """
+        Initialize edge
+        :param store: compact net store the edge belongs to
+        :param index: index of the edge in the store
+        """
+        self._store = store
+        self._index = index
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, compact_edge) and other._store is self._store and other._index == self._index
+
+    def __hash__(self) -> int:
+        return self._index
+
+    def get_index(self) -> int:
+        """ Get index of the edge in the store"""
+        return self._index
+
+    def getID(self) -> str:
+        """ Get SUMO-ID of the edge"""
+        return str(self._store.edge_ids[self._index])
+
+    def getName(self) -> str:
+        """ Get street name of the edge"""
+        return str(self._store.edge_names[self._index])
+
+    def getType(self) -> str:
+        """ Get road type of the edge"""
+        return str(self._store.edge_types[self._index])
+
+    def getSpeed(self) -> float:
+        """ Get speed limit of the edge"""
+        return float(self._store.edge_speed[self._index])
+
+    def getLength(self) -> float:
+        """ Get length of the edge"""
+        return float(self._store.edge_length[self._index])
+
+    def getLanes(self) -> list[compact_lane]:
+        """ Get all lanes of the edge"""
+        start, stop = self._store.edge_lane_ptr[self._index:self._index + 2]
+        return [compact_lane(self._store, i) for i in range(start, stop)]
+
+    def getOutgoing(self) -> dict:
+        """ Get all edges directly reachable from this edge, the values are always empty lists"""
+        return {compact_edge(self._store, int(i)): [] for i in self._store.get_successors(self._index)}
+
+
+class compact_net_store:
+    """
+    Class that stores the parts of a SUMO network used by DeepSUMO (lane shapes, speeds, lengths,
+    edge types and connectivity) in flat NumPy arrays.
+
+    Lane shapes are stored as packed coordinates with offsets and the connectivity of the edges as CSR arrays.
+    The arrays are saved as .npy files and memory-mapped on load, so loading is almost instant.
+    The store offers the subset of the sumolib.net.Net interface used by DeepSUMO and can be used in its place.
+    """
+    FORMAT_VERSION = 1
+    ARRAYS = ["lane_ids", "lane_edge", "lane_speed", "lane_length", "shape_coords", "shape_offsets",
+              "edge_ids", "edge_names", "edge_types", "edge_speed", "edge_length", "edge_lane_ptr",
+              "successor_ptr", "successors"]
+
+    def __init__(self, arrays: dict[str, np.array]) -> None:
+        """
+        Initialize store from arrays
+        :param arrays: dictionary containing all arrays listed in ARRAYS
+        """
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self._lane_lookup: dict[str, int] = None
+        self._edge_lookup: dict[str, int] = None
+        self._graph = None
+        self._path_cache: dict[int, tuple[np.array, np.array]] = {}
+
+    @classmethod
+    def from_sumolib(cls, net):
+        """
+        Extract all needed fields from a sumolib net object
+        :param net: sumolib net object
+        :return: compact net store
+        """
+        edges = net.getEdges()
+        edge_lookup = {edge.getID(): i for i, edge in enumerate(edges)}
+
+        lane_ids, lane_edge, lane_speed, lane_length = [], [], [], []
+        shape_coords, shape_offsets = [], [0]
+        edge_lane_ptr, successor_ptr, successors = [0], [0], []
+        for edge_index, edge in enumerate(edges):
+            for lane in edge.getLanes():
+                lane_ids.append(lane.getID())
+                lane_edge.append(edge_index)
+                lane_speed.append(lane.getSpeed())
+                lane_length.append(lane.getLength())
+                # shapes of networks with elevation data contain z coordinates which are not needed
+                shape = [point[:2] for point in lane.getShape()]
+                shape_coords.extend(shape)
+                shape_offsets.append(shape_offsets[-1] + len(shape))
+            edge_lane_ptr.append(len(lane_ids))
+            successors.extend(edge_lookup[target.getID()] for target in edge.getOutgoing())
+            successor_ptr.append(len(successors))
+
+        return cls({
+            "lane_ids": np.array(lane_ids, dtype=str),
+            "lane_edge": np.array(lane_edge, dtype=np.int32),
+            "lane_speed": np.array(lane_speed, dtype=np.float64),
+            "lane_length": np.array(lane_length, dtype=np.float64),
+            "shape_coords": np.array(shape_coords, dtype=np.float64).reshape(-1, 2),
+            "shape_offsets": np.array(shape_offsets, dtype=np.int64),
+            "edge_ids": np.array([edge.getID() for edge in edges], dtype=str),
+            "edge_names": np.array([edge.getName() for edge in edges], dtype=str),
+            "edge_types": np.array([edge.getType() for edge in edges], dtype=str),
+            "edge_speed": np.array([edge.getSpeed() for edge in edges], dtype=np.float64),
+            "edge_length": np.array([edge.getLength() for edge in edges], dtype=np.float64),
+            "edge_lane_ptr": np.array(edge_lane_ptr, dtype=np.int64),
+            "successor_ptr": np.array(successor_ptr, dtype=np.int64),
+            "successors": np.array(successors, dtype=np.int32),
+        })
+
+    def save(self, directory: str):
+        """ Save all arrays as .npy files into a directory
+        :param directory: target directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, name + ".npy"), getattr(self, name))
+        # the meta file is written last and marks the cache as complete
+        with open(os.path.join(directory, "meta.json"), "w") as file:
+            json.dump({"version": self.FORMAT_VERSION, "lanes": len(self.lane_ids),
+                       "edges": len(self.edge_ids)}, file)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """ Load a store saved with save
+        :param directory: directory containing the arrays
+        :param mmap: memory-map the arrays instead of reading them
+        :return: compact net store or None if the directory contains no valid store
+        """
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as file:
+            if json.load(file).get("version") != cls.FORMAT_VERSION:
+                return None
+        mmap_mode = "r" if mmap else None
+        return cls({name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode)
+                    for name in cls.ARRAYS})
+
+    def get_lane_shape(self, lane_index: int) -> np.array:
+        """ Get the shape of a lane as view of the packed coordinates
+        :param lane_index: index of the lane
+        :return: array of shape (num_points, 2)
+        """
+        return self.shape_coords[self.shape_offsets[lane_index]:self.shape_offsets[lane_index + 1]]
+
+    def get_successors(self, edge_index: int) -> np.array:
+        """ Get indices of all edges directly reachable from an edge
+        :param edge_index: index of the edge
+        :return: array of edge indices
+        """
+        return self.successors[self.successor_ptr[edge_index]:self.successor_ptr[edge_index + 1]]
+
+    def getLane(self, lane_id: str) -> compact_lane:
+        """ Get lane by its SUMO-ID"""
+        if self._lane_lookup is None:
+            self._lane_lookup = {lane: i for i, lane in enumerate(self.lane_ids.tolist())}
+        return compact_lane(self, self._lane_lookup[lane_id])
+
+    def getEdge(self, edge_id: str) -> compact_edge:
+        """ Get edge by its SUMO-ID"""
+        if self._edge_lookup is None:
+            self._edge_lookup = {edge: i for i, edge in enumerate(self.edge_ids.tolist())}
+        return compact_edge(self, self._edge_lookup[edge_id])
+
+    def getEdges(self) -> list[compact_edge]:
+        """ Get all edges"""
+        return [compact_edge(self, i) for i in range(len(self.edge_ids))]
+
+    def get_travel_times(self) -> np.array:
+        """ Get the free flow travel time of every edge"""
+        return np.asarray(self.edge_length) / np.asarray(self.edge_speed)
+
+    def get_edge_graph(self):
+        """ Get the edge graph as sparse matrix, an entry (a, b) contains the travel time of edge b
+        :return: scipy CSR matrix of shape (num_edges, num_edges)
+        """
+        if self._graph is None:
+            from scipy.sparse import csr_matrix
+
+            num_edges = len(self.edge_ids)
+            weights = self.get_travel_times()[self.successors]
+            self._graph = csr_matrix((weights, np.asarray(self.successors), np.asarray(self.successor_ptr)),
+                                     shape=(num_edges, num_edges))
+        return self._graph
+
+    def getFastestPath(self, from_edge: compact_edge, to_edge: compact_edge):
+        """
+        Get the fastest path between two edges using free flow travel times.
+        The cost includes the travel time of both edges, like sumolib's getFastestPath.
+        The shortest path tree of each source edge is computed once and cached.
+        :param from_edge: source edge
+        :param to_edge: target edge
+        :return: tuple of <list of edges of the path or None, travel time>
+        """
+        source, target = from_edge.get_index(), to_edge.get_index()
+        if source not in self._path_cache:
+            from scipy.sparse.csgraph import dijkstra
+
+            self._path_cache[source] = dijkstra(self.get_edge_graph(), indices=source, return_predecessors=True)
+        distances, predecessors = self._path_cache[source]
+        if np.isinf(distances[target]):
+            return None, float("inf")
+
+        path = [target]
+        while path[-1] != source:
+            path.append(int(predecessors[path[-1]]))
+        cost = self.get_travel_times()[source] + distances[target]
+        return [compact_edge(self, i) for i in reversed(path)], float(cost)
+
+
+def _hash_file(path: str) -> str:
+    """ Calculate SHA-256 hash of a file
+    :param path: path of the file
+    :return: hex digest
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_net(net_path: str, cache_dir: str = None):
+    """
+    Load a SUMO network. If a cache directory is given the network is converted into a compact_net_store
+    once, keyed on the hash of the net file, and memory-mapped from the cache on subsequent runs.
+    :param net_path: path of the net.xml(.gz) file
+    :param cache_dir: directory of the cache, if None the network is parsed by sumolib
+    :return: compact_net_store or sumolib net object
+    """
+    if cache_dir is None:
+        import sumolib
+        return sumolib.net.readNet(net_path)
+
+    directory = os.path.join(cache_dir, _hash_file(net_path)[:16])
+    store = compact_net_store.load(directory)
+    if store is not None:
+        print("[Compact Net Store] - Loaded cached network from", directory)
+        return store
+
+    import sumolib
+    print("[Compact Net Store] - Parsing network, this can take a while...")
+    store = compact_net_store.from_sumolib(sumolib.net.readNet(net_path))
+    store.save(directory)
+    print("[Compact Net Store] - Cached network in", directory)
+    return compact_net_store.load(directory)
@@ -1,6 +1,14 @@
+from __future__ import annotations
+
 import numpy as np
-import networkx as nx
 from controllers.translation_controller import translation_controller
+from store.shared_feature_store import shared_feature_block
+from store.running_statistics import running_statistics
+from store.storage_dtypes import get_numpy_dtype, encode, decode
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 
 class numpy_graph_store:
@@ -8,42 +16,75 @@ class numpy_graph_store:
     Class that stores all collected detector data in NumPy arrays.
     This is an internal class and should not be used. Please use the numpy_controller instead.
     """
-    _node_features_speed: np.array = None
-    _node_features_occupancy: np.array = None
-    _node_features_vehicles: np.array = None
+    # node feature arrays of size (num_graphs, num_nodes) by feature name
+    _node_features: dict[str, np.array] = None
+    _aggregations: dict[str, str] = None
+    # storage dtype of every node feature, see store.storage_dtypes
+    _storage_dtypes: dict[str, str] = None
+
+    # aggregated node features of size (num_graphs // level, num_nodes) by level and feature name
+    _aggregates: dict[int, dict[str, np.array]] = None
+    # running sums of the incomplete aggregated interval of each level
+    _partial_sums: dict[int, dict[str, np.array]] = None
+
+    # running per node statistics of every feature
+    _statistics: dict[str, running_statistics] = None
+
+    # shared memory holding the node features, if they are shared with other processes
+    _shared: shared_feature_block = None
 
     _edge_index: np.array = None
+    _edge_weights: np.array = None
 
     _curr_graph: int = 0
     _total_graphs: int = 0
     _number_of_nodes: int = 0
     _number_of_edges: int = 0
 
-    def __init__(self, total_graphs: int, graph: nx.DiGraph, translation: translation_controller) -> None:
+    def __init__(self, total_graphs: int, graph: nx.DiGraph, translation: translation_controller,
+                 aggregations: dict[str, str] = None, aggregation_levels: list[int] = None,
+                 shared_memory_name: str = None, storage_dtypes: dict[str, str] = None) -> None:
         """
         Initialize store by creating all necessary arrays filled with zeroes
+        :param aggregations: names of the stored node features and how each of them is aggregated over
+        several intervals, defaults to speed, occupancy and vehicles
+        :param aggregation_levels: numbers of intervals aggregated into one interval of a coarser resolution,
+        e.g. [3, 12] to additionally keep 15 minute and hourly data for an interval length of 5 minutes
+        :param shared_memory_name: if set, the node features are stored in shared memory of this name,
+        so other processes can read them using a shared_feature_reader
+        :param storage_dtypes: storage dtype of some node features, e.g. {"speed": "float16", "vehicles": "uint8"},
+        all other node features are stored as float32
         """
         self._total_graphs = total_graphs
         self._number_of_nodes = graph.number_of_nodes()
         self._number_of_edges = graph.number_of_edges()
+        self._aggregations = aggregations or {"speed": "vehicle_weighted_mean", "occupancy": "mean",
+                                              "vehicles": "sum"}
 
-        # generate node feature arrays of size (num_graphs, num_nodes}) each
-        self._node_features_speed = np.zeros((
-            self._total_graphs,
-            self._number_of_nodes
-        ), dtype=np.float32)
-
-        self._node_features_occupancy = np.zeros((
-            self._total_graphs,
-            self._number_of_nodes
-        ), dtype=np.float32)
+        storage_dtypes = storage_dtypes or {}
+        unknown = set(storage_dtypes) - set(self._aggregations)
+        if unknown:
+            raise ValueError("Storage dtypes set for unknown node features " + str(sorted(unknown)))
+        self._storage_dtypes = {name: storage_dtypes.get(name, "float32") for name in self._aggregations}
 
-        self._node_features_vehicles = np.zeros((
-            self._total_graphs,
-            self._number_of_nodes
-        ), dtype=np.float32)
+        # generate node feature arrays of size (num_graphs, num_nodes}) each
+        self._node_features = {}
+        if shared_memory_name is not None:
+            self._shared = shared_feature_block(shared_memory_name, list(self._aggregations),
+                                                self._total_graphs, self._number_of_nodes, self._storage_dtypes)
+            for name in self._aggregations:
+                self._node_features[name] = self._shared.get_array(name)
+        else:
+            for name in self._aggregations:
+                self._node_features[name] = np.zeros((
+                    self._total_graphs,
+                    self._number_of_nodes
+                ), dtype=get_numpy_dtype(self._storage_dtypes[name]))
 
-        print("[Numpy Graph Store] - Created node features:", self._node_features_speed.shape)
+        print("[Numpy Graph Store] - Created node features:", self._storage_dtypes,
+              (self._total_graphs, self._number_of_nodes))
+        self._statistics = {name: running_statistics(self._number_of_nodes) for name in self._aggregations}
+        self._create_aggregates(aggregation_levels or [])
         self._generate_edge_index(graph, translation)
         print("[Numpy Graph Store] - Successfully initialized!")
 
@@ -52,72 +93,197 @@ class numpy_graph_store:
         Generate edge index array using edges from before created graph
         """
 
-        # create variable
+        # convert SUMO ids of all edges into indices
+        edges = list(graph.edges())
         self._edge_index = np.zeros((
             2,
             self._number_of_edges
         ), dtype=int)
-
-        # iterate over edges and add to array
-        cnt = 0
-        for edge in graph.edges():
-            # convert SUMO ids into indices
-            self._edge_index[0][cnt] = translation.get_index(edge[0])
-            self._edge_index[1][cnt] = translation.get_index(edge[1])
-            cnt += 1
+        self._edge_index[0] = translation.get_indices(edge[0] for edge in edges)
+        self._edge_index[1] = translation.get_indices(edge[1] for edge in edges)
         print("[Numpy Graph Store] - Created edge index:", self._edge_index.shape)
 
-    def add_new_node_features(self, new_features: list):
+    def _create_aggregates(self, levels: list[int]):
         """
-        Add new node features to the store.
-        The new features are represented by a list of NumPy arrays of size (num_nodes, 3)
-        with each index representing one feature in the order:
+        Create the aggregated node feature arrays and running sums of all aggregation levels
+        :param levels: numbers of intervals aggregated into one interval
+        """
+        if "vehicle_weighted_mean" in self._aggregations.values() and "vehicles" not in self._aggregations:
+            raise ValueError("Vehicle weighted aggregation requires the vehicles feature")
+
+        self._aggregates = {}
+        self._partial_sums = {}
+        for level in sorted(set(int(level) for level in levels)):
+            if level < 2:
+                raise ValueError("Aggregation levels have to be at least 2, got " + str(level))
+            self._aggregates[level] = {name: np.zeros((
+                self._total_graphs // level,
+                self._number_of_nodes
+            ), dtype=np.float32) for name in self._aggregations}
+            # sums are kept in double precision, weighted means additionally sum the product with the vehicles
+            self._partial_sums[level] = {name: np.zeros(self._number_of_nodes) for name in self._aggregations}
+            for name, aggregation in self._aggregations.items():
+                if aggregation == "vehicle_weighted_mean":
+                    self._partial_sums[level][name + "*vehicles"] = np.zeros(self._number_of_nodes)
+            print("[Numpy Graph Store] - Created aggregation level", level, ":",
+                  (self._total_graphs // level, self._number_of_nodes))
+
+    def _update_aggregates(self, new_features: dict[str, np.array]):
+        """
+        Add the features of the current timestep to the running sums of all aggregation levels
+        and write the aggregated interval of each level that is completed by the timestep.
+        Vehicles are summed, speeds are averaged weighted by the number of vehicles and all other
+        features are averaged. If no vehicle passed a detector during an aggregated interval,
+        its speed is averaged unweighted.
+        :param new_features: features of the current timestep
+        """
+        vehicles = new_features.get("vehicles")
+        for level, sums in self._partial_sums.items():
+            for name, aggregation in self._aggregations.items():
+                sums[name] += new_features[name]
+                if aggregation == "vehicle_weighted_mean":
+                    sums[name + "*vehicles"] += new_features[name] * vehicles
 
-        speed, occupancy, vehicles
+            # check if the current timestep completes an aggregated interval
+            if (self._curr_graph + 1) % level != 0:
+                continue
+            target = (self._curr_graph + 1) // level - 1
+            for name, aggregation in self._aggregations.items():
+                if aggregation == "sum":
+                    values = sums[name]
+                elif aggregation == "vehicle_weighted_mean":
+                    total_vehicles = sums["vehicles"]
+                    weighted = np.divide(sums[name + "*vehicles"], total_vehicles,
+                                         out=np.zeros(self._number_of_nodes), where=total_vehicles > 0)
+                    values = np.where(total_vehicles > 0, weighted, sums[name] / level)
+                else:
+                    values = sums[name] / level
+                self._aggregates[level][name][target] = values
+            for values in sums.values():
+                values.fill(0.0)
+
+    def enable_edge_weights(self):
+        """
+        Create the edge weight array of size (num_graphs, num_edges), aligned with the edge index
         """
-        curr_node_cnt = 0
-        for feature in new_features:
-            self._node_features_speed[self._curr_graph][curr_node_cnt] = feature[0]
-            self._node_features_occupancy[self._curr_graph][curr_node_cnt] = feature[1]
-            self._node_features_vehicles[self._curr_graph][curr_node_cnt] = feature[2]
-            curr_node_cnt += 1
+        self._edge_weights = np.zeros((
+            self._total_graphs,
+            self._number_of_edges
+        ), dtype=np.float32)
+        print("[Numpy Graph Store] - Created edge weights:", self._edge_weights.shape)
+
+    def add_new_edge_weights(self, new_weights: np.array):
+        """
+        Add the edge weights of the current timestep to the store.
+        This has to be called before the node features of the timestep are added.
+        :param new_weights: array of size (num_edges) aligned with the edge index
+        """
+        self._edge_weights[self._curr_graph] = new_weights
+
+    def add_new_node_features(self, new_features: dict[str, np.array]):
+        """
+        Add new node features to the store.
+        The new features are represented by a dictionary of feature name to NumPy array of size (num_nodes),
+        as computed by the feature pipeline.
+        """
+        for name, values in new_features.items():
+            self._node_features[name][self._curr_graph] = encode(values, self._storage_dtypes[name])
+            # statistics are updated with the stored values
+            self._statistics[name].add(decode(self._node_features[name][self._curr_graph],
+                                              self._storage_dtypes[name]))
+        if self._partial_sums:
+            self._update_aggregates(new_features)
 
         self._curr_graph += 1
+        if self._shared is not None:
+            self._shared.publish(self._curr_graph)
 
     def apply_moving_average(self):
         """
-        Applies a moving average to the currently stored speed data
+        Applies a moving average to the currently stored speed data.
+        The average of timestep t covers the timesteps t - 4 to t + 3, timesteps without a full window are set to 0.
+        The speed array is updated in place, so it stays valid when it is shared with other processes.
+        The moving average is only applied to the base resolution, aggregated speeds are averaged already.
+        The speed statistics are recomputed afterwards.
         """
+        speed = self._node_features["speed"]
+        storage_dtype = self._storage_dtypes["speed"]
+        averaged = None
+        if self._total_graphs >= 8:
+            # windows of size 8 for the timesteps 4 to total_graphs - 4
+            values = decode(speed, storage_dtype) if storage_dtype == "bfloat16" else speed
+            windows = np.lib.stride_tricks.sliding_window_view(values, 8, axis=0)
+            averaged = encode(windows.mean(axis=-1, dtype=np.float32), storage_dtype)
 
-        # create buffer features
-        tmp_node_features_speed = np.zeros((
-            self._total_graphs,
-            self._number_of_nodes
-        ), dtype=np.float32)
+        if self._shared is not None:
+            self._shared.begin_write()
+        try:
+            speed[:4] = 0.0
+            speed[max(self._total_graphs - 3, 4):] = 0.0
+            if averaged is not None:
+                speed[4:self._total_graphs - 3] = averaged
+        finally:
+            if self._shared is not None:
+                self._shared.end_write()
+        self._statistics["speed"].recompute(self.get_features("speed"))
+
+    def close_shared_memory(self):
+        """
+        Stop sharing the node features, so no new readers can attach.
+        The block is only unlinked, its mapping is kept for the rest of the process, because arrays returned
+        by get_features (and tensors created from them without copying) are views of it.
+        Readers that are already attached keep their mapping.
+        """
+        if self._shared is None:
+            return
+        self._shared.unlink()
+
+    def get_aggregation_levels(self) -> list[int]:
+        """ Get the aggregation levels kept by the store"""
+        return list(self._aggregates)
 
-        for curr_graph in range(self._total_graphs):
-            # check if moving average of size 4 can be applied for current timestep
-            if 4 <= curr_graph <= (self._total_graphs - 4):
-                for curr_detector in range(self._number_of_nodes):
-                    # collect and average relevant values
-                    average_values = self._node_features_speed \
-                        [(curr_graph - 4):(curr_graph + 4), curr_detector]
-                    tmp_node_features_speed[curr_graph][curr_detector] = np.mean(average_values)
+    def get_storage_dtypes(self) -> dict[str, str]:
+        """ Get the storage dtype of every node feature"""
+        return dict(self._storage_dtypes)
 
-        self._node_features_speed = tmp_node_features_speed
+    def get_features(self, name: str, resolution: int = 1, raw: bool = False) -> np.array:
+        """ Get the node features with the passed name up to the current timestep
+        :param name: name of the feature
+        :param resolution: number of intervals aggregated into one, 1 or one of the aggregation levels
+        :param raw: return bfloat16 features as stored (uint16) instead of a decoded float32 copy
+        :return: array of size (num_timesteps, num_nodes) in the storage dtype of the feature, for aggregation
+        levels only completed aggregated intervals are returned as float32
+        """
+        if resolution == 1:
+            if self._storage_dtypes[name] == "bfloat16" and not raw:
+                return decode(self._node_features[name][:self._curr_graph], "bfloat16")
+            return self._node_features[name][:self._curr_graph]
+        if resolution not in self._aggregates:
+            raise ValueError("Resolution " + str(resolution) + " is not an aggregation level of the store")
+        return self._aggregates[resolution][name][:self._curr_graph // resolution]
 
-    def get_speed_features(self) -> np.array:
+    def get_statistics(self, name: str) -> running_statistics:
+        """ Get the running statistics of the node features with the passed name up to the current timestep"""
+        return self._statistics[name]
+
+    def get_speed_features(self, resolution: int = 1) -> np.array:
         """ Get speed node features up to the current timestep"""
-        return self._node_features_speed[:self._curr_graph]
+        return self.get_features("speed", resolution)
 
-    def get_occupancy_features(self):
+    def get_occupancy_features(self, resolution: int = 1):
         """ Get occupancy node features up to the current timestep"""
-        return self._node_features_occupancy[:self._curr_graph]
+        return self.get_features("occupancy", resolution)
 
-    def get_vehicle_number_features(self):
+    def get_vehicle_number_features(self, resolution: int = 1):
         """ Get vehicle number node features up to the current timestep"""
-        return self._node_features_vehicles[:self._curr_graph]
+        return self.get_features("vehicles", resolution)
 
     def get_edge_index(self) -> np.array:
         """ Get edge index"""
         return self._edge_index
+
+    def get_edge_weights(self) -> np.array:
+        """ Get edge weights up to the current timestep or None if they are not collected"""
+        if self._edge_weights is None:
+            return None
+        return self._edge_weights[:self._curr_graph]
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class running_statistics:
+    """
+    Running count, mean and variance of every node of a feature, updated with Welford's algorithm as
+    intervals arrive. Several intervals can be added at once, they are merged using the parallel variant
+    of the algorithm (Chan et al.), so the statistics of a whole array can be computed in chunks.
+    The global statistics over all nodes are merged from the statistics of the nodes.
+    """
+    # intervals added per chunk when the statistics are recomputed from an array
+    CHUNK_SIZE = 1024
+
+    _count: int = 0
+    _mean: np.array = None
+    _m2: np.array = None
+
+    def __init__(self, num_nodes: int) -> None:
+        """
+        Initialize empty statistics
+        :param num_nodes: number of nodes
+        """
+        self._count = 0
+        self._mean = np.zeros(num_nodes)
+        self._m2 = np.zeros(num_nodes)
+
+    def reset(self):
+        """ Remove all added values"""
+        self._count = 0
+        self._mean.fill(0.0)
+        self._m2.fill(0.0)
+
+    def add(self, values: np.array):
+        """ Add the values of one or more intervals
+        :param values: array of size (num_nodes) or (num_intervals, num_nodes)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            # single interval: Welford's update
+            self._count += 1
+            delta = values - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (values - self._mean)
+            return
+        count = values.shape[0]
+        if count == 0:
+            return
+        # merge the statistics of the intervals into the running statistics
+        mean = values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        total = self._count + count
+        delta = mean - self._mean
+        self._mean += delta * (count / total)
+        self._m2 += m2 + delta ** 2 * (self._count * count / total)
+        self._count = total
+
+    def recompute(self, values: np.array):
+        """ Replace the statistics with the statistics of an array, which is processed in chunks
+        so no full double precision copy of the array is created
+        :param values: array of size (num_intervals, num_nodes)
+        """
+        self.reset()
+        for start in range(0, values.shape[0], self.CHUNK_SIZE):
+            self.add(values[start:start + self.CHUNK_SIZE])
+
+    def get_count(self) -> int:
+        """ Get number of added intervals"""
+        return self._count
+
+    def get_mean(self, per_node: bool = False):
+        """ Get mean
+        :param per_node: return the mean of every node instead of the mean over all nodes
+        :return: mean as float or array of size (num_nodes)
+        """
+        if per_node:
+            return self._mean.copy()
+        return float(self._mean.mean()) if len(self._mean) else 0.0
+
+    def get_std(self, per_node: bool = False):
+        """ Get population standard deviation, as calculated by np.std
+        :param per_node: return the standard deviation of every node instead of the one over all nodes
+        :return: standard deviation as float or array of size (num_nodes)
+        """
+        if self._count == 0:
+            return np.zeros_like(self._mean) if per_node else 0.0
+        if per_node:
+            return np.sqrt(self._m2 / self._count)
+        # all nodes have the same count, so the global mean is the mean of the node means
+        global_mean = self._mean.mean()
+        m2 = self._m2.sum() + self._count * ((self._mean - global_mean) ** 2).sum()
+        return float(np.sqrt(m2 / (self._count * len(self._mean))))
@@ -0,0 +1,269 @@
+import json
+import sys
+import time
+
+import numpy as np
+
+from store.storage_dtypes import get_numpy_dtype, decode
+
+# layout of the int64 header at the start of the shared memory block
+_MAGIC = 0x44535446  # "DSTF"
+_VERSION = 2
+_FIELD_MAGIC = 0
+_FIELD_VERSION = 1
+_FIELD_SEQUENCE = 2
+_FIELD_LATEST = 3
+_FIELD_TOTAL_GRAPHS = 4
+_FIELD_NUM_NODES = 5
+_FIELD_META_LENGTH = 6
+_NUM_FIELDS = 8
+_ALIGNMENT = 64
+
+# names of the blocks created by this process, they are registered with the resource tracker by their creator
+_created_names: set[str] = set()
+
+
+def _data_offset(meta_length: int) -> int:
+    """ Get the offset of the first feature array, behind header and metadata aligned to a cache line"""
+    offset = _NUM_FIELDS * 8 + meta_length
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _feature_offsets(offset: int, dtypes: list[np.dtype], total_graphs: int, num_nodes: int) -> list[int]:
+    """ Get the offsets of the feature arrays, each array starts at a cache line"""
+    offsets = []
+    for dtype in dtypes:
+        offsets.append(offset)
+        offset += total_graphs * num_nodes * dtype.itemsize
+        offset = (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+    return offsets + [offset]
+
+
+def _attach(name: str):
+    """ Attach to an existing shared memory block without taking ownership of it
+    :param name: name of the shared memory block
+    :return: SharedMemory object
+    """
+    from multiprocessing import shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # before Python 3.13 attaching registers the block with the resource tracker,
+    # which would unlink it when this process exits
+    if shm.name not in _created_names:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class shared_feature_block:
+    """
+    Shared memory block holding the node feature arrays of a numpy_graph_store, so other local processes
+    can read them while the simulation is running using a shared_feature_reader.
+
+    The block starts with a header containing the number of the latest complete interval and a sequence
+    counter. Intervals are only published after they are written completely. Rewriting already published
+    intervals (e.g. by the moving average) has to be enclosed by begin_write and end_write, which make the
+    sequence counter odd while writing, so readers can detect and retry torn reads (seqlock).
+    """
+    _shm = None
+    _header: np.array = None
+    _arrays: dict[str, np.array] = None
+    _unlinked: bool = False
+
+    def __init__(self, name: str, feature_names: list[str], total_graphs: int, num_nodes: int,
+                 dtypes: dict[str, str] = None) -> None:
+        """
+        Create the shared memory block
+        :param name: name of the block, readers attach using this name
+        :param feature_names: names of the node features
+        :param total_graphs: number of intervals of each feature array
+        :param num_nodes: number of nodes of each feature array
+        :param dtypes: storage dtype of each feature, see store.storage_dtypes, defaults to float32
+        """
+        from multiprocessing import shared_memory
+
+        dtypes = {feature_name: (dtypes or {}).get(feature_name, "float32") for feature_name in feature_names}
+        meta = json.dumps({"features": list(feature_names), "dtypes": dtypes}).encode()
+        numpy_dtypes = [get_numpy_dtype(dtypes[feature_name]) for feature_name in feature_names]
+        offsets = _feature_offsets(_data_offset(len(meta)), numpy_dtypes, total_graphs, num_nodes)
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=max(offsets[-1], 1))
+        _created_names.add(self._shm.name)
+
+        self._header = np.ndarray((_NUM_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+        self._header[:] = 0
+        self._header[_FIELD_VERSION] = _VERSION
+        self._header[_FIELD_TOTAL_GRAPHS] = total_graphs
+        self._header[_FIELD_NUM_NODES] = num_nodes
+        self._header[_FIELD_META_LENGTH] = len(meta)
+        self._shm.buf[_NUM_FIELDS * 8:_NUM_FIELDS * 8 + len(meta)] = meta
+
+        self._arrays = {}
+        for i, feature_name in enumerate(feature_names):
+            self._arrays[feature_name] = np.ndarray((total_graphs, num_nodes), dtype=numpy_dtypes[i],
+                                                    buffer=self._shm.buf, offset=offsets[i])
+            self._arrays[feature_name][:] = 0
+        # the magic is written last, so readers never attach to a partially initialized block
+        self._header[_FIELD_MAGIC] = _MAGIC
+        print("[Shared Feature Block] - Created shared memory", self._shm.name, "of", self._shm.size, "bytes")
+
+    def get_name(self) -> str:
+        """ Get name of the shared memory block"""
+        return self._shm.name
+
+    def get_array(self, feature_name: str) -> np.array:
+        """ Get the feature array of size (total_graphs, num_nodes) in shared memory"""
+        return self._arrays[feature_name]
+
+    def publish(self, latest: int):
+        """ Publish the number of completely written intervals
+        :param latest: number of complete intervals
+        """
+        self._header[_FIELD_LATEST] = latest
+
+    def begin_write(self):
+        """ Start rewriting already published intervals"""
+        self._header[_FIELD_SEQUENCE] += 1
+
+    def end_write(self):
+        """ Finish rewriting already published intervals"""
+        self._header[_FIELD_SEQUENCE] += 1
+
+    def unlink(self):
+        """
+        Remove the block, so no new readers can attach. The mapping of this process and of attached
+        readers stays valid, so arrays returned by get_array can still be used.
+        """
+        if self._unlinked:
+            return
+        self._shm.unlink()
+        _created_names.discard(self._shm.name)
+        self._unlinked = True
+
+    def close(self, unlink: bool = True):
+        """
+        Release the shared memory block. All arrays returned by get_array become invalid and accessing
+        views of them crashes the process, so this must only be called once no view is in use.
+        Readers that are already attached keep their mapping.
+        :param unlink: remove the block, so no new readers can attach
+        """
+        self._header = None
+        self._arrays = None
+        self._shm.close()
+        if unlink:
+            self.unlink()
+
+
+class shared_feature_reader:
+    """
+    Read-only access to the node features of a simulation running in another process.
+    The simulation has to be started with the "shared_memory_name" setting, the reader attaches using
+    the same name.
+
+    reader = shared_feature_reader("deepsumo")
+    speeds = reader.get_features("speed")
+    """
+    _shm = None
+    _header: np.array = None
+    _arrays: dict[str, np.array] = None
+    _feature_names: list[str] = None
+    _dtypes: dict[str, str] = None
+
+    def __init__(self, name: str) -> None:
+        """
+        Attach to the shared memory block of a simulation
+        :param name: name of the block, set by the "shared_memory_name" setting
+        """
+        self._shm = _attach(name)
+        self._header = np.ndarray((_NUM_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+        if self._header[_FIELD_MAGIC] != _MAGIC or self._header[_FIELD_VERSION] != _VERSION:
+            self.close()
+            raise ValueError("Shared memory " + name + " does not contain DeepSUMO features")
+
+        meta_length = int(self._header[_FIELD_META_LENGTH])
+        meta = json.loads(bytes(self._shm.buf[_NUM_FIELDS * 8:_NUM_FIELDS * 8 + meta_length]))
+        self._feature_names = meta["features"]
+        self._dtypes = meta["dtypes"]
+        total_graphs = int(self._header[_FIELD_TOTAL_GRAPHS])
+        num_nodes = int(self._header[_FIELD_NUM_NODES])
+        numpy_dtypes = [get_numpy_dtype(self._dtypes[feature_name]) for feature_name in self._feature_names]
+        offsets = _feature_offsets(_data_offset(meta_length), numpy_dtypes, total_graphs, num_nodes)
+
+        self._arrays = {}
+        for i, feature_name in enumerate(self._feature_names):
+            array = np.ndarray((total_graphs, num_nodes), dtype=numpy_dtypes[i], buffer=self._shm.buf,
+                               offset=offsets[i])
+            array.flags.writeable = False
+            self._arrays[feature_name] = array
+
+    def get_feature_names(self) -> list[str]:
+        """ Get names of all shared node features"""
+        return list(self._feature_names)
+
+    def get_storage_dtypes(self) -> dict[str, str]:
+        """ Get the storage dtype of every shared node feature"""
+        return dict(self._dtypes)
+
+    def get_latest_interval(self) -> int:
+        """ Get the number of complete intervals written by the simulation"""
+        return int(self._header[_FIELD_LATEST])
+
+    def snapshot(self, feature_names: list[str] = None, start: int = 0, end: int = None,
+                 retries: int = 100) -> dict[str, np.array]:
+        """
+        Copy a consistent snapshot of complete intervals of several features
+        :param feature_names: features to copy, defaults to all features
+        :param start: first interval
+        :param end: end of the intervals (exclusive), defaults to the latest complete interval
+        :param retries: number of retries if the simulation rewrites the intervals while copying
+        :return: dictionary of feature name to array of size (num_intervals, num_nodes) in the storage dtype
+        of the feature, bfloat16 features are decoded to float32
+        """
+        names = feature_names or self._feature_names
+        for _ in range(retries + 1):
+            sequence = int(self._header[_FIELD_SEQUENCE])
+            if sequence % 2 == 1:
+                # the simulation is rewriting published intervals
+                time.sleep(0.001)
+                continue
+            latest = self.get_latest_interval()
+            stop = latest if end is None else min(end, latest)
+            result = {name: self._arrays[name][start:stop].copy() for name in names}
+            if int(self._header[_FIELD_SEQUENCE]) == sequence:
+                for name in names:
+                    if self._dtypes[name] == "bfloat16":
+                        result[name] = decode(result[name], "bfloat16")
+                return result
+        raise TimeoutError("Could not read a consistent snapshot of the shared features")
+
+    def get_features(self, feature_name: str, start: int = 0, end: int = None) -> np.array:
+        """
+        Copy the complete intervals of one feature
+        :param feature_name: name of the feature, e.g. "speed"
+        :param start: first interval
+        :param end: end of the intervals (exclusive), defaults to the latest complete interval
+        :return: array of size (num_intervals, num_nodes)
+        """
+        return self.snapshot([feature_name], start, end)[feature_name]
+
+    def wait_for_interval(self, interval: int, timeout: float = None, poll: float = 0.05) -> bool:
+        """
+        Wait until the simulation completed the passed number of intervals
+        :param interval: number of complete intervals
+        :param timeout: maximum time to wait in seconds, None waits forever
+        :param poll: time between two checks in seconds
+        :return: True if the intervals are complete
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.get_latest_interval() < interval:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def close(self):
+        """ Detach from the shared memory block"""
+        self._header = None
+        self._arrays = None
+        self._shm.close()
@@ -0,0 +1,57 @@
+import numpy as np
+
+# storage dtypes of node features and the NumPy dtype they are stored as.
+# NumPy has no bfloat16, bfloat16 values are stored as the upper 16 bits of their float32 value
+STORAGE_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "bfloat16": np.uint16,
+    "uint8": np.uint8,
+    "int8": np.int8,
+    "uint16": np.uint16,
+    "int16": np.int16,
+    "int32": np.int32,
+}
+
+
+def get_numpy_dtype(storage_dtype: str) -> np.dtype:
+    """
+    Get the NumPy dtype a storage dtype is stored as
+    :param storage_dtype: name of the storage dtype, see STORAGE_DTYPES
+    :return: NumPy dtype
+    """
+    if storage_dtype not in STORAGE_DTYPES:
+        raise ValueError("Unknown storage dtype " + str(storage_dtype) + ", use one of " + str(list(STORAGE_DTYPES)))
+    return np.dtype(STORAGE_DTYPES[storage_dtype])
+
+
+def encode(values: np.array, storage_dtype: str) -> np.array:
+    """
+    Convert values into their storage dtype. Integer dtypes round and saturate at their range,
+    bfloat16 rounds to the nearest value (ties to even).
+    :param values: array of values
+    :param storage_dtype: name of the storage dtype
+    :return: array of the NumPy dtype of the storage dtype
+    """
+    dtype = get_numpy_dtype(storage_dtype)
+    if storage_dtype == "bfloat16":
+        bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+        rounded = ((bits + 0x7FFF + ((bits >> 16) & 1)) >> 16).astype(np.uint16)
+        # keep NaN values NaN instead of rounding them to infinity
+        return np.where(np.isnan(bits.view(np.float32)), np.uint16(0x7FC0), rounded)
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return np.clip(np.rint(values), info.min, info.max).astype(dtype)
+    return np.asarray(values).astype(dtype)
+
+
+def decode(values: np.array, storage_dtype: str) -> np.array:
+    """
+    Convert stored values back into float32
+    :param values: array of the NumPy dtype of the storage dtype
+    :param storage_dtype: name of the storage dtype
+    :return: float32 array
+    """
+    if storage_dtype == "bfloat16":
+        return (np.asarray(values, dtype=np.uint16).astype(np.uint32) << 16).view(np.float32)
+    return np.asarray(values, dtype=np.float32)
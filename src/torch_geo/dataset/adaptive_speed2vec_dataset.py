@@ -4,16 +4,28 @@ import manager.data_manager as dat_man
 import numpy as np
 from utils.math_utils import z_score
 
+# dtypes the windows can be stored in by the "DATASET_DTYPE" setting
+DATASET_DTYPES = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+
 class adaptive_speed2vec_dataset(InMemoryDataset):
     data_manager: dat_man.data_manager
     creation_step: int
+    resolution: int
     
-    def __init__(self, data_manager: dat_man.data_manager, creation_step: int ,root='', transform=None, pre_transform=None):
+    def __init__(self, data_manager: dat_man.data_manager, creation_step: int ,root='', transform=None, pre_transform=None,
+                 resolution: int = 1):
+        """
+        :param resolution: number of intervals aggregated into one, 1 or one of the "aggregation_levels" of the store
+
+        The windows are stored as float32 unless "DATASET_DTYPE" is set to float16 or bfloat16,
+        they are converted to float32 per batch by the model.
+        """
         self.data_manager = data_manager
         self.creation_step = creation_step
+        self.resolution = resolution
         super().__init__(root, transform, pre_transform)
         print(self.processed_paths[0])
-        self.data, self.slices, self.n_node, self.mean, self.std_dev = torch.load(self.processed_paths[0])
+        self.data, self.slices, self.n_node, self.mean, self.std_dev = torch.load(self.processed_paths[0], weights_only=False)
     
     @property
     def raw_file_names(self):
@@ -21,6 +33,8 @@ class adaptive_speed2vec_dataset(InMemoryDataset):
     
     @property
     def processed_file_names(self):
+        if self.resolution != 1:
+            return ["test_data_" + str(self.resolution) + ".pt"]
         return ["test_data.pt"]
         
     def process(self):
@@ -32,31 +46,36 @@ class adaptive_speed2vec_dataset(InMemoryDataset):
         print(edge_index.shape)
         print(edge_index.dtype)
         
-        raw_features = self.data_manager.numpy.get_speed_node_features()
+        raw_features = self.data_manager.numpy.get_speed_node_features(self.resolution)
         # only create the dataset for graphs which have valid measurements (!=0)
         # this is done because if the dataset is created before the simmulation is finished
         # possibly a lot ov values will be 0 because they were initialized with 0 but 
         # their timestep was not processed yet
-        mean = np.mean(raw_features)
-        std_dev = np.std(raw_features)
-        raw_features = z_score(raw_features, np.mean(raw_features), np.std(raw_features))
-        W = self.data_manager.detector_graph.get_cost_adj_matrix()
-        b = self.data_manager.detector_graph.get_binary_adj_matrix()
-
+        if self.resolution == 1:
+            # statistics are collected by the store while the intervals arrive
+            mean, std_dev = self.data_manager.numpy.get_feature_statistics("speed")
+        else:
+            mean = float(np.mean(raw_features))
+            std_dev = float(np.std(raw_features))
+        dtype = settings.get("DATASET_DTYPE", "float32")
+        if dtype not in DATASET_DTYPES:
+            raise ValueError("Unknown DATASET_DTYPE " + str(dtype) + ", use one of " + str(list(DATASET_DTYPES)))
+        dtype = DATASET_DTYPES[dtype]
         _, n_node = raw_features.shape
-        edge_attr = torch.zeros((n_node ** 2, 1))
-        num_edges = 0
+        # costs of all edges in the order of the edge index
+        edge_attr = torch.from_numpy(self.data_manager.detector_graph.get_edge_costs()).float()[:, None]
 
         sequences = []
-        for i in range(n_node):
-            for j in range(n_node):
-                if b[i, j] != 0:
-                    edge_attr[num_edges] = W[i, j]
-                    num_edges += 1
-        edge_attr = edge_attr.resize_(num_edges, 1)
 
 
-        for i in range(self.creation_step - 40):
+        if self.resolution == 1:
+            num_windows = self.creation_step - 40
+        else:
+            # creation_step is given in base intervals, aggregated speeds are not smoothed by the
+            # moving average, so all complete windows can be used
+            num_windows = min(self.creation_step // self.resolution, raw_features.shape[0]) - \
+                          settings["N_HIST"] - settings["N_PRED"] + 1
+        for i in range(num_windows):
             g = Data()
             g.__num_nodes__ = n_node
 
@@ -65,9 +84,11 @@ class adaptive_speed2vec_dataset(InMemoryDataset):
 
             start = i
             end = start + settings["N_HIST"] + settings["N_PRED"]
-            full_window = np.swapaxes(raw_features[start:end, :], 0, 1)
-            g.x = torch.FloatTensor(full_window[:, 0:settings["N_HIST"]])
-            g.y = torch.FloatTensor(full_window[:, settings["N_HIST"]::])
+            # only the window is normalized instead of a normalized copy of all features
+            # features kept in a smaller storage dtype are normalized in single precision
+            full_window = np.swapaxes(z_score(raw_features[start:end, :].astype(np.float32), mean, std_dev), 0, 1)
+            g.x = torch.from_numpy(full_window[:, 0:settings["N_HIST"]]).to(dtype)
+            g.y = torch.from_numpy(full_window[:, settings["N_HIST"]::]).to(dtype)
 
             sequences += [g]
         
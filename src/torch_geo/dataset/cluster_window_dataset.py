@@ -0,0 +1,95 @@
+import torch
+from torch_geometric.data import Dataset, Data
+
+from generator.graph_partition import detector_cluster
+from torch_geo.dataset.speed_window_dataset import to_normalization_tensors
+
+
+class cluster_window_dataset(Dataset):
+    """
+    Dataset of sliding windows over the clusters of a partitioned detector graph (ClusterGCN-style).
+
+    Every sample contains one window of one cluster, so the memory of a training step is bounded by the
+    cluster size instead of the size of the network. Each sample carries a core_mask selecting the
+    core nodes of the cluster; the halo nodes only pass messages to them and are excluded from loss
+    and metrics. The node_ids of a sample are the torch IDs of its nodes in the full graph.
+
+    If normalize is set, the speed tensor contains raw speeds and each window is normalized when it is accessed,
+    with per node statistics every sample carries the node_mean and node_std of its nodes.
+    As for speed_window_dataset the speed tensor can be kept in a smaller storage dtype.
+
+    Samples are ordered by window first, so slicing the dataset keeps the chronological order.
+    Only models whose layers do not depend on the number of nodes (ST_GAT_SHARED) can be trained on clusters.
+    """
+    speeds: torch.Tensor = None
+    clusters: list[detector_cluster] = None
+    n_hist: int = 0
+    n_pred: int = 0
+
+    mean = 0.0
+    std_dev = 1.0
+    normalize: bool = False
+
+    def __init__(self, speeds: torch.Tensor, clusters: list[detector_cluster], n_hist: int, n_pred: int,
+                 mean=0.0, std_dev=1.0, edge_attr: torch.Tensor = None, transform=None,
+                 normalize: bool = False) -> None:
+        """
+        Initialize dataset
+        :param speeds: normalized (or raw if normalize is set) speed tensor of shape (num_intervals, num_nodes),
+        float32 or a smaller storage dtype
+        :param clusters: clusters of the detector graph, created by generator.graph_partition.build_clusters
+        :param n_hist: number of preceding steps of each window
+        :param n_pred: number of prediction steps of each window
+        :param mean: mean used for normalizing the speeds, float or per node array of size (num_nodes)
+        :param std_dev: standard deviation used for normalizing the speeds, float or per node array of size (num_nodes)
+        :param edge_attr: optional edge attributes of the full detector graph, aligned with its edge index
+        :param transform: optional transform applied to each window
+        :param normalize: normalize each window when it is accessed
+        """
+        self.speeds = speeds
+        self.clusters = clusters
+        self.n_hist = n_hist
+        self.n_pred = n_pred
+        self.mean, self.std_dev = to_normalization_tensors(mean, std_dev)
+        self.normalize = normalize
+
+        # tensors of every cluster are created once and shared by all of its windows
+        self._nodes = [torch.from_numpy(cluster.nodes).long() for cluster in clusters]
+        self._edge_index = [torch.from_numpy(cluster.edge_index).long() for cluster in clusters]
+        self._core_mask = [torch.from_numpy(cluster.get_core_mask()) for cluster in clusters]
+        self._edge_attr = None
+        if edge_attr is not None:
+            self._edge_attr = [edge_attr[torch.from_numpy(cluster.edge_ids).long()] for cluster in clusters]
+        super().__init__(None, transform)
+
+    def num_windows(self) -> int:
+        """ Get number of windows of each cluster"""
+        return max(self.speeds.shape[0] - self.n_hist - self.n_pred + 1, 0)
+
+    def len(self) -> int:
+        """ Get number of samples, the number of windows times the number of clusters"""
+        return self.num_windows() * len(self.clusters)
+
+    def get(self, idx: int) -> Data:
+        """ Create the sample of one window of one cluster
+        :param idx: index of the sample
+        :return: graph containing the window of the cluster
+        """
+        window_idx, cluster_idx = divmod(idx, len(self.clusters))
+        nodes = self._nodes[cluster_idx]
+        # (n_hist + n_pred, num_cluster_nodes) -> (num_cluster_nodes, n_hist + n_pred)
+        window = self.speeds[window_idx:window_idx + self.n_hist + self.n_pred, nodes]
+        per_node = isinstance(self.mean, torch.Tensor)
+        mean = self.mean[nodes] if per_node else self.mean
+        std_dev = self.std_dev[nodes] if per_node else self.std_dev
+        if self.normalize:
+            window = (window.float() - mean) / std_dev
+        window = window.T
+        graph = Data(x=window[:, :self.n_hist], y=window[:, self.n_hist:], edge_index=self._edge_index[cluster_idx],
+                     core_mask=self._core_mask[cluster_idx], node_ids=nodes)
+        if per_node:
+            graph.node_mean = mean
+            graph.node_std = std_dev
+        if self._edge_attr is not None:
+            graph.edge_attr = self._edge_attr[cluster_idx]
+        return graph
@@ -0,0 +1,107 @@
+import numpy as np
+import torch
+from torch_geometric.data import Dataset, Data
+
+
+def to_normalization_tensors(mean, std_dev) -> tuple:
+    """
+    Convert per node statistics (e.g. data_manager.numpy.get_feature_statistics(per_node=True)) to tensors.
+    Nodes without variance get a standard deviation of 1, so their values are only shifted.
+    Global statistics are returned as floats.
+    :param mean: mean as float or array of size (num_nodes)
+    :param std_dev: standard deviation as float or array of size (num_nodes)
+    :return: tuple of <mean, standard deviation>
+    """
+    if np.ndim(mean) == 0 and np.ndim(std_dev) == 0:
+        return float(mean), float(std_dev)
+    mean = torch.as_tensor(mean, dtype=torch.float32)
+    std_dev = torch.as_tensor(std_dev, dtype=torch.float32)
+    return mean, torch.where(std_dev > 0, std_dev, torch.ones_like(std_dev))
+
+
+def to_storage_tensor(values: np.array, storage_dtype: str = "float32") -> torch.Tensor:
+    """
+    Convert node features in their storage dtype (e.g. data_manager.numpy.get_features("speed", raw=True))
+    into a tensor of the same size, so they are only converted to float32 per batch.
+    bfloat16 features, stored as uint16 by the store, become a torch.bfloat16 tensor.
+    :param values: array of size (num_intervals, num_nodes)
+    :param storage_dtype: storage dtype of the features, see data_manager.numpy.get_storage_dtypes()
+    :return: tensor sharing the memory of the array if it is contiguous
+    """
+    values = np.ascontiguousarray(values)
+    if storage_dtype == "bfloat16":
+        return torch.from_numpy(values.view(np.int16)).view(torch.bfloat16)
+    return torch.from_numpy(values)
+
+
+class speed_window_dataset(Dataset):
+    """
+    Dataset of sliding windows over a speed tensor of shape (num_intervals, num_nodes).
+
+    In contrast to adaptive_speed2vec_dataset the windows are not materialized,
+    each window is created from a view of the speed tensor when it is accessed.
+    This allows the speed tensor to be shared between processes without copying it.
+
+    If normalize is set, the speed tensor contains raw speeds and each window is normalized when it is
+    accessed, e.g. using the statistics collected by the store (data_manager.numpy.get_feature_statistics()).
+    With per node statistics every window carries the node_mean and node_std of its nodes.
+
+    The speed tensor can be kept in a smaller storage dtype (see to_storage_tensor), windows are converted
+    to float32 when they are normalized and otherwise by the model once the batch is on the device.
+    """
+    speeds: torch.Tensor = None
+    edge_index: torch.Tensor = None
+    edge_attr: torch.Tensor = None
+    n_hist: int = 0
+    n_pred: int = 0
+
+    mean = 0.0
+    std_dev = 1.0
+    normalize: bool = False
+
+    def __init__(self, speeds: torch.Tensor, edge_index: torch.Tensor, n_hist: int, n_pred: int,
+                 mean=0.0, std_dev=1.0, edge_attr: torch.Tensor = None, transform=None,
+                 normalize: bool = False) -> None:
+        """
+        Initialize dataset
+        :param speeds: normalized (or raw if normalize is set) speed tensor of shape (num_intervals, num_nodes),
+        float32 or a smaller storage dtype
+        :param edge_index: edge index of the detector graph
+        :param n_hist: number of preceding steps of each window
+        :param n_pred: number of prediction steps of each window
+        :param mean: mean used for normalizing the speeds, float or per node array of size (num_nodes)
+        :param std_dev: standard deviation used for normalizing the speeds, float or per node array of size (num_nodes)
+        :param edge_attr: optional edge attributes of the detector graph
+        :param transform: optional transform applied to each window
+        :param normalize: normalize each window when it is accessed
+        """
+        self.speeds = speeds
+        self.edge_index = edge_index
+        self.edge_attr = edge_attr
+        self.n_hist = n_hist
+        self.n_pred = n_pred
+        self.mean, self.std_dev = to_normalization_tensors(mean, std_dev)
+        self.normalize = normalize
+        super().__init__(None, transform)
+
+    def len(self) -> int:
+        """ Get number of windows"""
+        return max(self.speeds.shape[0] - self.n_hist - self.n_pred + 1, 0)
+
+    def get(self, idx: int) -> Data:
+        """ Create the window starting at interval idx
+        :param idx: index of the window
+        :return: graph containing the window
+        """
+        # (n_hist + n_pred, num_nodes) -> (num_nodes, n_hist + n_pred)
+        window = self.speeds[idx:idx + self.n_hist + self.n_pred]
+        if self.normalize:
+            window = (window.float() - self.mean) / self.std_dev
+        window = window.T
+        graph = Data(x=window[:, :self.n_hist], y=window[:, self.n_hist:], edge_index=self.edge_index)
+        if isinstance(self.mean, torch.Tensor):
+            graph.node_mean = self.mean
+            graph.node_std = self.std_dev
+        if self.edge_attr is not None:
+            graph.edge_attr = self.edge_attr
+        return graph
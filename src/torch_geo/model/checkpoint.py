@@ -0,0 +1,171 @@
+import glob
+import os
+import random
+
+import numpy as np
+import torch
+
+
+def _capture_rng_state() -> dict:
+    """ Capture the state of all random number generators used during training
+    :return: dictionary containing the RNG states
+    """
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def _restore_rng_state(state: dict):
+    """ Restore the state of all random number generators
+    :param state: dictionary created by _capture_rng_state
+    """
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def save_checkpoint(path: str, model, optimizer, epoch: int, loss=None, extra: dict = None):
+    """
+    Save model, optimizer, epoch and RNG state to a checkpoint file.
+    The file is written to a temporary path first and then moved, so a crash
+    while saving never leaves a corrupted checkpoint behind.
+    :param path: path of the checkpoint
+    :param model: model to save
+    :param optimizer: optimizer to save
+    :param epoch: last completed epoch
+    :param loss: last training loss
+    :param extra: additional entries to store in the checkpoint
+    """
+    checkpoint = {
+        "epoch": epoch,
+        "model_state_dict": model.state_dict(),
+        "optimizer_state_dict": optimizer.state_dict(),
+        "loss": loss,
+        "rng_state": _capture_rng_state(),
+    }
+    if extra is not None:
+        checkpoint.update(extra)
+
+    tmp_path = path + ".tmp"
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _get_checkpoint_paths(checkpoint_dir: str, prefix: str) -> list[str]:
+    """ Get the periodic checkpoints of a directory ordered by the epoch in their file name
+    (checkpoint_{epoch:05d}.pt), modification times are not used since copying a directory changes them
+    :param checkpoint_dir: directory containing the checkpoints
+    :param prefix: file name prefix of the periodic checkpoints
+    :return: paths of the checkpoints, oldest epoch first
+    """
+    checkpoints = []
+    for path in glob.glob(os.path.join(checkpoint_dir, prefix + "*.pt")):
+        epoch = os.path.basename(path)[len(prefix):-len(".pt")]
+        if epoch.isdigit():
+            checkpoints.append((int(epoch), path))
+    return [path for _, path in sorted(checkpoints)]
+
+
+def find_latest_checkpoint(checkpoint_dir: str, prefix: str = "checkpoint_") -> str:
+    """ Find the periodic checkpoint of the latest epoch in a directory
+    :param checkpoint_dir: directory containing the checkpoints
+    :param prefix: file name prefix of the periodic checkpoints
+    :return: path of the newest checkpoint or None if there is none
+    """
+    paths = _get_checkpoint_paths(checkpoint_dir, prefix)
+    if len(paths) == 0:
+        return None
+    return paths[-1]
+
+
+def load_checkpoint(path: str, model, optimizer=None, map_location='cpu') -> dict:
+    """
+    Restore model, optimizer and RNG state from a checkpoint
+    :param path: path of the checkpoint
+    :param model: model to load the weights into
+    :param optimizer: optimizer to load the state into (optional)
+    :param map_location: device to map the stored tensors to
+    :return: the loaded checkpoint dictionary
+    """
+    checkpoint = torch.load(path, map_location=map_location, weights_only=False)
+    model.load_state_dict(checkpoint["model_state_dict"])
+    if optimizer is not None:
+        optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
+    if "rng_state" in checkpoint:
+        _restore_rng_state(checkpoint["rng_state"])
+    return checkpoint
+
+
+def prune_checkpoints(checkpoint_dir: str, keep: int, prefix: str = "checkpoint_"):
+    """ Delete all but the periodic checkpoints of the latest epochs
+    :param checkpoint_dir: directory containing the checkpoints
+    :param keep: number of checkpoints to keep
+    :param prefix: file name prefix of the periodic checkpoints
+    """
+    paths = _get_checkpoint_paths(checkpoint_dir, prefix)
+    for path in paths[:max(len(paths) - keep, 0)]:
+        os.remove(path)
+
+
+class early_stopping:
+    """
+    Class that tracks a validation metric and decides when training should stop
+    because the model stopped improving. Patience is counted in validation rounds, not epochs,
+    so it does not depend on how often the model is validated.
+    """
+    patience: int = 0
+    min_delta: float = 0.0
+
+    best_value: float = float("inf")
+    best_epoch: int = -1
+    rounds_without_improvement: int = 0
+
+    def __init__(self, patience: int, min_delta: float = 0.0) -> None:
+        """
+        Initialize early stopping
+        :param patience: number of validation rounds without improvement after which training stops
+        :param min_delta: minimum decrease of the metric that counts as improvement
+        """
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_value = float("inf")
+        self.best_epoch = -1
+        self.rounds_without_improvement = 0
+
+    def step(self, value: float, epoch: int) -> bool:
+        """ Register a new validation value
+        :param value: validation metric, lower is better
+        :param epoch: epoch the value was measured in
+        :return: true if the value is a new best value
+        """
+        if value < self.best_value - self.min_delta:
+            self.best_value = value
+            self.best_epoch = epoch
+            self.rounds_without_improvement = 0
+            return True
+        self.rounds_without_improvement += 1
+        return False
+
+    def should_stop(self) -> bool:
+        """ Check if training should be stopped, this has to be called after step
+        :return: true if there was no improvement within the last "patience" validation rounds
+        """
+        return self.best_epoch >= 0 and self.rounds_without_improvement >= self.patience
+
+    def state_dict(self) -> dict:
+        """ Get state of early stopping for checkpointing"""
+        return {"best_value": self.best_value, "best_epoch": self.best_epoch,
+                "rounds_without_improvement": self.rounds_without_improvement}
+
+    def load_state_dict(self, state: dict):
+        """ Restore state of early stopping from a checkpoint"""
+        self.best_value = state["best_value"]
+        self.best_epoch = state["best_epoch"]
+        self.rounds_without_improvement = state.get("rounds_without_improvement", 0)
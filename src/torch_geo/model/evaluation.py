@@ -0,0 +1,167 @@
+import torch
+from torch_geometric.loader import DataLoader
+
+from utils.math_utils import un_z_score
+
+
+class horizon_metrics:
+    """
+    Class that accumulates MAE, RMSE and MAPE as running sums for every prediction horizon.
+
+    Only a handful of sums per horizon are kept, so the memory used does not grow
+    with the size of the evaluated dataset.
+    """
+    _abs_error: torch.Tensor = None
+    _squared_error: torch.Tensor = None
+    _percentage_error: torch.Tensor = None
+    _count: torch.Tensor = None
+
+    def __init__(self, n_pred: int, device='cpu') -> None:
+        """
+        Initialize all running sums with zeroes
+        :param n_pred: number of prediction horizons
+        :param device: device on which the sums are kept
+        """
+        self._abs_error = torch.zeros(n_pred, dtype=torch.float64, device=device)
+        self._squared_error = torch.zeros(n_pred, dtype=torch.float64, device=device)
+        self._percentage_error = torch.zeros(n_pred, dtype=torch.float64, device=device)
+        self._count = torch.zeros(n_pred, dtype=torch.float64, device=device)
+
+    def update(self, truth: torch.Tensor, pred: torch.Tensor, mask: torch.Tensor = None):
+        """
+        Add the errors of one batch to the running sums
+        :param truth: ground truth of shape (num_nodes, n_pred)
+        :param pred: prediction of shape (num_nodes, n_pred)
+        :param mask: optional boolean mask of shape (num_nodes,) selecting the rows to evaluate
+        """
+        if mask is not None:
+            truth = truth[mask]
+            pred = pred[mask]
+        error = (pred - truth).double()
+        self._abs_error += torch.sum(torch.abs(error), dim=0)
+        self._squared_error += torch.sum(error ** 2, dim=0)
+        # same definition as utils.math_utils.MAPE
+        self._percentage_error += torch.sum(torch.abs(error) / (truth.double() + 1e-15) * 100, dim=0)
+        self._count += truth.shape[0]
+
+    def mae(self, per_horizon: bool = False):
+        """ Get mean absolute error
+        :param per_horizon: return one value per prediction horizon instead of a single value
+        :return: MAE
+        """
+        if per_horizon:
+            return (self._abs_error / self._count).cpu()
+        return (self._abs_error.sum() / self._count.sum()).item()
+
+    def rmse(self, per_horizon: bool = False):
+        """ Get root mean squared error
+        :param per_horizon: return one value per prediction horizon instead of a single value
+        :return: RMSE
+        """
+        if per_horizon:
+            return torch.sqrt(self._squared_error / self._count).cpu()
+        return torch.sqrt(self._squared_error.sum() / self._count.sum()).item()
+
+    def mape(self, per_horizon: bool = False):
+        """ Get mean absolute percentage error
+        :param per_horizon: return one value per prediction horizon instead of a single value
+        :return: MAPE
+        """
+        if per_horizon:
+            return (self._percentage_error / self._count).cpu()
+        return (self._percentage_error.sum() / self._count.sum()).item()
+
+    def summary(self) -> dict:
+        """ Get all metrics, overall and per horizon, as a dictionary
+        :return: dictionary with metric names as keys
+        """
+        return {
+            "MAE": self.mae(),
+            "RMSE": self.rmse(),
+            "MAPE": self.mape(),
+            "MAE_per_horizon": self.mae(True).tolist(),
+            "RMSE_per_horizon": self.rmse(True).tolist(),
+            "MAPE_per_horizon": self.mape(True).tolist(),
+        }
+
+
+@torch.no_grad()
+def evaluate(model, device, dataloader, keep_predictions: bool = False, type: str = ''):
+    """
+    Evaluate a model on a data loader while streaming the metrics.
+    Predictions are only kept if explicitly requested.
+    :param model: model to evaluate
+    :param device: device to evaluate on
+    :param dataloader: data loader
+    :param keep_predictions: if true, un-normalized predictions and truths are returned
+    :param type: name of evaluation type, e.g. Train/Val/Test
+    :return: tuple of <horizon_metrics, predictions, truths>, predictions and truths
+    are tensors of shape (num_samples * num_nodes, n_pred) or None, for cluster samples only the core nodes
+    :raises ValueError: if the loader is empty
+    """
+    model.eval()
+    model.to(device)
+    mean = dataloader.dataset.mean
+    std_dev = dataloader.dataset.std_dev
+
+    metrics = None
+    y_pred = []
+    y_truth = []
+    for batch in dataloader:
+        batch = batch.to(device)
+        if batch.x.shape[0] == 1:
+            continue
+        pred = model(batch, device)
+        # targets may be kept in a smaller storage dtype
+        truth = batch.y.view(pred.shape).to(pred.dtype)
+        if metrics is None:
+            metrics = horizon_metrics(pred.shape[1], device)
+
+        # windows normalized with per node statistics carry the statistics of their nodes
+        if getattr(batch, "node_mean", None) is not None:
+            truth = un_z_score(truth, batch.node_mean[:, None], batch.node_std[:, None])
+            pred = un_z_score(pred, batch.node_mean[:, None], batch.node_std[:, None])
+        else:
+            truth = un_z_score(truth, mean, std_dev)
+            pred = un_z_score(pred, mean, std_dev)
+        # samples of a cluster_window_dataset are only evaluated on their core nodes
+        core_mask = getattr(batch, "core_mask", None)
+        metrics.update(truth, pred, mask=core_mask)
+
+        if keep_predictions:
+            if core_mask is not None:
+                pred = pred[core_mask]
+                truth = truth[core_mask]
+            y_pred.append(pred.cpu())
+            y_truth.append(truth.cpu())
+
+    # batches with a single node are skipped, so no metrics exist if the loader contained only those
+    if metrics is None:
+        raise ValueError("Can not evaluate on an empty loader (" + (type or "no type") +
+                         "), it contains no batch with more than one node")
+
+    print(f'{type}, MAE: {metrics.mae()}, RMSE: {metrics.rmse()}, MAPE: {metrics.mape()}')
+
+    if keep_predictions:
+        return metrics, torch.cat(y_pred), torch.cat(y_truth)
+    return metrics, None, None
+
+
+def subsample_loader(dataloader, num_samples: int, seed: int = 0) -> DataLoader:
+    """
+    Create a data loader over a fixed random subsample of the dataset of another loader.
+    The subsample is drawn once, so evaluations over several epochs stay comparable.
+    :param dataloader: data loader to draw the subsample from
+    :param num_samples: number of samples in the subsample
+    :param seed: seed of the random subsample
+    :return: data loader over the subsample, or the original loader if
+    the dataset is not larger than num_samples
+    """
+    dataset = dataloader.dataset
+    if num_samples is None or num_samples >= len(dataset):
+        return dataloader
+
+    generator = torch.Generator().manual_seed(seed)
+    indices = torch.randperm(len(dataset), generator=generator)[:num_samples]
+    indices, _ = torch.sort(indices)
+    return DataLoader(dataset[indices], batch_size=dataloader.batch_size, shuffle=False)
@@ -0,0 +1,139 @@
+import os
+import time
+
+import numpy as np
+import torch
+
+from torch_geo.model.trainer import load_from_checkpoint
+from utils.math_utils import MAE, RMSE, un_z_score
+
+
+class _tensor_model(torch.nn.Module):
+    """
+    Wrapper exposing the forward pass of a model on plain tensors, as required by TorchScript
+    """
+
+    def __init__(self, model) -> None:
+        """
+        Initialize the wrapper
+        :param model: model implementing predict(x, edge_index)
+        """
+        super().__init__()
+        self.model = model
+
+    def forward(self, x, edge_index):
+        """
+        Forward pass of the wrapped model
+        :param x: node features of shape (batch_size * n_nodes, N_HIST)
+        :param edge_index: edge index of the batch
+        :return: predictions of shape (batch_size * n_nodes, N_PRED)
+        """
+        return self.model.predict(x, edge_index)
+
+
+def quantize(model):
+    """
+    Apply dynamic int8 quantization to the LSTM and linear layers of a model.
+    Weights are stored as int8, activations are quantized on the fly.
+    :param model: model to quantize
+    :return: quantized copy of the model
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_torchscript(checkpoint_path: str, config: dict, output_path: str, example_batch,
+                       int8: bool = False) -> torch.jit.ScriptModule:
+    """
+    Export a checkpoint created by model_train to a TorchScript artifact for CPU serving.
+    The artifact is called with (x, edge_index) and returns the normalized predictions.
+    :param checkpoint_path: path of the checkpoint
+    :param config: settings object used to create the model
+    :param output_path: path of the TorchScript artifact
+    :param example_batch: batch used for tracing, e.g. the first batch of the test loader
+    :param int8: apply dynamic int8 quantization to the LSTM and linear layers
+    :return: the exported TorchScript module
+    """
+    model = load_from_checkpoint(checkpoint_path, config, map_location='cpu')
+    model.eval()
+    if int8:
+        model = quantize(model)
+
+    example_batch = example_batch.to('cpu')
+    example_inputs = (example_batch.x.float(), example_batch.edge_index)
+    with torch.no_grad():
+        exported = torch.jit.trace(_tensor_model(model).eval(), example_inputs, check_trace=False)
+    exported = torch.jit.freeze(exported)
+    torch.jit.save(exported, output_path)
+    print("[Export] - Saved", "int8" if int8 else "float32", "TorchScript model to", output_path)
+    return exported
+
+
+@torch.no_grad()
+def _measure(predict, dataloader, mean, std_dev, warmup: int = 2) -> dict:
+    """
+    Measure latency and accuracy of a prediction function on a data loader
+    :param predict: function taking a batch and returning normalized predictions
+    :param dataloader: data loader
+    :param mean: mean used for normalization
+    :param std_dev: standard deviation used for normalization
+    :param warmup: number of batches predicted before measuring latency
+    :return: dictionary containing latency, MAE and RMSE as well as the predictions
+    """
+    for i, batch in enumerate(dataloader):
+        if i >= warmup:
+            break
+        predict(batch)
+
+    latencies = []
+    y_pred = []
+    y_truth = []
+    for batch in dataloader:
+        start = time.perf_counter()
+        pred = predict(batch)
+        latencies.append(time.perf_counter() - start)
+        y_pred.append(un_z_score(pred, mean, std_dev))
+        y_truth.append(un_z_score(batch.y.view(pred.shape), mean, std_dev))
+
+    y_pred = torch.cat(y_pred)
+    y_truth = torch.cat(y_truth)
+    latencies = np.array(latencies) * 1000
+    return {
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p99_ms": float(np.percentile(latencies, 99)),
+        "MAE": MAE(y_truth, y_pred).item(),
+        "RMSE": RMSE(y_truth, y_pred).item(),
+        "predictions": y_pred,
+    }
+
+
+def compare_exported(eager_model, exported_model, test_dataloader, exported_path: str = None) -> dict:
+    """
+    Compare latency and accuracy of an exported model with the eager model on the same test loader
+    and print a side-by-side report
+    :param eager_model: eager model
+    :param exported_model: exported TorchScript model
+    :param test_dataloader: data loader of test dataset
+    :param exported_path: path of the exported artifact, used to report its size
+    :return: dictionary containing the results of both models
+    """
+    eager_model.eval()
+    eager_model.to('cpu')
+    mean = test_dataloader.dataset.mean
+    std_dev = test_dataloader.dataset.std_dev
+
+    eager = _measure(lambda batch: eager_model(batch, 'cpu'), test_dataloader, mean, std_dev)
+    exported = _measure(lambda batch: exported_model(batch.x.float(), batch.edge_index),
+                        test_dataloader, mean, std_dev)
+    max_diff = torch.max(torch.abs(eager.pop("predictions") - exported.pop("predictions"))).item()
+
+    eager["size_mb"] = sum(p.numel() * p.element_size() for p in eager_model.parameters()) / 1e6
+    if exported_path is not None:
+        exported["size_mb"] = os.path.getsize(exported_path) / 1e6
+
+    print(f"{'':<10}{'p50 [ms]':>10}{'p99 [ms]':>10}{'MAE':>10}{'RMSE':>10}{'size [MB]':>11}")
+    for name, result in (("eager", eager), ("exported", exported)):
+        print(f"{name:<10}{result['latency_p50_ms']:>10.2f}{result['latency_p99_ms']:>10.2f}"
+              f"{result['MAE']:>10.4f}{result['RMSE']:>10.4f}{result.get('size_mb', float('nan')):>11.2f}")
+    print("max absolute difference of predictions:", max_diff)
+
+    return {"eager": eager, "exported": exported, "max_abs_diff": max_diff}
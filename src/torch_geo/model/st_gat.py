@@ -56,21 +56,24 @@ class ST_GAT(torch.nn.Module):
         :param device Device to operate on
         """
         x, edge_index = data.x, data.edge_index
-        # apply dropout
-        if device == 'cpu':
-            x = torch.FloatTensor(x)
-        else:
-            x = torch.cuda.FloatTensor(x)
+        # batches are already on the target device, inputs kept in a storage dtype are converted here
+        if x.dtype != torch.float32:
+            x = x.float()
+        return self.predict(x, edge_index)
 
+    def predict(self, x, edge_index):
+        """
+        Forward pass of the ST-GAT model on plain tensors, this is used for exporting the model
+        :param x Node features of shape [batch_size*n_nodes, seq_length]
+        :param edge_index Edge index of the batch
+        """
         # gat layer: output of gat: [11400, 12]
         x = self.gat(x, edge_index)
         x = F.dropout(x, self.dropout, training=self.training)
 
         # RNN: 2 LSTM
         # [batchsize*n_nodes, seq_length] -> [batch_size, n_nodes, seq_length]
-        batch_size = data.num_graphs
-        n_node = int(data.num_nodes / batch_size)
-        x = torch.reshape(x, (batch_size, n_node, data.num_features))
+        x = torch.reshape(x, (-1, self.n_nodes, x.shape[1]))
         # for lstm: x should be (seq_length, batch_size, n_nodes)
         # sequence length = 12, batch_size = 50, n_node = 228
         x = torch.movedim(x, 2, 0)
@@ -80,16 +83,11 @@ class ST_GAT(torch.nn.Module):
         x, _ = self.lstm2(x)
         # Output contains h_t for each timestep, only the last one has all input's accounted for
         # [12, 50, 128] -> [50, 128]
-        x = torch.squeeze(x[-1, :, :])
+        x = x[-1, :, :]
         # [50, 128] -> [50, 228*9]
         x = self.linear(x)
 
         # Now reshape into final output
-        if x.dim() == 1:
-            x = x[None, :]
-        s = x.shape
-        # [50, 228*9] -> [50, 228, 9]
-        x = torch.reshape(x, (s[0], self.n_nodes, self.n_pred))
-        # [50, 228, 9] ->  [11400, 9]
-        x = torch.reshape(x, (s[0] * self.n_nodes, self.n_pred))
+        # [50, 228*9] -> [50, 228, 9] ->  [11400, 9]
+        x = torch.reshape(x, (-1, self.n_pred))
         return x
@@ -0,0 +1,80 @@
+import torch
+import torch.nn.functional as F
+from torch_geometric.nn import GATConv
+
+
+class ST_GAT_Shared(torch.nn.Module):
+    """
+    Variant of the Spatio-Temporal Graph Attention Network whose temporal model runs on every node
+    separately with weights shared between all nodes.
+
+    In contrast to ST_GAT no layer depends on the number of nodes, so parameter count stays constant,
+    compute scales linearly with the number of nodes and a trained model can be used on graphs of any size.
+    """
+
+    def __init__(self, in_channels, out_channels, n_nodes=None, heads=8, dropout=0.0,
+                 lstm1_hidden_size=32, lstm2_hidden_size=64):
+        """
+        Initialize the node-shared ST-GAT model
+        :param in_channels Number of input channels
+        :param out_channels Number of output channels
+        :param n_nodes Unused, only accepted for compatibility with ST_GAT
+        :param heads Number of attention heads to use in graph
+        :param dropout Dropout probability on output of Graph Attention Network
+        :param lstm1_hidden_size Hidden size of the first LSTM layer
+        :param lstm2_hidden_size Hidden size of the second LSTM layer
+        """
+        super(ST_GAT_Shared, self).__init__()
+        self.n_pred = out_channels
+        self.heads = heads
+        self.dropout = dropout
+
+        # single graph attentional layer with 8 attention heads
+        self.gat = GATConv(in_channels=in_channels, out_channels=in_channels,
+                           heads=heads, dropout=0, concat=False)
+
+        # two LSTM layers working on the sequence of a single node
+        self.lstm1 = torch.nn.LSTM(input_size=1, hidden_size=lstm1_hidden_size, num_layers=1)
+        self.lstm2 = torch.nn.LSTM(input_size=lstm1_hidden_size, hidden_size=lstm2_hidden_size, num_layers=1)
+        for lstm in (self.lstm1, self.lstm2):
+            for name, param in lstm.named_parameters():
+                if 'bias' in name:
+                    torch.nn.init.constant_(param, 0.0)
+                elif 'weight' in name:
+                    torch.nn.init.xavier_uniform_(param)
+
+        # fully-connected layer shared between all nodes
+        self.linear = torch.nn.Linear(lstm2_hidden_size, self.n_pred)
+        torch.nn.init.xavier_uniform_(self.linear.weight)
+
+    def forward(self, data, device):
+        """
+        Forward pass of the node-shared ST-GAT model
+        :param data Data to make a pass on
+        :param device Device to operate on
+        """
+        x, edge_index = data.x, data.edge_index
+        if x.dtype != torch.float32:
+            x = x.float()
+        return self.predict(x, edge_index)
+
+    def predict(self, x, edge_index):
+        """
+        Forward pass of the node-shared ST-GAT model on plain tensors, this is used for exporting the model
+        :param x Node features of shape [batch_size*n_nodes, seq_length]
+        :param edge_index Edge index of the batch
+        """
+        # gat layer: [batch_size*n_nodes, seq_length] -> [batch_size*n_nodes, seq_length]
+        x = self.gat(x, edge_index)
+        x = F.dropout(x, self.dropout, training=self.training)
+
+        # every node is one sequence of the LSTM batch
+        # [batch_size*n_nodes, seq_length] -> [seq_length, batch_size*n_nodes, 1]
+        x = torch.movedim(x, 1, 0).unsqueeze(-1)
+        # [seq_length, batch_size*n_nodes, 1] -> [seq_length, batch_size*n_nodes, 32]
+        x, _ = self.lstm1(x)
+        # [seq_length, batch_size*n_nodes, 32] -> [seq_length, batch_size*n_nodes, 64]
+        x, _ = self.lstm2(x)
+        # only the last timestep has all inputs accounted for
+        # [seq_length, batch_size*n_nodes, 64] -> [batch_size*n_nodes, n_pred]
+        return self.linear(x[-1])
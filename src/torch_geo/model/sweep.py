@@ -0,0 +1,130 @@
+import csv
+import itertools
+import os
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from torch_geometric.loader import DataLoader
+
+from torch_geo.dataset.speed_window_dataset import speed_window_dataset
+from torch_geo.model.evaluation import evaluate
+from torch_geo.model.trainer import model_train
+from utils.math_utils import z_score
+
+# shared tensors of the worker process, set once by _init_worker
+_worker_state: dict = {}
+
+
+def grid(**params) -> list[dict]:
+    """
+    Create all combinations of the passed hyperparameter values
+    e.g. grid(INITIAL_LR=[1e-3, 3e-4], N_HIST=[8, 12]) creates 4 configurations
+    :param params: lists of values for each setting
+    :return: list of configurations
+    """
+    keys = list(params.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*params.values())]
+
+
+def _init_worker(speeds: torch.Tensor, edge_index: torch.Tensor, mean: float, std_dev: float, threads: int):
+    """ Store the shared tensors in the worker process and limit its threads
+    :param speeds: normalized speed tensor in shared memory
+    :param edge_index: edge index in shared memory
+    :param mean: mean used for normalization
+    :param std_dev: standard deviation used for normalization
+    :param threads: number of threads the worker may use
+    """
+    torch.set_num_threads(threads)
+    _worker_state["speeds"] = speeds
+    _worker_state["edge_index"] = edge_index
+    _worker_state["mean"] = mean
+    _worker_state["std_dev"] = std_dev
+    _worker_state["threads"] = threads
+
+
+def _run_config(run: tuple[int, dict, dict]) -> dict:
+    """ Train and evaluate one configuration inside a worker process
+    :param run: tuple of <run id, base settings, overrides of this run>
+    :return: row of the result table
+    """
+    run_id, base_config, overrides = run
+    config = dict(base_config, **overrides)
+    config['NUM_THREADS'] = _worker_state["threads"]
+    config['CHECKPOINT_DIR'] = os.path.join(base_config['CHECKPOINT_DIR'], f"sweep_{run_id:03d}")
+
+    speeds = _worker_state["speeds"]
+    config['N_NODE'] = speeds.shape[1]
+    dataset = speed_window_dataset(speeds, _worker_state["edge_index"], config['N_HIST'], config['N_PRED'],
+                                   _worker_state["mean"], _worker_state["std_dev"])
+    # split chronologically so validation windows lie after all training windows
+    train_threshold = int(len(dataset) * config.get('TRAIN_SPLIT', 0.9))
+    train_loader = DataLoader(dataset[:train_threshold], shuffle=True, batch_size=config['BATCH_SIZE'])
+    val_loader = DataLoader(dataset[train_threshold:], shuffle=False, batch_size=config['BATCH_SIZE'])
+
+    start = time.perf_counter()
+    model = model_train(train_loader, val_loader, config, 'cpu')
+    train_time = time.perf_counter() - start
+    metrics, _, _ = evaluate(model, 'cpu', val_loader, type=f'Sweep {run_id}')
+
+    return dict(run=run_id, **overrides, MAE=metrics.mae(), RMSE=metrics.rmse(), MAPE=metrics.mape(),
+                train_time=train_time)
+
+
+def run_sweep(speeds: np.array, edge_index: np.array, base_config: dict, configs: list[dict],
+              num_workers: int, threads_per_worker: int = 1, output_csv: str = None) -> list[dict]:
+    """
+    Train several ST-GAT configurations in parallel worker processes.
+
+    The speed data is normalized and put into shared memory once, all workers create their
+    windows from the same shared tensor instead of reloading or rebuilding the dataset.
+    :param speeds: raw speed array of shape (num_intervals, num_nodes),
+    e.g. data_manager.numpy.get_speed_node_features()
+    :param edge_index: edge index of the detector graph, e.g. data_manager.numpy.get_edge_index()
+    :param base_config: settings shared by all configurations
+    :param configs: list of settings overriding the base settings, e.g. created by grid()
+    :param num_workers: number of worker processes
+    :param threads_per_worker: number of torch threads each worker may use
+    :param output_csv: optional path of a CSV file the result table is written to
+    :return: result table as list of rows
+    """
+    mean = float(np.mean(speeds))
+    std_dev = float(np.std(speeds))
+    shared_speeds = torch.from_numpy(z_score(np.asarray(speeds, dtype=np.float32), mean, std_dev)).share_memory_()
+    shared_edge_index = torch.from_numpy(np.asarray(edge_index)).long().share_memory_()
+    print("[Sweep] - Shared speed tensor", tuple(shared_speeds.shape), "with", num_workers, "workers and",
+          threads_per_worker, "threads each")
+
+    context = mp.get_context("spawn")
+    with context.Pool(num_workers, initializer=_init_worker,
+                      initargs=(shared_speeds, shared_edge_index, mean, std_dev, threads_per_worker)) as pool:
+        runs = [(run_id, base_config, overrides) for run_id, overrides in enumerate(configs)]
+        results = pool.map(_run_config, runs, chunksize=1)
+
+    _print_table(results)
+    if output_csv is not None:
+        _write_csv(results, output_csv)
+    return results
+
+
+def _columns(results: list[dict]) -> list[str]:
+    """ Get all columns of the result table in order of appearance"""
+    return list(dict.fromkeys(key for row in results for key in row))
+
+
+def _print_table(results: list[dict]):
+    """ Print the result table sorted by validation MAE"""
+    columns = _columns(results)
+    print(" | ".join(f"{column:>12}" for column in columns))
+    for row in sorted(results, key=lambda r: r["MAE"]):
+        print(" | ".join(f"{row.get(column, ''):>12.5g}" if isinstance(row.get(column), float)
+                         else f"{str(row.get(column, '')):>12}" for column in columns))
+
+
+def _write_csv(results: list[dict], path: str):
+    """ Write the result table to a CSV file"""
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=_columns(results))
+        writer.writeheader()
+        writer.writerows(results)
@@ -0,0 +1,80 @@
+import contextlib
+
+import torch
+from torch_geometric.loader import DataLoader
+
+# settings of the throughput oriented training configuration and their default values.
+# All of them can be added to DeepSUMO's settings object to override the defaults.
+THROUGHPUT_DEFAULTS: dict = {
+    'NUM_THREADS': None,  # intra-op threads, None keeps the torch default
+    'NUM_INTEROP_THREADS': None,  # inter-op threads, None keeps the torch default
+    'NUM_WORKERS': 0,  # DataLoader worker processes
+    'PIN_MEMORY': False,  # pin host memory of batches (only useful when training on a GPU)
+    'PERSISTENT_WORKERS': True,  # keep DataLoader workers alive between epochs
+    'PREFETCH_FACTOR': 2,  # batches prefetched by each worker
+    'BF16': False,  # run forward pass and loss under bfloat16 autocast
+    'COMPILE': False,  # compile the model with torch.compile
+}
+
+
+def get_setting(config: dict, key: str):
+    """ Get a throughput setting from the config, falling back to its default value
+    :param config: settings object
+    :param key: name of the setting
+    :return: value of the setting
+    """
+    return config.get(key, THROUGHPUT_DEFAULTS[key])
+
+
+def configure_threads(config: dict):
+    """ Set the number of intra- and inter-op threads used by torch
+    :param config: settings object
+    """
+    if get_setting(config, 'NUM_THREADS') is not None:
+        torch.set_num_threads(get_setting(config, 'NUM_THREADS'))
+    if get_setting(config, 'NUM_INTEROP_THREADS') is not None:
+        try:
+            torch.set_num_interop_threads(get_setting(config, 'NUM_INTEROP_THREADS'))
+        except RuntimeError:
+            # can only be set once and before any inter-op parallel work has started
+            print("[Throughput] - Could not set inter-op threads, they were already in use")
+
+
+def make_loader(dataset, config: dict, shuffle: bool, batch_size: int = None) -> DataLoader:
+    """ Create a data loader using the worker and memory settings of the config
+    :param dataset: dataset to load
+    :param config: settings object
+    :param shuffle: shuffle the dataset
+    :param batch_size: batch size, defaults to BATCH_SIZE of the config
+    :return: data loader
+    """
+    num_workers = get_setting(config, 'NUM_WORKERS')
+    kwargs = {}
+    if num_workers > 0:
+        kwargs["persistent_workers"] = get_setting(config, 'PERSISTENT_WORKERS')
+        kwargs["prefetch_factor"] = get_setting(config, 'PREFETCH_FACTOR')
+    return DataLoader(dataset, batch_size=batch_size or config['BATCH_SIZE'], shuffle=shuffle,
+                      num_workers=num_workers, pin_memory=get_setting(config, 'PIN_MEMORY'), **kwargs)
+
+
+def autocast(device, config: dict):
+    """ Get the autocast context of the config
+    :param device: device the model runs on
+    :param config: settings object
+    :return: bfloat16 autocast context if BF16 is set, otherwise a no-op context
+    """
+    if not get_setting(config, 'BF16'):
+        return contextlib.nullcontext()
+    device_type = device.type if isinstance(device, torch.device) else str(device).split(':')[0]
+    return torch.autocast(device_type=device_type, dtype=torch.bfloat16)
+
+
+def compile_model(model, config: dict):
+    """ Compile the model if COMPILE is set
+    :param model: model to compile
+    :param config: settings object
+    :return: compiled model or the model itself
+    """
+    if get_setting(config, 'COMPILE'):
+        return torch.compile(model)
+    return model
@@ -3,64 +3,60 @@ import torch.optim as optim
 from tqdm import tqdm
 import time
 import os
-import matplotlib.pyplot as plt
 
 from torch_geo.model.st_gat import ST_GAT
-from torch.utils.tensorboard import SummaryWriter
+from torch_geo.model.st_gat_shared import ST_GAT_Shared
 
-from utils.math_utils import MAPE, RMSE, MAE, un_z_score
+from torch_geo.model.evaluation import evaluate, subsample_loader
+from torch_geo.model.checkpoint import save_checkpoint, load_checkpoint, find_latest_checkpoint, \
+    prune_checkpoints, early_stopping
+from torch_geo.model.throughput import configure_threads, compile_model, autocast, get_setting
 
-# Make a tensorboard writer
-writer = SummaryWriter()
+# tensorboard writer, created on first use since it creates the runs/ directory
+_writer = None
 
 
-@torch.no_grad()
-def eval(model, device, dataloader, type=''):
+def _get_writer():
+    """ Get the tensorboard writer, creating it on first use"""
+    global _writer
+    if _writer is None:
+        from torch.utils.tensorboard import SummaryWriter
+        _writer = SummaryWriter()
+    return _writer
+
+
+# models that can be selected using the MODEL setting
+MODELS = {
+    'ST_GAT': ST_GAT,
+    'ST_GAT_SHARED': ST_GAT_Shared,
+}
+
+
+def build_model(config, dropout=0.0):
+    """
+    Create the model selected by the MODEL setting (ST_GAT by default)
+    :param config Configuration to create the model with
+    :param dropout Dropout probability of the model
+    """
+    model_class = MODELS[config.get('MODEL', 'ST_GAT').upper()]
+    return model_class(in_channels=config['N_HIST'], out_channels=config['N_PRED'],
+                       n_nodes=config.get('N_NODE'), dropout=dropout)
+
+
+def eval(model, device, dataloader, type='', keep_predictions=False):
     """
     Evaluation function to evaluate model on data
     :param model Model to evaluate
     :param device Device to evaluate on
     :param dataloader Data loader
     :param type Name of evaluation type, e.g. Train/Val/Test
+    :param keep_predictions Return predictions and truths of shape (num_samples * n_nodes, n_pred)
     """
-    model.eval()
-    model.to(device)
-    mae = 0
-    rmse = 0
-    mape = 0
-    n = 0
-
-    # Evaluate model on all data
-    for i, batch in enumerate(dataloader):
-        batch = batch.to(device)
-        if batch.x.shape[0] == 1:
-            pass
-        else:
-            with torch.no_grad():
-                pred = model(batch, device)
-            truth = batch.y.view(pred.shape)
-            if i == 0:
-                y_pred = torch.zeros(len(dataloader), pred.shape[0], pred.shape[1])
-                y_truth = torch.zeros(len(dataloader), pred.shape[0], pred.shape[1])
-            truth = un_z_score(truth, dataloader.dataset.mean, dataloader.dataset.std_dev)
-            pred = un_z_score(pred, dataloader.dataset.mean, dataloader.dataset.std_dev)
-            y_pred[i, :pred.shape[0], :] = pred
-            y_truth[i, :pred.shape[0], :] = truth
-            rmse += RMSE(truth, pred)
-            mae += MAE(truth, pred)
-            mape += MAPE(truth, pred)
-            n += 1
-
-    rmse, mae, mape = rmse / n, mae / n, mape / n
-
-    print(n)
-    print(f'{type}, MAE: {mae}, RMSE: {rmse}, MAPE: {mape}')
-
-    # get the average score for each metric in each batch
-    return rmse, mae, mape, y_pred, y_truth
-
-
-def train(model, device, dataloader, optimizer, loss_fn, epoch):
+    metrics, y_pred, y_truth = evaluate(model, device, dataloader, keep_predictions, type)
+    return metrics.rmse(), metrics.mae(), metrics.mape(), y_pred, y_truth
+
+
+def train(model, device, dataloader, optimizer, loss_fn, epoch, config=None):
     """
     Evaluation function to evaluate model on data
     :param model Model to evaluate
@@ -69,14 +65,23 @@ def train(model, device, dataloader, optimizer, loss_fn, epoch):
     :param optimizer Optimizer to use
     :param loss_fn Loss function
     :param epoch Current epoch
+    :param config Configuration to use, enables bfloat16 autocast if BF16 is set
     """
     model.train()
+    non_blocking = config is not None and get_setting(config, 'PIN_MEMORY')
     for _, batch in enumerate(tqdm(dataloader, desc=f"Epoch {epoch}")):
-        batch = batch.to(device)
+        batch = batch.to(device, non_blocking=non_blocking)
         optimizer.zero_grad()
-        y_pred = torch.squeeze(model(batch, device))
-        loss = loss_fn()(y_pred.float(), torch.squeeze(batch.y).float())
-        writer.add_scalar("Loss/train", loss, epoch)
+        with autocast(device, config or {}):
+            y_pred = torch.squeeze(model(batch, device))
+        y_truth = torch.squeeze(batch.y)
+        # samples of a cluster_window_dataset are only trained on their core nodes
+        core_mask = getattr(batch, "core_mask", None)
+        if core_mask is not None:
+            y_pred = y_pred[core_mask]
+            y_truth = y_truth[core_mask]
+        loss = loss_fn()(y_pred.float(), y_truth.float())
+        _get_writer().add_scalar("Loss/train", loss, epoch)
         loss.backward()
         optimizer.step()
 
@@ -85,44 +90,108 @@ def train(model, device, dataloader, optimizer, loss_fn, epoch):
 
 def model_train(train_dataloader, val_dataloader, config, device):
     """
-    Train the ST-GAT model. Evaluate on validation dataset as you go.
+    Train the ST-GAT model (or the variant selected by MODEL). Evaluate on validation dataset as you go.
+    Loaders over a cluster_window_dataset train and evaluate on the core nodes of each cluster only.
+
+    Every CHECKPOINT_EVERY epochs a checkpoint containing model, optimizer, epoch and RNG state
+    is written to CHECKPOINT_DIR. If RESUME is set, training continues from the newest checkpoint.
+    If PATIENCE is set, training stops once the validation MAE did not improve for PATIENCE validation
+    rounds (one every EVAL_EVERY epochs) and the best model is returned.
+
+    The throughput settings of torch_geo.model.throughput (threads, bfloat16 autocast, torch.compile)
+    are applied as well. Use throughput.make_loader to create loaders using the worker settings.
     :param train_dataloader Data loader of training dataset
     :param val_dataloader Dataloader of val dataset
     :param config configuration to use
     :param device Device to evaluate on
     """
+    configure_threads(config)
+    if hasattr(train_dataloader.dataset, "clusters") and config.get('MODEL', 'ST_GAT').upper() == 'ST_GAT':
+        raise ValueError("ST_GAT depends on the number of nodes and can not be trained on clusters, "
+                         "use MODEL ST_GAT_SHARED")
 
     # Make the model. Each datapoint in the graph is 228x12: N x F (N = # nodes, F = time window)
-    model = ST_GAT(in_channels=config['N_HIST'], out_channels=config['N_PRED'], n_nodes=config['N_NODE'],
-                   dropout=config['DROPOUT'])
+    model = build_model(config, dropout=config['DROPOUT'])
     optimizer = optim.Adam(model.parameters(), lr=config['INITIAL_LR'], weight_decay=config['WEIGHT_DECAY'])
     loss_fn = torch.nn.MSELoss
 
     model.to(device)
 
+    checkpoint_dir = config["CHECKPOINT_DIR"]
+    checkpoint_every = config.get('CHECKPOINT_EVERY', 5)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    patience = config.get('PATIENCE')
+    stopper = early_stopping(patience, config.get('MIN_DELTA', 0.0)) if patience is not None else None
+
+    # continue from the newest checkpoint if requested
+    start_epoch = 0
+    loss = None
+    if config.get('RESUME', False):
+        checkpoint_path = find_latest_checkpoint(checkpoint_dir)
+        if checkpoint_path is not None:
+            checkpoint = load_checkpoint(checkpoint_path, model, optimizer, map_location=device)
+            start_epoch = checkpoint["epoch"] + 1
+            loss = checkpoint["loss"]
+            if stopper is not None and "early_stopping" in checkpoint:
+                stopper.load_state_dict(checkpoint["early_stopping"])
+            print("[Trainer] - Resuming from", checkpoint_path, "at epoch", start_epoch)
+
+    # evaluate on a fixed random subsample of the training data instead of all of it
+    train_eval_dataloader = subsample_loader(train_dataloader, config.get('TRAIN_EVAL_SAMPLES', 500))
+
+    # the compiled model shares its parameters with the model, which is used for evaluation and checkpoints
+    train_model = compile_model(model, config)
+
     # For every epoch, train the model on training dataset. Evaluate model on validation dataset
-    for epoch in range(config['EPOCHS']):
-        loss = train(model, device, train_dataloader, optimizer, loss_fn, epoch)
+    epoch = start_epoch - 1
+    for epoch in range(start_epoch, config['EPOCHS']):
+        loss = train(train_model, device, train_dataloader, optimizer, loss_fn, epoch, config)
         # print(f"Loss: {loss:.3f}")
-        if epoch % 5 == 0:
-            train_mae, train_rmse, train_mape, _, _ = eval(model, device, train_dataloader, 'Train')
-            val_mae, val_rmse, val_mape, _, _ = eval(model, device, val_dataloader, 'Valid')
-            writer.add_scalar(f"MAE/train", train_mae, epoch)
-            writer.add_scalar(f"RMSE/train", train_rmse, epoch)
-            writer.add_scalar(f"MAPE/train", train_mape, epoch)
-            writer.add_scalar(f"MAE/val", val_mae, epoch)
-            writer.add_scalar(f"RMSE/val", val_rmse, epoch)
-            writer.add_scalar(f"MAPE/val", val_mape, epoch)
-
-    writer.flush()
-    # Save the model
+        stop = False
+        if epoch % config.get('EVAL_EVERY', 5) == 0:
+            train_metrics, _, _ = evaluate(model, device, train_eval_dataloader, type='Train')
+            val_metrics, _, _ = evaluate(model, device, val_dataloader, type='Valid')
+            for name, metrics in (("train", train_metrics), ("val", val_metrics)):
+                _get_writer().add_scalar(f"MAE/{name}", metrics.mae(), epoch)
+                _get_writer().add_scalar(f"RMSE/{name}", metrics.rmse(), epoch)
+                _get_writer().add_scalar(f"MAPE/{name}", metrics.mape(), epoch)
+                for horizon, mae in enumerate(metrics.mae(per_horizon=True).tolist()):
+                    _get_writer().add_scalar(f"MAE_horizon_{horizon + 1}/{name}", mae, epoch)
+
+            # keep a copy of the best model so far for early stopping
+            if stopper is not None and stopper.step(val_metrics.mae(), epoch):
+                save_checkpoint(os.path.join(checkpoint_dir, "model_best.pt"), model, optimizer, epoch, loss)
+            stop = stopper is not None and stopper.should_stop()
+
+        if (epoch + 1) % checkpoint_every == 0:
+            extra = {"early_stopping": stopper.state_dict()} if stopper is not None else None
+            save_checkpoint(os.path.join(checkpoint_dir, f"checkpoint_{epoch:05d}.pt"),
+                            model, optimizer, epoch, loss, extra)
+            prune_checkpoints(checkpoint_dir, config.get('KEEP_CHECKPOINTS', 3))
+
+        if stop:
+            print("[Trainer] - Early stopping at epoch", epoch, "best epoch:", stopper.best_epoch,
+                  "best validation MAE:", stopper.best_value)
+            break
+
+    _get_writer().flush()
+
+    # return the best model instead of the last one when early stopping is used. The checkpoint is not
+    # restored using load_checkpoint, which would also rewind the RNG state of the caller to the best epoch
+    if stopper is not None and stopper.best_epoch >= 0:
+        best = torch.load(os.path.join(checkpoint_dir, "model_best.pt"), map_location=device, weights_only=False)
+        model.load_state_dict(best["model_state_dict"])
+        # the saved model carries optimizer state, epoch and loss of the best epoch instead of the last one
+        optimizer.load_state_dict(best["optimizer_state_dict"])
+        epoch = best["epoch"]
+        loss = best["loss"]
+
+    # Save the model together with the normalization statistics needed for inference
     timestr = time.strftime("%m-%d-%H%M%S")
-    torch.save({
-        "epoch": epoch,
-        "model_state_dict": model.state_dict(),
-        "optimizer_state_dict": optimizer.state_dict(),
-        "loss": loss,
-    }, os.path.join(config["CHECKPOINT_DIR"], f"model_{timestr}.pt"))
+    dataset = train_dataloader.dataset
+    stats = {"mean": getattr(dataset, "mean", None), "std_dev": getattr(dataset, "std_dev", None)}
+    save_checkpoint(os.path.join(checkpoint_dir, f"model_{timestr}.pt"), model, optimizer, epoch, loss, stats)
 
     return model
 
@@ -133,28 +202,29 @@ def model_test(model, test_dataloader, device, config):
     :param test_dataloader Data loader of test dataset
     :param device Device to evaluate on
     """
-    _, _, _, y_pred, y_truth = eval(model, device, test_dataloader, 'Test')
+    # predictions of cluster samples only contain the core nodes in cluster order,
+    # they can not be reshaped into (num_samples, N_NODE, n_pred) for plotting
+    if hasattr(test_dataloader.dataset, "clusters"):
+        raise ValueError("Testing on a cluster_window_dataset is not supported, "
+                         "test on a speed_window_dataset of the full graph")
+    _, y_pred, y_truth = evaluate(model, device, test_dataloader, keep_predictions=True, type='Test')
     plot_prediction(test_dataloader, y_pred, y_truth, 405, config)
 
 
 def plot_prediction(test_dataloader, y_pred, y_truth, node, config):
-    print("YEET")
+    import matplotlib.pyplot as plt
+
     # Calculate the truth
-    s = y_truth.shape
-    y_truth = y_truth.reshape(s[0], config['BATCH_SIZE'], config['N_NODE'], s[-1])
+    # [num_samples * n_nodes, n_pred] -> [num_samples, n_nodes, n_pred]
+    y_truth = y_truth.reshape(-1, config['N_NODE'], y_truth.shape[-1])
     # just get the first prediction out for the nth node
-    y_truth = y_truth[:, :, node, 0]
-    # Flatten to get the predictions for entire test dataset
-    y_truth = torch.flatten(y_truth)
+    y_truth = y_truth[:, node, 0]
     day0_truth = y_truth[:150]
 
     # Calculate the predicted
-    s = y_pred.shape
-    y_pred = y_pred.reshape(s[0], config['BATCH_SIZE'], config['N_NODE'], s[-1])
+    y_pred = y_pred.reshape(-1, config['N_NODE'], y_pred.shape[-1])
     # just get the first prediction out for the nth node
-    y_pred = y_pred[:, :, node, 0]
-    # Flatten to get the predictions for entire test dataset
-    y_pred = torch.flatten(y_pred)
+    y_pred = y_pred[:, node, 0]
     # Just grab the first day
     day0_pred = y_pred[:150]
     t = [t for t in range(0, 150 * 5, 5)]
@@ -168,14 +238,15 @@ def plot_prediction(test_dataloader, y_pred, y_truth, node, config):
     plt.show()
 
 
-def load_from_checkpoint(checkpoint_path, config):
+def load_from_checkpoint(checkpoint_path, config, map_location='cpu'):
     """
     Load a model from the checkpoint
     :param checkpoint_path Path to checkpoint
     :param config Configuration to load model with
+    :param map_location Device to load the model onto
     """
-    model = ST_GAT(in_channels=config['N_HIST'], out_channels=config['N_PRED'], n_nodes=config['N_NODE'])
-    checkpoint = torch.load(checkpoint_path, map_location=torch.device('cuda'))
+    model = build_model(config)
+    checkpoint = torch.load(checkpoint_path, map_location=map_location, weights_only=False)
     model.load_state_dict(checkpoint['model_state_dict'])
 
     return model
@@ -95,3 +95,144 @@ def get_distance_between(p1: tuple, p2: tuple):
     dy = p1[1] - p2[1]
 
     return abs(math.sqrt(math.pow(dx, 2) + math.pow(dy, 2)))
+
+
+def pack_shapes(shapes: list[list[tuple]]) -> tuple[np.array, np.array]:
+    """
+    Packs a list of shapes into one coordinate array and an offset array,
+    the coordinates of shape i are coords[offsets[i]:offsets[i + 1]].
+    z coordinates are dropped.
+    :param shapes: list of shapes, each represented as a series of coordinates as tuples
+    :return: tuple of <coordinates of shape (num_points, 2), offsets of shape (num_shapes + 1)>
+    """
+    offsets = np.zeros(len(shapes) + 1, dtype=np.int64)
+    np.cumsum([len(shape) for shape in shapes], out=offsets[1:])
+    coords = np.array([point[:2] for shape in shapes for point in shape], dtype=np.float64).reshape(-1, 2)
+    return coords, offsets
+
+
+def _get_cumulative_lengths(coords: np.array, offsets: np.array) -> np.array:
+    """
+    Calculates the running length along all packed shapes (eq. 1).
+    Vectors between the last point of a shape and the first point of the next shape have length 0.
+    :param coords: packed coordinates of shape (num_points, 2)
+    :param offsets: offsets of the shapes of shape (num_shapes + 1)
+    :return: array of shape (num_points) containing the length up to each point
+    """
+    segment_lengths = np.hypot(*np.diff(coords, axis=0).T)
+    # points starting a shape do not belong to the vector ending in them
+    starts = offsets[1:-1]
+    segment_lengths[starts[(starts > 0) & (starts < len(coords))] - 1] = 0
+    cumulative = np.zeros(len(coords))
+    np.cumsum(segment_lengths, out=cumulative[1:])
+    return cumulative
+
+
+def get_lengths_from_shapes(coords: np.array, offsets: np.array) -> np.array:
+    """
+    Batch version of get_length_from_shape for packed shapes
+    :param coords: packed coordinates of shape (num_points, 2), e.g. created by pack_shapes
+    :param offsets: offsets of the shapes of shape (num_shapes + 1)
+    :return: array containing the length of each shape
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if len(coords) == 0:
+        return np.zeros(len(offsets) - 1)
+    cumulative = _get_cumulative_lengths(coords, offsets)
+    starts = np.minimum(offsets[:-1], len(coords) - 1)
+    ends = np.maximum(offsets[1:] - 1, offsets[:-1]).clip(max=len(coords) - 1)
+    return cumulative[ends] - cumulative[starts]
+
+
+def get_positions_from_shapes(coords: np.array, offsets: np.array, shape_index: np.array,
+                              distances: np.array) -> np.array:
+    """
+    Batch version of get_position_from_shape (eq. 2) for many (shape, distance) queries on packed shapes.
+    Distances beyond the end of a shape are clamped to its last point.
+    :param coords: packed coordinates of shape (num_points, 2), e.g. created by pack_shapes
+    :param offsets: offsets of the shapes of shape (num_shapes + 1)
+    :param shape_index: index of the shape of each query
+    :param distances: distance along the shape of each query
+    :return: array of shape (num_queries, 2) containing the positions
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    shape_index = np.asarray(shape_index, dtype=np.int64)
+    distances = np.asarray(distances, dtype=np.float64)
+    if len(shape_index) == 0:
+        return np.zeros((0, 2))
+
+    cumulative = _get_cumulative_lengths(coords, offsets)
+    starts = offsets[shape_index]
+    ends = offsets[shape_index + 1] - 1
+
+    # first point whose running length reaches the distance ends the vector containing the position
+    targets = cumulative[starts] + distances
+    point = np.searchsorted(cumulative, targets, side="left")
+    point = np.clip(point, starts + 1, np.maximum(ends, starts + 1)).clip(max=len(coords) - 1)
+
+    x0 = coords[point - 1]
+    x1 = coords[point]
+    edge_length = cumulative[point] - cumulative[point - 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(edge_length > 0, (targets - cumulative[point - 1]) / edge_length, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    positions = (1 - t)[:, None] * x0 + t[:, None] * x1
+    # shapes consisting of a single point have no vector
+    single = ends <= starts
+    positions[single] = coords[starts[single]]
+    return positions
+
+
+def get_pairwise_distances(points_a: np.array, points_b: np.array = None) -> np.array:
+    """
+    Batch version of get_distance_between (eq. 1), calculates the distance between all pairs of points
+    :param points_a: source points of shape (num_a, 2)
+    :param points_b: target points of shape (num_b, 2), if None points_a is used
+    :return: distance matrix of shape (num_a, num_b)
+    """
+    points_a = np.asarray(points_a, dtype=np.float64).reshape(-1, 2)
+    points_b = points_a if points_b is None else np.asarray(points_b, dtype=np.float64).reshape(-1, 2)
+    return np.hypot(points_a[:, 0, None] - points_b[None, :, 0], points_a[:, 1, None] - points_b[None, :, 1])
+
+
+def get_lttb_indices(x: np.array, y: np.array, num_points: int) -> np.array:
+    """
+    Downsample a series with the Largest-Triangle-Three-Buckets algorithm, which keeps the visual shape
+    of the series (peaks and drops) unlike plain subsampling.
+    The first and last point are always kept, the points in between are split into num_points - 2 buckets and
+    from each bucket the point forming the largest triangle with the previously selected point and the average
+    of the next bucket is selected.
+    :param x: x values of shape (num_values), sorted ascending
+    :param y: y values of shape (num_values)
+    :param num_points: number of points to keep
+    :return: indices of the kept points, sorted ascending
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    num_values = len(x)
+    if num_points >= num_values or num_points < 3:
+        return np.arange(num_values)
+
+    # bucket boundaries of the points between the first and the last point
+    bounds = np.linspace(1, num_values - 1, num_points - 1).astype(np.int64)
+    selected = np.empty(num_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = num_values - 1
+    previous = 0
+    for bucket in range(num_points - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        # average point of the next bucket, the last bucket is followed by the last point
+        if bucket + 2 < len(bounds):
+            next_start, next_end = bounds[bucket + 1], bounds[bucket + 2]
+        else:
+            next_start, next_end = num_values - 1, num_values
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        # twice the triangle area for all points of the bucket
+        area = np.abs((x[previous] - average_x) * (y[start:end] - y[previous]) -
+                      (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected